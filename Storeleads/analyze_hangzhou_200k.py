@@ -1,61 +1,25 @@
+import sys
+from pathlib import Path
+
 import pandas as pd
 import re
 
-# Read CSV file
-print("Loading CSV data...")
-df = pd.read_csv('shopify-storeleads.csv', low_memory=False)
-
-print(f"Total records: {len(df)}")
-
-# Filter conditions
-print("\nApplying filters...")
-
-# 1. Country: CN (China)
-df_filtered = df[df['country_code'] == 'CN'].copy()
-print(f"After CN filter: {len(df_filtered)}")
-
-# 2. City: Hangzhou (杭州)
-df_filtered = df_filtered[
-    df_filtered['city'].str.contains('Hangzhou', case=False, na=False) |
-    df_filtered['company_location'].str.contains('Hangzhou', case=False, na=False)
-]
-print(f"After Hangzhou filter: {len(df_filtered)}")
-
-# 3. Monthly visits: 20,000 - 200,000
-df_filtered['estimated_monthly_visits'] = pd.to_numeric(df_filtered['estimated_monthly_visits'], errors='coerce')
-df_filtered = df_filtered[
-    (df_filtered['estimated_monthly_visits'] >= 20000) &
-    (df_filtered['estimated_monthly_visits'] <= 200000)
-]
-print(f"After monthly visits filter (20k-200k): {len(df_filtered)}")
-
-# 4. Domain ends with .com
-df_filtered = df_filtered[df_filtered['domain'].str.endswith('.com', na=False)]
-print(f"After .com domain filter: {len(df_filtered)}")
-
-# 5. Filter out weird/too long domains
-def is_normal_domain(domain):
-    if pd.isna(domain):
-        return False
-    # Remove www. prefix
-    domain_clean = domain.replace('www.', '')
-    # Check length (without .com)
-    domain_name = domain_clean.replace('.com', '')
-    if len(domain_name) > 30:  # Too long
-        return False
-    if len(domain_name) < 3:  # Too short
-        return False
-    # Check if contains too many hyphens or numbers
-    if domain_name.count('-') > 2:
-        return False
-    # Check if mostly numbers
-    digit_count = sum(c.isdigit() for c in domain_name)
-    if digit_count > len(domain_name) * 0.5:
-        return False
-    return True
-
-df_filtered = df_filtered[df_filtered['domain'].apply(is_normal_domain)]
-print(f"After domain quality filter: {len(df_filtered)}")
+sys.path.append(str(Path(__file__).parent.parent / 'scripts'))
+from columnar_cache import source_format
+from store_query import StoreQuery
+
+CSV_FILE = 'shopify-storeleads.csv'
+
+# Filter conditions, executed as one fused query over the columnar cache
+print("Applying filters...")
+query = (StoreQuery(CSV_FILE)
+         .country('CN')                          # 1. Country: CN (China)
+         .location_contains('Hangzhou')          # 2. City: Hangzhou (杭州)
+         .visits_between(20000, 200000)          # 3. Monthly visits: 20,000 - 200,000
+         .tld('.com')                            # 4. Domain ends with .com
+         .normal_domain())                       # 5. Filter out weird/too long domains
+df_filtered = query.to_frame()
+query.explain()
 
 # Sort by monthly visits descending
 df_filtered = df_filtered.sort_values('estimated_monthly_visits', ascending=False)
@@ -65,7 +29,8 @@ print(f"Total filtered stores: {len(df_filtered)}")
 
 # Save results
 print("\nSaving results...")
-df_filtered.to_csv('hangzhou_stores_20k_200k.csv', index=False)
+# created back to the export's %Y/%m/%d format
+source_format(df_filtered).to_csv('hangzhou_stores_20k_200k.csv', index=False)
 
 # Detailed output
 print(f"\n{'='*100}")
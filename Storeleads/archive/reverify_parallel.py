@@ -4,49 +4,39 @@ Parallel verification of never_advertised stores
 Uses multiple browser instances to speed up verification
 """
 
-import psycopg2
 import time
 from stage1_fast_check_selenium import FastJudgeSelenium
 from multiprocessing import Pool, Manager
 import sys
+from pathlib import Path
 
-DB_CONFIG = {
-    'host': 'ep-misty-star-ahewx63v-pooler.c-3.us-east-1.aws.neon.tech',
-    'database': 'neondb',
-    'user': 'neondb_owner',
-    'password': 'npg_7kil2gsDbcIf',
-    'sslmode': 'require'
-}
+sys.path.append(str(Path(__file__).parent.parent.parent / 'scripts'))
+from db_config import pooled_connection
+from driver_pool import init_worker, worker_driver
+from geo_index import ZHEJIANG, province_condition
 
 
 def get_never_advertised_stores():
     """Get all stores marked as never_advertised"""
-    conn = psycopg2.connect(**DB_CONFIG)
+    with pooled_connection() as conn:
+        return _query_never_advertised(conn)
+
+
+def _query_never_advertised(conn):
     cur = conn.cursor()
 
-    cur.execute("""
+    province_sql, province_params = province_condition(ZHEJIANG)
+    cur.execute(f"""
         SELECT domain, estimated_monthly_visits, city
         FROM stores
         WHERE customer_type = 'never_advertised'
         AND estimated_monthly_visits >= 1000
-        AND (city LIKE '%杭州%' OR city LIKE '%Hangzhou%'
-             OR city LIKE '%浙江%' OR city LIKE '%Zhejiang%'
-             OR city LIKE '%宁波%' OR city LIKE '%Ningbo%'
-             OR city LIKE '%温州%' OR city LIKE '%Wenzhou%'
-             OR city LIKE '%嘉兴%' OR city LIKE '%Jiaxing%'
-             OR city LIKE '%金华%' OR city LIKE '%Jinhua%'
-             OR city LIKE '%绍兴%' OR city LIKE '%Shaoxing%'
-             OR city LIKE '%湖州%' OR city LIKE '%Huzhou%'
-             OR city LIKE '%衢州%' OR city LIKE '%Quzhou%'
-             OR city LIKE '%台州%' OR city LIKE '%Taizhou%'
-             OR city LIKE '%丽水%' OR city LIKE '%Lishui%'
-             OR city LIKE '%舟山%' OR city LIKE '%Zhoushan%')
+        AND {province_sql}
         ORDER BY estimated_monthly_visits DESC
-    """)
+    """, province_params)
 
     stores = cur.fetchall()
     cur.close()
-    conn.close()
 
     return stores
 
@@ -59,36 +49,27 @@ def verify_store(args):
     ads_count = None
     result = None
 
-    # Create browser instance (no DB connection yet)
-    from selenium import webdriver
-    from selenium.webdriver.chrome.options import Options
+    # Browser is the worker's long-lived driver (driver_pool)
     from selenium.webdriver.common.by import By
     from selenium.webdriver.support.ui import WebDriverWait
     import re
 
     try:
-        # Init browser
-        chrome_options = Options()
-        chrome_options.add_argument('--headless=new')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--disable-gpu')
-        driver = webdriver.Chrome(options=chrome_options)
-
         # Check ads
         check_domain = domain.replace('www.', '') if domain.startswith('www.') else domain
         url = f"https://adstransparency.google.com/?region=anywhere&domain={check_domain}"
 
-        driver.get(url)
+        with worker_driver() as driver:
+            driver.get(url)
 
-        try:
-            wait = WebDriverWait(driver, 20)
-            wait.until(lambda d: "个广告" in d.find_element(By.TAG_NAME, 'body').text)
-            time.sleep(3)
-        except:
-            pass
+            try:
+                wait = WebDriverWait(driver, 20)
+                wait.until(lambda d: "个广告" in d.find_element(By.TAG_NAME, 'body').text)
+                time.sleep(3)
+            except:
+                pass
 
-        page_text = driver.find_element(By.TAG_NAME, 'body').text
+            page_text = driver.find_element(By.TAG_NAME, 'body').text
 
         match = re.search(r'~?(\d+)\+?\s*个广告', page_text)
         if match:
@@ -101,15 +82,11 @@ def verify_store(args):
             ads_count = -1
             result_type = 'has_ads'
 
-        driver.quit()
-
-        # Now connect to DB to update (one connection per update)
-        if result_type:
-            conn = psycopg2.connect(**DB_CONFIG)
-            cur = conn.cursor()
-
-            try:
-                if result_type == 'has_ads':
+        # Update through the worker process's pooled connection (reused across domains)
+        if result_type == 'has_ads':
+            with pooled_connection() as conn:
+                cur = conn.cursor()
+                try:
                     cur.execute("""
                         UPDATE stores
                         SET customer_type = %s,
@@ -118,11 +95,9 @@ def verify_store(args):
                             google_ads_url = %s
                         WHERE domain = %s
                     """, ('has_ads', True, ads_count, url, domain))
-
-                conn.commit()
-            finally:
-                cur.close()
-                conn.close()
+                    conn.commit()
+                finally:
+                    cur.close()
 
     except Exception as e:
         result_type = 'failed'
@@ -185,8 +160,9 @@ def main():
     start_time = time.time()
     completed = 0
 
-    # Process in parallel with 5 workers
-    with Pool(processes=5) as pool:
+    # Process in parallel with 5 workers, one long-lived Chrome each
+    # (restarted after a crash or DRIVER_MAX_PAGES pages)
+    with Pool(processes=5, initializer=init_worker) as pool:
         for result in pool.imap_unordered(verify_store, worker_args):
             completed += 1
             domain = result['domain']
@@ -209,6 +185,10 @@ def main():
 
             sys.stdout.flush()
 
+        # Let the workers exit normally so they quit their Chrome
+        pool.close()
+        pool.join()
+
     # Summary
     print()
     print("=" * 100)
@@ -12,6 +12,11 @@ import time
 from datetime import datetime
 from pathlib import Path
 import hashlib
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent / 'scripts'))
+from page_pool import PagePool
+from rate_control import ERROR, RateController, classify
 
 # 尝试导入playwright
 try:
@@ -24,7 +29,7 @@ except ImportError:
     from playwright.async_api import async_playwright
 
 # 配置
-CONCURRENT_BROWSERS = 5  # 并发浏览器数量（5个比较稳定）
+CONCURRENT_BROWSERS = 5  # 并发上限（5个比较稳定），实际并发由速率控制器调整
 TIMEOUT = 15000  # 页面超时15秒
 CACHE_FILE = 'ads_cache.json'
 
@@ -134,6 +139,17 @@ async def check_single_domain(page, domain):
         }
 
 
+async def paced_check(rate, page, domain):
+    """按速率控制器放行的 check_single_domain，并把结果（出错 / 超时 / 验证码）反馈给它"""
+    await rate.acquire_async()
+    result = None
+    try:
+        result = await check_single_domain(page, domain)
+        return result
+    finally:
+        rate.release(classify(result['error'], page.url) if result else ERROR)
+
+
 async def check_domains_batch(domains, progress_callback=None):
     """批量检查域名（异步并发）"""
     cache = AdsCache()
@@ -173,45 +189,33 @@ async def check_domains_batch(domains, progress_callback=None):
             )
             contexts.append(context)
 
-        # 创建任务队列
-        tasks = []
-        context_idx = 0
-
-        for domain in to_check:
-            # 轮流分配到不同的context
-            context = contexts[context_idx % CONCURRENT_BROWSERS]
-            page = await context.new_page()
-
-            # 创建任务
-            task = asyncio.create_task(check_single_domain(page, domain))
-            tasks.append((task, page))
-
-            context_idx += 1
-
-        # 并发执行所有任务
+        # CONCURRENT_BROWSERS 个常驻页面从队列取域名（不再为每个域名开一个页面），
+        # 结果按完成顺序返回，慢域名不会拖住其他页面
         print(f"\n⏳ 查询中...\n")
         completed = 0
-        total = len(tasks)
+        total = len(to_check)
 
-        for task, page in tasks:
-            try:
-                result = await task
-                results.append(result)
+        rate = RateController(max_concurrency=CONCURRENT_BROWSERS)
+        pool = PagePool(contexts, lambda page, domain: paced_check(rate, page, domain))
+        async for result in pool.run(to_check):
+            if 'has_ads' not in result:
+                # 页面本身出错（check_single_domain 之外）
+                print(f"❌ {result['domain']}: {result['error']}")
+                continue
+            results.append(result)
 
-                # 保存到缓存
-                cache.set(result['domain'], result)
+            # 保存到缓存
+            cache.set(result['domain'], result)
 
-                completed += 1
-                status = '✅' if result['has_ads'] else '⭕'
-                print(f"[{completed}/{total}] {status} {result['domain']}: {result['ad_count_text']}")
+            completed += 1
+            status = '✅' if result['has_ads'] else '⭕'
+            print(f"[{completed}/{total}] {status} {result['domain']}: {result['ad_count_text']}")
 
-                if progress_callback:
-                    progress_callback(completed, total)
+            if progress_callback:
+                progress_callback(completed, total)
 
-            except Exception as e:
-                print(f"❌ {page.url}: {str(e)}")
-            finally:
-                await page.close()
+        metrics = rate.metrics()
+        print(f"\n🚦 请求速率: {metrics['rate']:.2f} req/s, 降速 {metrics['decreases']} 次, 结果 {metrics['outcomes']}")
 
         # 关闭浏览器
         for context in contexts:
@@ -5,9 +5,17 @@ POD (Print on Demand) Store Identifier
 识别按需打印类型的Shopify店铺
 """
 
+import os
+import sys
+from pathlib import Path
+
 import pandas as pd
 import re
 
+sys.path.append(str(Path(__file__).parent.parent / 'scripts'))
+from columnar_cache import load_frame, source_format
+from pod_scorer import PodScorer
+
 # POD关键词库
 POD_KEYWORDS = {
     # 核心POD关键词
@@ -37,8 +45,15 @@ POD_KEYWORDS = {
     ],
 }
 
+# 每类关键词命中一次的得分
+POD_WEIGHTS = {
+    'core': 10,
+    'products': 3,
+    'features': 2,
+}
+
 def calculate_pod_score(text):
-    """计算POD得分"""
+    """计算POD得分（单元格版本，批量评分请用 PodScorer，结果完全一致）"""
     if pd.isna(text):
         return 0
 
@@ -48,21 +63,22 @@ def calculate_pod_score(text):
     # 核心关键词权重最高
     for keyword in POD_KEYWORDS['core']:
         if keyword in text_lower:
-            score += 10
+            score += POD_WEIGHTS['core']
 
     # 产品类型关键词
     for keyword in POD_KEYWORDS['products']:
         if keyword in text_lower:
-            score += 3
+            score += POD_WEIGHTS['products']
 
     # 特征词
     for keyword in POD_KEYWORDS['features']:
         if keyword in text_lower:
-            score += 2
+            score += POD_WEIGHTS['features']
 
     return score
 
-def identify_pod_stores(csv_file, min_score=15, min_visits=1000, location_filter=None):
+def identify_pod_stores(csv_file, min_score=15, min_visits=1000, location_filter=None,
+                        keywords=POD_KEYWORDS, weights=POD_WEIGHTS, workers=None):
     """
     识别POD店铺
 
@@ -71,25 +87,26 @@ def identify_pod_stores(csv_file, min_score=15, min_visits=1000, location_filter
         min_score: 最低POD得分（默认15分）
         min_visits: 最低月访问量（默认1000）
         location_filter: 位置筛选（如 'Zhejiang', 'China' 等）
+        keywords / weights: 关键词库和每类得分（默认 POD_KEYWORDS / POD_WEIGHTS）
+        workers: 并行评分的进程数（默认单进程）
     """
     print("=" * 100)
     print("POD店铺识别系统")
     print("=" * 100)
 
-    # 读取数据
+    # 对多个字段进行评分
+    text_fields = ['description', 'meta_description', 'title', 'merchant_name', 'domain']
+
+    # 读取数据（列式缓存，只加载评分和筛选需要的列）
     print("\n📂 正在读取数据...")
-    df = pd.read_csv(csv_file, low_memory=False)
+    df = load_frame(csv_file, columns=text_fields + ['estimated_monthly_visits', 'company_location'])
     print(f"✅ 共读取 {len(df):,} 条记录")
 
     # 计算POD得分
     print("\n🔍 正在分析POD特征...")
-    df['pod_score'] = 0
-
-    # 对多个字段进行评分
-    text_fields = ['description', 'meta_description', 'title', 'merchant_name', 'domain']
-    for field in text_fields:
-        if field in df.columns:
-            df['pod_score'] += df[field].apply(calculate_pod_score)
+    scorer = PodScorer(keywords, weights)
+    columns = [df[field].tolist() for field in text_fields if field in df.columns]
+    df['pod_score'] = scorer.score_columns(columns, workers=workers)
 
     # 筛选条件
     print("\n📊 应用筛选条件...")
@@ -114,6 +131,11 @@ def identify_pod_stores(csv_file, min_score=15, min_visits=1000, location_filter
         ]
         filters.append(f"位置包含 '{location_filter}'")
 
+    # 候选店铺再读取完整字段
+    pod_scores = pod_candidates['pod_score']
+    pod_candidates = load_frame(csv_file, rows=pod_candidates.index)
+    pod_candidates['pod_score'] = pod_scores
+
     print(f"筛选条件: {' + '.join(filters)}")
     print(f"✅ 找到 {len(pod_candidates)} 家POD候选店铺")
 
@@ -150,7 +172,8 @@ def identify_pod_stores(csv_file, min_score=15, min_visits=1000, location_filter
     ]
 
     available_columns = [col for col in columns_to_save if col in pod_candidates.columns]
-    pod_candidates[available_columns].to_csv(output_file, index=False, encoding='utf-8-sig')
+    # created 保持导出文件的 %Y/%m/%d 格式
+    source_format(pod_candidates[available_columns]).to_csv(output_file, index=False, encoding='utf-8-sig')
 
     print("\n" + "=" * 100)
     print(f"✅ 结果已保存到: {output_file}")
@@ -171,7 +194,7 @@ def identify_pod_stores(csv_file, min_score=15, min_visits=1000, location_filter
 if __name__ == '__main__':
     # 示例1: 识别所有POD店铺（月访问>1000）
     print("\n" + "🔍 场景1: 识别所有高流量POD店铺".center(100, "="))
-    identify_pod_stores('shopify-storeleads.csv', min_score=15, min_visits=1000)
+    identify_pod_stores('shopify-storeleads.csv', min_score=15, min_visits=1000, workers=os.cpu_count())
 
     # 示例2: 识别浙江的POD店铺
     # print("\n" + "🔍 场景2: 识别浙江地区POD店铺".center(100, "="))
@@ -6,8 +6,10 @@ Much faster and more reliable than clicking filters!
 """
 
 import psycopg2
+import sys
 import time
 import re
+from pathlib import Path
 from datetime import datetime, timedelta
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
@@ -15,6 +17,9 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
+sys.path.append(str(Path(__file__).parent.parent / 'scripts'))
+from geo_index import ZHEJIANG, province_condition
+
 DB_CONFIG = {
     'host': 'ep-misty-star-ahewx63v-pooler.c-3.us-east-1.aws.neon.tech',
     'database': 'neondb',
@@ -185,25 +190,15 @@ class Stage2DateChecker:
 
     def get_has_ads_stores(self, min_visits=1000):
         """Get stores marked as 'has_ads' that need Stage 2 verification"""
-        self.cur.execute("""
+        province_sql, province_params = province_condition(ZHEJIANG)
+        self.cur.execute(f"""
             SELECT domain, google_ads_count, estimated_monthly_visits, city
             FROM stores
             WHERE customer_type = 'has_ads'
             AND estimated_monthly_visits >= %s
-            AND (city LIKE '%%杭州%%' OR city LIKE '%%Hangzhou%%'
-                 OR city LIKE '%%浙江%%' OR city LIKE '%%Zhejiang%%'
-                 OR city LIKE '%%宁波%%' OR city LIKE '%%Ningbo%%'
-                 OR city LIKE '%%温州%%' OR city LIKE '%%Wenzhou%%'
-                 OR city LIKE '%%嘉兴%%' OR city LIKE '%%Jiaxing%%'
-                 OR city LIKE '%%金华%%' OR city LIKE '%%Jinhua%%'
-                 OR city LIKE '%%绍兴%%' OR city LIKE '%%Shaoxing%%'
-                 OR city LIKE '%%湖州%%' OR city LIKE '%%Huzhou%%'
-                 OR city LIKE '%%衢州%%' OR city LIKE '%%Quzhou%%'
-                 OR city LIKE '%%台州%%' OR city LIKE '%%Taizhou%%'
-                 OR city LIKE '%%丽水%%' OR city LIKE '%%Lishui%%'
-                 OR city LIKE '%%舟山%%' OR city LIKE '%%Zhoushan%%')
+            AND {province_sql}
             ORDER BY estimated_monthly_visits DESC
-        """, (min_visits,))
+        """, (min_visits,) + province_params)
 
         return self.cur.fetchall()
 
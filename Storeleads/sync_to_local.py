@@ -5,6 +5,11 @@ Sync Neon data to local SQLite for fast verification
 
 import psycopg2
 import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / 'scripts'))
+from geo_index import ZHEJIANG, province_condition
 
 NEON_CONFIG = {
     'host': 'ep-misty-star-ahewx63v-pooler.c-3.us-east-1.aws.neon.tech',
@@ -30,25 +35,15 @@ def sync_to_local():
     neon_cur = neon_conn.cursor()
 
     # Get all stores
-    neon_cur.execute("""
+    province_sql, province_params = province_condition(ZHEJIANG)
+    neon_cur.execute(f"""
         SELECT domain, estimated_monthly_visits, city, customer_type,
                has_google_ads, is_new_customer, google_ads_count, google_ads_url,
                ads_check_level
         FROM stores
         WHERE estimated_monthly_visits >= 1000
-        AND (city LIKE '%杭州%' OR city LIKE '%Hangzhou%'
-             OR city LIKE '%浙江%' OR city LIKE '%Zhejiang%'
-             OR city LIKE '%宁波%' OR city LIKE '%Ningbo%'
-             OR city LIKE '%温州%' OR city LIKE '%Wenzhou%'
-             OR city LIKE '%嘉兴%' OR city LIKE '%Jiaxing%'
-             OR city LIKE '%金华%' OR city LIKE '%Jinhua%'
-             OR city LIKE '%绍兴%' OR city LIKE '%Shaoxing%'
-             OR city LIKE '%湖州%' OR city LIKE '%Huzhou%'
-             OR city LIKE '%衢州%' OR city LIKE '%Quzhou%'
-             OR city LIKE '%台州%' OR city LIKE '%Taizhou%'
-             OR city LIKE '%丽水%' OR city LIKE '%Lishui%'
-             OR city LIKE '%舟山%' OR city LIKE '%Zhoushan%')
-    """)
+        AND {province_sql}
+    """, province_params)
 
     stores = neon_cur.fetchall()
     print(f"✅ 从 Neon 获取了 {len(stores)} 个店铺")
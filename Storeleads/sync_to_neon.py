@@ -5,6 +5,11 @@ Sync local SQLite results back to Neon database
 
 import psycopg2
 import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / 'scripts'))
+from geo_index import ZHEJIANG, province_condition
 
 NEON_CONFIG = {
     'host': 'ep-misty-star-ahewx63v-pooler.c-3.us-east-1.aws.neon.tech',
@@ -75,25 +80,15 @@ def sync_to_neon():
     print()
 
     # Show summary
-    neon_cur.execute("""
+    province_sql, province_params = province_condition(ZHEJIANG)
+    neon_cur.execute(f"""
         SELECT customer_type, COUNT(*)
         FROM stores
         WHERE estimated_monthly_visits >= 1000
-        AND (city LIKE '%杭州%' OR city LIKE '%Hangzhou%'
-             OR city LIKE '%浙江%' OR city LIKE '%Zhejiang%'
-             OR city LIKE '%宁波%' OR city LIKE '%Ningbo%'
-             OR city LIKE '%温州%' OR city LIKE '%Wenzhou%'
-             OR city LIKE '%嘉兴%' OR city LIKE '%Jiaxing%'
-             OR city LIKE '%金华%' OR city LIKE '%Jinhua%'
-             OR city LIKE '%绍兴%' OR city LIKE '%Shaoxing%'
-             OR city LIKE '%湖州%' OR city LIKE '%Huzhou%'
-             OR city LIKE '%衢州%' OR city LIKE '%Quzhou%'
-             OR city LIKE '%台州%' OR city LIKE '%Taizhou%'
-             OR city LIKE '%丽水%' OR city LIKE '%Lishui%'
-             OR city LIKE '%舟山%' OR city LIKE '%Zhoushan%')
+        AND {province_sql}
         GROUP BY customer_type
         ORDER BY COUNT(*) DESC
-    """)
+    """, province_params)
 
     summary = neon_cur.fetchall()
 
@@ -105,24 +100,13 @@ def sync_to_neon():
     print()
 
     # Show target customers summary
-    neon_cur.execute("""
+    neon_cur.execute(f"""
         SELECT COUNT(*), SUM(estimated_monthly_visits)
         FROM stores
         WHERE customer_type IN ('never_advertised', 'new_advertiser_30d')
         AND estimated_monthly_visits >= 1000
-        AND (city LIKE '%杭州%' OR city LIKE '%Hangzhou%'
-             OR city LIKE '%浙江%' OR city LIKE '%Zhejiang%'
-             OR city LIKE '%宁波%' OR city LIKE '%Ningbo%'
-             OR city LIKE '%温州%' OR city LIKE '%Wenzhou%'
-             OR city LIKE '%嘉兴%' OR city LIKE '%Jiaxing%'
-             OR city LIKE '%金华%' OR city LIKE '%Jinhua%'
-             OR city LIKE '%绍兴%' OR city LIKE '%Shaoxing%'
-             OR city LIKE '%湖州%' OR city LIKE '%Huzhou%'
-             OR city LIKE '%衢州%' OR city LIKE '%Quzhou%'
-             OR city LIKE '%台州%' OR city LIKE '%Taizhou%'
-             OR city LIKE '%丽水%' OR city LIKE '%Lishui%'
-             OR city LIKE '%舟山%' OR city LIKE '%Zhoushan%')
-    """)
+        AND {province_sql}
+    """, province_params)
 
     target_count, target_visits = neon_cur.fetchone()
 
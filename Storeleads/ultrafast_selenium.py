@@ -9,12 +9,18 @@ import time
 import re
 from datetime import datetime
 from pathlib import Path
+import sys
 import json
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 
+sys.path.append(str(Path(__file__).parent.parent / 'scripts'))
+from ad_result_writer import bulk_update_ad_results
+from rate_control import RateController, driver_outcome
+from write_behind import WriteBehindQueue
+
 DB_CONFIG = {
     'host': 'ep-misty-star-ahewx63v-pooler.c-3.us-east-1.aws.neon.tech',
     'database': 'neondb',
@@ -29,7 +35,6 @@ MAX_RETRIES = 1  # 减少重试（只重试1次）
 PROGRESS_FILE = 'ultrafast_progress.json'
 PAGE_TIMEOUT = 5  # 页面等待只等5秒
 ELEMENT_TIMEOUT = 2  # 元素等待只等2秒
-SLEEP_TIME = 0  # 不等待！
 
 
 class UltraFastChecker:
@@ -40,7 +45,10 @@ class UltraFastChecker:
         self.driver = None
         self.processed_domains = set()
         self.failed_domains = []
-        self.current_batch = []
+        # 结果交给后台线程写库（批量 UPDATE + 进度文件），浏览器不等数据库
+        self.writer = WriteBehindQueue(self.batch_update_database, max_batch=BATCH_SIZE)
+        # 不固定等待：令牌桶按上限放行，出错 / 验证码页面时自动降速
+        self.rate = RateController()
         self.total_checked = 0
         self.load_progress()
 
@@ -160,55 +168,30 @@ class UltraFastChecker:
                     'error': str(e)
                 }
 
-    def batch_update_database(self):
-        """批量更新数据库"""
-        if not self.current_batch:
-            return True
+    def batch_update_database(self, results):
+        """批量更新数据库（在 write-behind 线程中执行，失败时抛出由其重试）"""
+        rows = [{
+            'domain': result['domain'],
+            'customer_type': result['customer_type'],
+            'has_google_ads': result['has_ads'],
+            'is_new_customer': None if result['customer_type'] == 'has_ads' else False,
+            'google_ads_count': result['ad_count'],
+            'google_ads_url': result.get('google_ads_url'),
+        } for result in results if not result['error']]
 
         try:
-            cur = self.conn.cursor()
-            updated = 0
-
-            for result in self.current_batch:
-                if result['error']:
-                    continue
-
-                domain = result['domain']
-                customer_type = result['customer_type']
-                ad_count = result['ad_count']
-                google_ads_url = result.get('google_ads_url')
-                has_google_ads = result['has_ads']
-                is_new_customer = None if customer_type == 'has_ads' else False
-
-                cur.execute("""
-                    UPDATE stores
-                    SET customer_type = %s,
-                        ads_check_level = 'ultrafast',
-                        ads_last_checked = NOW(),
-                        has_google_ads = %s,
-                        is_new_customer = %s,
-                        google_ads_count = %s,
-                        google_ads_url = %s
-                    WHERE domain = %s
-                """, (customer_type, has_google_ads, is_new_customer, ad_count, google_ads_url, domain))
-
-                self.processed_domains.add(domain)
-                updated += 1
-
-            self.conn.commit()
-            cur.close()
-
-            print(f"  💾 批量更新 {updated} 个")
-
-            self.save_progress()
-            self.current_batch = []
-
-            return True
-
+            # 整批一条 UPDATE ... FROM (VALUES ...)，一次往返
+            updated = bulk_update_ad_results(self.conn, rows, 'ultrafast')
         except Exception as e:
-            print(f"  ❌ 更新失败: {e}")
+            print(f"  ❌ 批量更新失败: {e}")
             self.conn.rollback()
-            return False
+            raise
+
+        self.processed_domains.update(row['domain'] for row in rows)
+        print(f"  💾 批量更新 {updated} 个")
+
+        # 保存进度
+        self.save_progress()
 
     def run(self):
         """运行检查"""
@@ -255,24 +238,19 @@ class UltraFastChecker:
 
         start_time = time.time()
 
+        self.writer.start()
         for i, (domain, visits, country) in enumerate(to_check, 1):
             print(f"[{i}/{len(to_check)}] {domain}...", end=' ')
 
+            self.rate.acquire()
             result = self.check_ads(domain)
-            self.current_batch.append(result)
+            self.rate.release(driver_outcome(self.driver, result['error']))
+            self.writer.put(result)
             self.total_checked += 1
 
             status = '✅' if result['has_ads'] else '⭕'
             print(f"{status} {result['ad_count']}")
 
-            # 批量更新
-            if len(self.current_batch) >= BATCH_SIZE:
-                self.batch_update_database()
-
-            # 不等待！
-            if SLEEP_TIME > 0:
-                time.sleep(SLEEP_TIME)
-
             # 每100个显示进度
             if i % 100 == 0:
                 elapsed = time.time() - start_time
@@ -280,9 +258,8 @@ class UltraFastChecker:
                 remaining = (len(to_check) - i) * avg_time
                 print(f"\n📊 [{i}/{len(to_check)}] 平均: {avg_time:.2f}秒/个, 剩余: {remaining/3600:.1f}小时\n")
 
-        # 更新剩余
-        if self.current_batch:
-            self.batch_update_database()
+        # 写完队列中剩余的结果
+        self.writer.close()
 
         elapsed = time.time() - start_time
 
@@ -294,6 +271,9 @@ class UltraFastChecker:
         print(f"⏱️  总耗时: {elapsed/3600:.2f} 小时")
         print(f"✅ 成功: {len(self.processed_domains)}")
         print(f"❌ 失败: {len(self.failed_domains)}")
+        rate = self.rate.metrics()
+        print(f"🚦 请求速率: {rate['rate']:.2f} req/s, 降速 {rate['decreases']} 次 / 提速 {rate['increases']} 次, "
+              f"等待 {rate['waited_s']:.0f}s, 结果 {rate['outcomes']}")
         if self.total_checked > 0:
             print(f"📈 平均: {elapsed/self.total_checked:.2f} 秒/个")
         print("="*100)
@@ -323,6 +303,7 @@ def main():
         checker.run()
     except KeyboardInterrupt:
         print("\n\n⚠️  中断！")
+        checker.writer.close()
         checker.save_progress()
         if checker.driver:
             checker.driver.quit()
@@ -6,14 +6,17 @@ Parallel verification using local SQLite (no Neon connection issues!)
 import sqlite3
 import time
 from multiprocessing import Pool
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 import re
 import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / 'scripts'))
+from driver_pool import DEFAULT_CHROME_ARGS, init_worker, worker_driver
 
 LOCAL_DB = 'local_stores.db'
+CHROME_ARGS = DEFAULT_CHROME_ARGS + ('--window-size=1920,1080',)
 
 
 def get_never_advertised_stores():
@@ -36,36 +39,28 @@ def get_never_advertised_stores():
 
 
 def verify_store(args):
-    """Verify a single store (worker function)"""
+    """Verify a single store (worker function, reuses the worker's Chrome)"""
     domain, visits, city, worker_id = args
 
     result_type = None
     ads_count = None
 
     try:
-        # Init browser
-        chrome_options = Options()
-        chrome_options.add_argument('--headless=new')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--disable-gpu')
-        chrome_options.add_argument('--window-size=1920,1080')
-        driver = webdriver.Chrome(options=chrome_options)
-
         # Check ads
         check_domain = domain.replace('www.', '') if domain.startswith('www.') else domain
         url = f"https://adstransparency.google.com/?region=anywhere&domain={check_domain}"
 
-        driver.get(url)
+        with worker_driver() as driver:
+            driver.get(url)
 
-        try:
-            wait = WebDriverWait(driver, 20)
-            wait.until(lambda d: "个广告" in d.find_element(By.TAG_NAME, 'body').text)
-            time.sleep(3)
-        except:
-            pass
+            try:
+                wait = WebDriverWait(driver, 20)
+                wait.until(lambda d: "个广告" in d.find_element(By.TAG_NAME, 'body').text)
+                time.sleep(3)
+            except:
+                pass
 
-        page_text = driver.find_element(By.TAG_NAME, 'body').text
+            page_text = driver.find_element(By.TAG_NAME, 'body').text
 
         match = re.search(r'~?(\d+)\+?\s*个广告', page_text)
         if match:
@@ -78,8 +73,6 @@ def verify_store(args):
             ads_count = -1
             result_type = 'has_ads'
 
-        driver.quit()
-
         # Update local SQLite (no connection limit!)
         if result_type == 'has_ads':
             conn = sqlite3.connect(LOCAL_DB)
@@ -153,8 +146,9 @@ def main():
     completed = 0
     total = len(stores)
 
-    # Process with 10 workers
-    with Pool(processes=10) as pool:
+    # Process with 10 workers, one long-lived Chrome each
+    # (restarted after a crash or DRIVER_MAX_PAGES pages)
+    with Pool(processes=10, initializer=init_worker, initargs=(None, CHROME_ARGS)) as pool:
         for result in pool.imap_unordered(verify_store, worker_args):
             completed += 1
             domain = result['domain']
@@ -175,6 +169,10 @@ def main():
                 results['failed'].append(domain)
                 print(f"[{completed}/{total}] ❌ {domain} - 检测失败", flush=True)
 
+        # Let the workers exit normally so they quit their Chrome
+        pool.close()
+        pool.join()
+
     # Summary
     print()
     print("=" * 100)
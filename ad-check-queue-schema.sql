@@ -0,0 +1,22 @@
+-- 多机共享的广告检查队列（scripts/work_queue.py）
+-- 每台机器用 SELECT ... FOR UPDATE SKIP LOCKED 领取一批域名并写入租约（owner + 到期时间），
+-- 处理期间心跳续租；进程挂掉后租约过期，其他机器会重新领取
+
+CREATE TABLE IF NOT EXISTS ad_check_queue (
+    domain VARCHAR(255) PRIMARY KEY,
+    priority INTEGER NOT NULL DEFAULT -1,          -- estimated_monthly_visits，越大越先检查
+    status VARCHAR(10) NOT NULL DEFAULT 'pending', -- pending / leased / done / failed
+    lease_owner VARCHAR(100),                      -- 主机名:pid
+    lease_expires_at TIMESTAMP,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_ad_check_queue_claim
+    ON ad_check_queue (priority DESC, domain)
+    WHERE status IN ('pending', 'leased');
+
+CREATE INDEX IF NOT EXISTS idx_ad_check_queue_owner
+    ON ad_check_queue (lease_owner)
+    WHERE status = 'leased';
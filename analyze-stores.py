@@ -5,19 +5,26 @@
 """
 import os
 import sys
-import psycopg2
 import requests
 from bs4 import BeautifulSoup
 import time
 import json
 from datetime import datetime
 from urllib.parse import urlparse
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent / 'scripts'))
+from db_config import pool_metrics, pooled_connection
+from work_list import WorkList
 
 # 配置
 DATABASE_URL = os.environ.get('DATABASE_URL')
 BATCH_SIZE = 50  # 每批处理的店铺数量
 DELAY_SECONDS = 2  # 请求间隔，避免被封
 
+# 待分析：未分析 / pending 的活跃店铺
+PENDING_WHERE = "(analysis_status IS NULL OR analysis_status = 'pending') AND status = 'Active'"
+
 if not DATABASE_URL:
     print("ERROR: Please set DATABASE_URL environment variable")
     sys.exit(1)
@@ -207,24 +214,16 @@ class StoreAnalyzer:
         return min(score, 100)
 
 
-def analyze_batch(analyzer, limit=BATCH_SIZE, offset=0):
-    """批量分析店铺"""
-    conn = psycopg2.connect(DATABASE_URL)
+def analyze_batch(analyzer, stores):
+    """批量分析店铺（连接来自进程内连接池，批次之间复用）"""
+    with pooled_connection() as conn:
+        return _analyze_batch(conn, analyzer, stores)
+
+
+def _analyze_batch(conn, analyzer, stores):
     cur = conn.cursor()
 
     try:
-        # 获取待分析的店铺
-        cur.execute("""
-            SELECT id, domain, domain_url
-            FROM stores
-            WHERE (analysis_status IS NULL OR analysis_status = 'pending')
-                AND status = 'Active'
-            ORDER BY estimated_monthly_visits DESC NULLS LAST
-            LIMIT %s OFFSET %s
-        """, (limit, offset))
-
-        stores = cur.fetchall()
-
         if not stores:
             print("No stores to analyze")
             return 0
@@ -301,7 +300,6 @@ def analyze_batch(analyzer, limit=BATCH_SIZE, offset=0):
 
     finally:
         cur.close()
-        conn.close()
 
 
 def main():
@@ -317,17 +315,9 @@ def main():
     analyzer = StoreAnalyzer()
 
     # 获取待分析总数
-    conn = psycopg2.connect(DATABASE_URL)
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT COUNT(*)
-        FROM stores
-        WHERE (analysis_status IS NULL OR analysis_status = 'pending')
-            AND status = 'Active'
-    """)
-    total_pending = cur.fetchone()[0]
-    cur.close()
-    conn.close()
+    # 按访问量从高到低 keyset 分页读取（不用 OFFSET：已分析的店铺离开过滤条件后不会跳行）
+    work = WorkList(PENDING_WHERE, columns=('id', 'domain', 'domain_url'), page_size=BATCH_SIZE)
+    total_pending = work.count()
 
     print(f"\nTotal stores to analyze: {total_pending:,}")
 
@@ -347,25 +337,25 @@ def main():
 
     # 批量分析
     total_analyzed = 0
-    offset = 0
+    seen = 0
 
-    while offset < total_pending:
+    for batch_number, stores in enumerate(work.pages(), 1):
         print(f"\n{'='*60}")
-        print(f"Batch {offset//BATCH_SIZE + 1} (offset: {offset})")
+        print(f"Batch {batch_number} ({len(stores)} stores)")
         print(f"{'='*60}")
 
-        count = analyze_batch(analyzer, limit=BATCH_SIZE, offset=offset)
+        count = analyze_batch(analyzer, stores)
 
         if count == 0:
             break
 
         total_analyzed += count
-        offset += BATCH_SIZE
+        seen += len(stores)
 
         print(f"\nProgress: {total_analyzed:,} / {total_pending:,} analyzed")
 
         # 询问是否继续
-        if offset < total_pending:
+        if seen < total_pending:
             if len(sys.argv) > 1 and sys.argv[1] == '--auto':
                 continue
             else:
@@ -376,6 +366,9 @@ def main():
     print(f"\n{'='*60}")
     print(f"✓ Analysis complete!")
     print(f"  Total analyzed: {total_analyzed:,}")
+    metrics = pool_metrics()
+    print(f"  DB pool: {metrics['hits']}/{metrics['checkouts']} checkouts reused, "
+          f"{metrics['connects']} connects (avg {metrics['avg_connect_ms']:.0f}ms)")
     print(f"{'='*60}")
 
 
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark COPY paths for loading a storeleads CSV into a staging table
+
+Loads the same input three ways and reports time, rows/s and bytes sent:
+  csv     raw file, COPY ... WITH (FORMAT CSV): the server parses everything
+  text    client-cleaned COPY text stream (scripts/copy_encoder.py)
+  binary  client-encoded binary COPY: native int4 / date, length-prefixed text
+
+Every run goes into a temp scratch table (the staging table staged_upsert uses)
+that is dropped with its transaction; stores itself is not modified.
+
+Usage:
+    python3 benchmark-copy.py <csv_file> [--encode-only]
+
+--encode-only: measure client-side encoding only (no database needed)
+"""
+
+import csv
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent / 'scripts'))
+from copy_encoder import CopyBinaryStream, CopyTextStream
+from parallel_csv import STORE_COLUMNS
+
+SCRATCH_TABLE = 'stores_copy_benchmark'
+READ_SIZE = 64 * 1024
+
+
+class CountingReader:
+    """Pass-through reader that counts the bytes handed to COPY"""
+
+    def __init__(self, source):
+        self.source = source
+        self.bytes = 0
+
+    def read(self, size=-1):
+        chunk = self.source.read(size)
+        self.bytes += len(chunk.encode('utf-8')) if isinstance(chunk, str) else len(chunk)
+        return chunk
+
+    def readline(self, size=-1):
+        line = self.source.readline(size)
+        self.bytes += len(line.encode('utf-8')) if isinstance(line, str) else len(line)
+        return line
+
+
+def encode_only(csv_file):
+    for name, stream_class in [('text', CopyTextStream), ('binary', CopyBinaryStream)]:
+        with open(csv_file, 'r', encoding='utf-8', newline='') as f:
+            start = time.time()
+            stream = stream_class(csv.reader(f))
+            sent = 0
+            while True:
+                chunk = stream.read(READ_SIZE)
+                if not chunk:
+                    break
+                sent += len(chunk.encode('utf-8')) if isinstance(chunk, str) else len(chunk)
+            seconds = time.time() - start
+        print(f"  {name:<7} {seconds:7.2f}s  {stream.encoded / seconds:>10,.0f} rows/s  "
+              f"{sent / 1024 / 1024:8.1f} MB  ({stream.rejected:,} rejected)")
+
+
+def run_copy(conn, name, csv_file):
+    from staged_upsert import create_staging_table
+
+    cur = conn.cursor()
+    # Temp table, dropped by the commit after the COPY
+    create_staging_table(cur, SCRATCH_TABLE)
+
+    with open(csv_file, 'r', encoding='utf-8', newline='') as f:
+        start = time.time()
+        if name == 'csv':
+            reader = CountingReader(f)
+            cur.copy_expert(f"""
+                COPY {SCRATCH_TABLE} ({', '.join(STORE_COLUMNS)})
+                FROM STDIN
+                WITH (FORMAT CSV, HEADER true, DELIMITER ',', NULL '', QUOTE '"', ESCAPE '"')
+            """, reader)
+        else:
+            stream = (CopyTextStream if name == 'text' else CopyBinaryStream)(csv.reader(f))
+            reader = CountingReader(stream)
+            cur.copy_expert(f"COPY {SCRATCH_TABLE} ({', '.join(stream.copy_columns)}) "
+                            f"FROM STDIN {stream.copy_options}", reader)
+        rows = cur.rowcount
+        conn.commit()
+        seconds = time.time() - start
+
+    cur.close()
+    print(f"  {name:<7} {seconds:7.2f}s  {rows / seconds:>10,.0f} rows/s  "
+          f"{reader.bytes / 1024 / 1024:8.1f} MB sent  ({reader.bytes / 1024 / 1024 / seconds:.1f} MB/s)")
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    if not args:
+        print("Usage: python3 benchmark-copy.py <csv_file> [--encode-only]")
+        sys.exit(1)
+    csv_file = args[0]
+
+    print(f"Input: {csv_file} ({os.path.getsize(csv_file) / 1024 / 1024:.1f} MB)")
+    if '--encode-only' in sys.argv:
+        print("Client-side encoding:")
+        encode_only(csv_file)
+        return
+
+    import psycopg2
+
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        print("ERROR: Please set DATABASE_URL environment variable")
+        sys.exit(1)
+
+    conn = psycopg2.connect(database_url)
+    try:
+        print("COPY into a temp scratch table:")
+        for name in ('csv', 'text', 'binary'):
+            run_copy(conn, name, csv_file)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,7 @@
+-- 增量刷新：每行内容哈希
+-- 由 scripts/change_tracking.py 计算（44 个导入列清洗后的 BLAKE2b-128），
+-- 刷新时只发送新增 / 变化的店铺
+
+ALTER TABLE stores ADD COLUMN IF NOT EXISTS content_hash CHAR(32);
+
+COMMENT ON COLUMN stores.content_hash IS 'Hash of the normalized export columns, used by incremental refreshes';
@@ -2,12 +2,33 @@
 """
 Fast import using PostgreSQL COPY command
 Import stores data 10-20x faster than INSERT
+
+Usage:
+    python3 fast-import.py            # COPY straight into stores (fresh table)
+    python3 fast-import.py --upsert   # COPY into a staging table, then merge
+                                      # (incremental refresh, duplicates are fine)
+
+    --binary          encode rows client-side in binary COPY format (native
+                      int4/date, length-prefixed text; bad rows go to
+                      <csv>.rejects.csv). Compare with: benchmark-copy.py
+    --defer-indexes   drop the non-unique indexes on stores during the load and
+                      rebuild them in parallel afterwards (refuses to run while
+                      other sessions use the table; --ignore-traffic overrides)
 """
 
+import csv
 import psycopg2
 import os
 import sys
+from contextlib import contextmanager
 from datetime import datetime
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent / 'scripts'))
+from geo_index import backfill_geo
+from staged_upsert import staged_upsert
+from copy_encoder import CopyBinaryStream
+from bulk_load import LiveTrafficError, deferred_indexes
 
 DATABASE_URL = os.environ.get('DATABASE_URL')
 
@@ -21,6 +42,22 @@ FILES_TO_IMPORT = [
     ('storeleads/us-stores-premium-1000plus.csv', 'US Premium (≥1000 visits)'),
 ]
 
+BINARY = '--binary' in sys.argv
+
+@contextmanager
+def binary_copy_stream(csv_file):
+    """Binary COPY stream over csv_file; rejected rows go to <csv_file>.rejects.csv"""
+    reject_file = csv_file + '.rejects.csv'
+    with open(csv_file, 'r', encoding='utf-8', newline='') as f, \
+         open(reject_file, 'w', encoding='utf-8', newline='') as rejects:
+        stream = CopyBinaryStream(csv.reader(f), rejects=csv.writer(rejects))
+        yield stream
+
+    if stream.rejected:
+        print(f"  ⚠ Rejected {stream.rejected:,} rows (see {reject_file})")
+    else:
+        os.remove(reject_file)
+
 def fast_import_csv(csv_file, description):
     """Fast import using COPY command"""
     print(f"\n{'='*60}")
@@ -38,32 +75,43 @@ def fast_import_csv(csv_file, description):
     try:
         start_time = datetime.now()
 
-        # Use COPY command for super fast import
-        with open(csv_file, 'r', encoding='utf-8') as f:
-            # Skip header
-            next(f)
-
-            # COPY command - this is MUCH faster than INSERT
-            cur.copy_expert(
-                """
-                COPY stores (
-                    domain, about_us_url, aliases, categories, city, company_location,
-                    contact_page_url, country_code, created, description, domain_url,
-                    emails, employee_count, estimated_monthly_visits, estimated_yearly_sales,
-                    facebook, facebook_url, instagram, instagram_url, language_code,
-                    linkedin_account, linkedin_url, merchant_name, meta_description,
-                    phones, pinterest, pinterest_url, plan, platform, platform_rank,
-                    rank, region, state, status, street_address, tiktok, tiktok_url,
-                    title, twitter, twitter_url, whatsapp_url, youtube, youtube_url, zip
+        if BINARY:
+            with binary_copy_stream(csv_file) as stream:
+                cur.copy_expert(
+                    f"COPY stores ({', '.join(stream.copy_columns)}) FROM STDIN {stream.copy_options}",
+                    stream
+                )
+        else:
+            # Use COPY command for super fast import
+            with open(csv_file, 'r', encoding='utf-8') as f:
+                # Skip header
+                next(f)
+
+                # COPY command - this is MUCH faster than INSERT
+                cur.copy_expert(
+                    """
+                    COPY stores (
+                        domain, about_us_url, aliases, categories, city, company_location,
+                        contact_page_url, country_code, created, description, domain_url,
+                        emails, employee_count, estimated_monthly_visits, estimated_yearly_sales,
+                        facebook, facebook_url, instagram, instagram_url, language_code,
+                        linkedin_account, linkedin_url, merchant_name, meta_description,
+                        phones, pinterest, pinterest_url, plan, platform, platform_rank,
+                        rank, region, state, status, street_address, tiktok, tiktok_url,
+                        title, twitter, twitter_url, whatsapp_url, youtube, youtube_url, zip
+                    )
+                    FROM STDIN
+                    WITH (FORMAT CSV, DELIMITER ',', NULL '', QUOTE '"', ESCAPE '"')
+                    """,
+                    f
                 )
-                FROM STDIN
-                WITH (FORMAT CSV, DELIMITER ',', NULL '', QUOTE '"', ESCAPE '"')
-                """,
-                f
-            )
 
         conn.commit()
 
+        # COPY cannot compute columns: derive province / city_normalized for the new rows
+        geo_count = backfill_geo(conn)
+        print(f"  ✓ Geo index: {geo_count:,} rows tagged with province")
+
         # Get count
         cur.execute("SELECT COUNT(*) FROM stores WHERE country_code IN (SELECT DISTINCT country_code FROM (VALUES %s) AS t(code))",
                    (('CN',), ('HK',), ('US',)))
@@ -88,18 +136,75 @@ def fast_import_csv(csv_file, description):
         conn.close()
         return 0
 
+def upsert_import_csv(csv_file, description):
+    """COPY into a temporary staging table, then INSERT ... ON CONFLICT DO UPDATE"""
+    print(f"\n{'='*60}")
+    print(f"Upsert importing: {description}")
+    print(f"File: {csv_file}")
+    print(f"{'='*60}")
+
+    if not os.path.exists(csv_file):
+        print(f"❌ Error: File not found: {csv_file}")
+        return 0
+
+    conn = psycopg2.connect(DATABASE_URL)
+
+    try:
+        start_time = datetime.now()
+        if BINARY:
+            with binary_copy_stream(csv_file) as stream:
+                result = staged_upsert(conn, stream)
+        else:
+            result = staged_upsert(conn, csv_file)
+        duration = (datetime.now() - start_time).total_seconds()
+
+        print(f"\n✅ Upsert completed in {duration:.2f} seconds!")
+        print(f"  Staged:    {result['staged']:,}")
+        print(f"  Inserted:  {result['inserted']:,}")
+        print(f"  Updated:   {result['updated']:,}")
+        print(f"  Unchanged: {result['unchanged']:,}")
+        if result['skipped']:
+            print(f"  Skipped:   {result['skipped']:,} (duplicate or empty domain)")
+        return 1
+
+    except Exception as e:
+        print(f"\n❌ Error during upsert: {e}")
+        import traceback
+        traceback.print_exc()
+        return 0
+
+    finally:
+        conn.close()
+
 def main():
     """Main import function"""
+    upsert = '--upsert' in sys.argv
+
     print("\n" + "="*60)
     print("FAST Import Using PostgreSQL COPY Command")
     print("="*60)
+    print(f"Mode: {'staging table + upsert' if upsert else 'direct COPY'}"
+          f"{' (binary)' if BINARY else ''}"
+          f"{' (deferred indexes)' if '--defer-indexes' in sys.argv else ''}")
     print(f"Target Database: Neon PostgreSQL")
     print(f"Start Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
     overall_start = datetime.now()
 
-    for csv_file, description in FILES_TO_IMPORT:
-        fast_import_csv(csv_file, description)
+    import_file = upsert_import_csv if upsert else fast_import_csv
+    if '--defer-indexes' in sys.argv:
+        try:
+            with deferred_indexes(lambda: psycopg2.connect(DATABASE_URL),
+                                  force='--ignore-traffic' in sys.argv):
+                for csv_file, description in FILES_TO_IMPORT:
+                    import_file(csv_file, description)
+        except LiveTrafficError as e:
+            print(f"❌ Refusing to drop indexes: {e}")
+            print("   Stop the checkers first, or pass --ignore-traffic")
+            sys.exit(1)
+    else:
+        for csv_file, description in FILES_TO_IMPORT:
+            import_file(csv_file, description)
 
     overall_end = datetime.now()
     total_duration = (overall_end - overall_start).total_seconds()
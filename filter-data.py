@@ -8,9 +8,14 @@ Keeps only the most valuable stores based on:
 - Sorts by monthly visits (top stores first)
 """
 import csv
+import heapq
 import os
+import sys
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).parent / 'scripts'))
+from parallel_csv import read_batches
+
 # Configuration
 CHUNKS_DIR = "/Users/grace/Downloads/ALL/下载ALLLL/chunks"
 OUTPUT_FILE = "/Users/grace/Downloads/ALL/下载ALLLL/shopify-storeleads-filtered.csv"
@@ -37,12 +42,56 @@ def get_sort_key(row):
     # Sort key: (active, has_visits, has_employees, visits, employees)
     return (is_active, has_visits, has_employees, visits, employees)
 
+def estimate_row_size(row):
+    """Estimated encoded size of a row in the output file"""
+    row_str = ','.join(str(v) for v in row.values()) + '\n'
+    return len(row_str.encode('utf-8'))
+
+class TopRowsSelector:
+    """Streaming top-K by get_sort_key, bounded by output size instead of input size
+
+    Keeps a min-heap of the best rows seen so far. The lowest-ranked row is
+    dropped as soon as the rows ranked above it already exceed the byte
+    budget, because it can then never make it into the output. Memory stays
+    around budget_bytes no matter how large the input is.
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self.heap = []
+        self.total_bytes = 0
+        self.seen = 0
+
+    def add(self, row):
+        size = estimate_row_size(row)
+        # -seen: among equal keys the later row ranks lower (same as a stable sort)
+        heapq.heappush(self.heap, (get_sort_key(row), -self.seen, size, row))
+        self.seen += 1
+        self.total_bytes += size
+
+        while self.total_bytes - self.heap[0][2] > self.budget_bytes:
+            _, _, dropped, _ = heapq.heappop(self.heap)
+            self.total_bytes -= dropped
+
+    def sorted_rows(self):
+        """Kept rows, most valuable first"""
+        ranked = sorted(self.heap, reverse=True)
+        return [(size, row) for _, _, size, row in ranked]
+
+def is_candidate(row):
+    """Basic filtering - skip obviously low-value stores (runs in worker processes)"""
+    status = row.get('status', '')
+    visits = row.get('estimated_monthly_visits', '')
+
+    # Keep if active OR has significant visits
+    return status == 'Active' or (visits and visits.isdigit() and int(visits) > 1000)
+
 def filter_and_merge():
     """Filter and merge CSV files"""
     print(f"Reading all CSV chunks from {CHUNKS_DIR}...")
     print(f"Target size: {TARGET_SIZE_MB}MB")
 
-    all_rows = []
+    selector = TopRowsSelector(TARGET_SIZE_BYTES)
     header = None
 
     # Read all CSV files
@@ -54,27 +103,27 @@ def filter_and_merge():
 
     print(f"Found {len(csv_files)} CSV files")
 
-    for csv_file in csv_files:
-        print(f"  Reading {csv_file.name}...")
-        with open(csv_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            if header is None:
-                header = reader.fieldnames
-
-            for row in reader:
-                # Basic filtering - skip obviously low-value stores
-                status = row.get('status', '')
-                visits = row.get('estimated_monthly_visits', '')
-
-                # Keep if active OR has significant visits
-                if status == 'Active' or (visits and visits.isdigit() and int(visits) > 1000):
-                    all_rows.append(row)
-
-    print(f"\nTotal rows after basic filtering: {len(all_rows):,}")
+    # All files are parsed and filtered on all cores in one pass (chunks planned across files);
+    # raw strings are kept so rows are written back unchanged
+    current_file = None
+    for batch in read_batches([str(f) for f in csv_files], where=is_candidate, types=None):
+        if batch.path != current_file:
+            if current_file is not None:
+                print(f"    kept {len(selector.heap):,} candidate rows ({selector.total_bytes/1024/1024:.1f}MB)")
+            current_file = batch.path
+            print(f"  Reading {Path(current_file).name}...")
+        if header is None:
+            header = batch.columns
+        # Only rows that can still fit in the target size are kept
+        for row in batch.as_dicts():
+            selector.add(row)
+    print(f"    kept {len(selector.heap):,} candidate rows ({selector.total_bytes/1024/1024:.1f}MB)")
+
+    print(f"\nTotal rows after basic filtering: {selector.seen:,}")
 
     # Sort by value (most valuable stores first)
     print("Sorting by value (monthly visits, employee count, etc.)...")
-    all_rows.sort(key=get_sort_key, reverse=True)
+    all_rows = selector.sorted_rows()
 
     # Write filtered data until we reach target size
     print(f"Writing filtered data to {OUTPUT_FILE}...")
@@ -90,11 +139,7 @@ def filter_and_merge():
         header_size = f.tell()
         current_size = header_size
 
-        for row in all_rows:
-            # Estimate row size
-            row_str = ','.join(str(v) for v in row.values()) + '\n'
-            row_size = len(row_str.encode('utf-8'))
-
+        for row_size, row in all_rows:
             # Check if we would exceed target size
             if current_size + row_size > TARGET_SIZE_BYTES:
                 break
@@ -114,8 +159,8 @@ def filter_and_merge():
 
     # Show some statistics
     print(f"\n📊 Statistics:")
-    active_count = sum(1 for row in all_rows[:rows_written] if row.get('status') == 'Active')
-    with_visits = sum(1 for row in all_rows[:rows_written]
+    active_count = sum(1 for _, row in all_rows[:rows_written] if row.get('status') == 'Active')
+    with_visits = sum(1 for _, row in all_rows[:rows_written]
                      if row.get('estimated_monthly_visits', '').isdigit()
                      and int(row.get('estimated_monthly_visits', 0)) > 0)
 
@@ -124,7 +169,7 @@ def filter_and_merge():
 
     if rows_written > 0:
         # Get top store info
-        top_store = all_rows[0]
+        top_store = all_rows[0][1]
         print(f"\n🏆 Top store:")
         print(f"  Name: {top_store.get('merchant_name', 'N/A')}")
         print(f"  Domain: {top_store.get('domain', 'N/A')}")
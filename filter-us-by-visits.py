@@ -3,11 +3,18 @@
 Filter US stores by monthly visits:
 - Premium stores (monthly visits >= 1000)
 - Regular stores (monthly visits < 1000 or no data)
+
+Rows are copied byte-for-byte from the input (see scripts/csv_partitioner.py).
+partition-storeleads.py produces the same two files straight from the full
+export without the intermediate us-stores.csv.
 """
 
-import csv
 import os
-from collections import defaultdict
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent / 'scripts'))
+from csv_partitioner import Predicate, Sink, parse_visits, partition, visits_at_least
 
 # Input file
 INPUT_FILE = 'storeleads/us-stores.csv'
@@ -19,69 +26,42 @@ OUTPUT_REGULAR = 'storeleads/us-stores-regular.csv'
 # Threshold
 VISIT_THRESHOLD = 1000
 
+
+def visit_sinks(base=None):
+    """Premium/regular sinks, optionally restricted by a base predicate"""
+    premium = visits_at_least(VISIT_THRESHOLD)
+    regular = ~premium
+    if base is not None:
+        premium, regular = base & premium, base & regular
+    return [
+        Sink(OUTPUT_PREMIUM, premium, name='premium'),
+        Sink(OUTPUT_REGULAR, regular, name='regular'),
+    ]
+
+
+def visit_stat_sinks(base=None):
+    """Counting-only sinks for rows with missing or invalid visit data"""
+    no_data = Predicate(('estimated_monthly_visits',),
+                        lambda r: not r['estimated_monthly_visits'].strip())
+    invalid = Predicate(('estimated_monthly_visits',),
+                        lambda r: bool(r['estimated_monthly_visits'].strip())
+                        and parse_visits(r['estimated_monthly_visits']) is None)
+    if base is not None:
+        no_data, invalid = base & no_data, base & invalid
+    return [
+        Sink(None, no_data, name='no_data'),
+        Sink(None, invalid, name='invalid_data'),
+    ]
+
+
 def filter_by_visits():
     """Filter US stores by monthly visit threshold"""
 
     print(f"Reading from: {INPUT_FILE}")
     print(f"Filtering by monthly visits >= {VISIT_THRESHOLD:,}\n")
 
-    # Statistics
-    stats = defaultdict(int)
-
-    # Open all files
-    with open(INPUT_FILE, 'r', encoding='utf-8') as infile:
-        reader = csv.DictReader(infile)
-
-        # Get header
-        fieldnames = reader.fieldnames
-
-        # Open output files
-        premium_file = open(OUTPUT_PREMIUM, 'w', encoding='utf-8', newline='')
-        regular_file = open(OUTPUT_REGULAR, 'w', encoding='utf-8', newline='')
-
-        # Create writers
-        premium_writer = csv.DictWriter(premium_file, fieldnames=fieldnames)
-        regular_writer = csv.DictWriter(regular_file, fieldnames=fieldnames)
-
-        # Write headers
-        premium_writer.writeheader()
-        regular_writer.writeheader()
-
-        # Process each row
-        row_count = 0
-        for row in reader:
-            row_count += 1
-
-            # Show progress every 50k rows
-            if row_count % 50000 == 0:
-                print(f"Processed {row_count:,} rows...")
-
-            # Get monthly visits
-            visits_str = row.get('estimated_monthly_visits', '').strip()
-
-            try:
-                if visits_str:
-                    visits = int(visits_str)
-                    if visits >= VISIT_THRESHOLD:
-                        premium_writer.writerow(row)
-                        stats['premium'] += 1
-                    else:
-                        regular_writer.writerow(row)
-                        stats['regular'] += 1
-                else:
-                    # No visit data - goes to regular
-                    regular_writer.writerow(row)
-                    stats['regular'] += 1
-                    stats['no_data'] += 1
-            except ValueError:
-                # Invalid visit data - goes to regular
-                regular_writer.writerow(row)
-                stats['regular'] += 1
-                stats['invalid_data'] += 1
-
-        # Close files
-        premium_file.close()
-        regular_file.close()
+    stats = partition(INPUT_FILE, visit_sinks() + visit_stat_sinks(), progress_every=50000)
+    row_count = stats['total']
 
     # Print statistics
     print(f"\n{'='*60}")
@@ -0,0 +1,15 @@
+-- 地理索引：归一化的省份 / 城市
+-- 由 scripts/geo_index.py 在导入时计算（中文 / 拼音城市别名词典），
+-- 替代 city LIKE '%杭州%' OR city LIKE '%Hangzhou%' ... 这类无法走索引的查询
+
+ALTER TABLE stores ADD COLUMN IF NOT EXISTS province VARCHAR(10);        -- ISO 3166-2，如 CN-ZJ
+ALTER TABLE stores ADD COLUMN IF NOT EXISTS city_normalized VARCHAR(100); -- 如 Hangzhou
+
+-- 省份 + 流量：WHERE province = 'CN-ZJ' AND estimated_monthly_visits >= ... ORDER BY visits DESC
+CREATE INDEX IF NOT EXISTS idx_stores_province_visits ON stores(province, estimated_monthly_visits DESC);
+CREATE INDEX IF NOT EXISTS idx_stores_city_normalized ON stores(city_normalized);
+
+COMMENT ON COLUMN stores.province IS 'ISO 3166-2 province code derived from city/state/company_location';
+COMMENT ON COLUMN stores.city_normalized IS 'Canonical (pinyin) city name derived from city';
+
+-- 已有数据回填: python3 scripts/geo_index.py
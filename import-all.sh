@@ -14,25 +14,18 @@ if [ ! -d "$CHUNKS_DIR" ]; then
     exit 1
 fi
 
-echo "Starting import of all CSV chunks..."
-echo "This may take 1-2 hours depending on your connection speed."
+WORKERS="${IMPORT_WORKERS:-4}"
+
+echo "Starting import of all CSV chunks with $WORKERS parallel COPY streams..."
+echo "Finished chunks are recorded in $CHUNKS_DIR/.import-manifest.json;"
+echo "re-running after a failure only loads the missing chunks."
 echo ""
 
-for file in "$CHUNKS_DIR"/shopify-storeleads-part*.csv; do
-    if [ -f "$file" ]; then
-        echo "================================================"
-        echo "Importing: $(basename "$file")"
-        echo "================================================"
-        python3 import-to-neon.py "$file"
-        if [ $? -eq 0 ]; then
-            echo "✓ Successfully imported $(basename "$file")"
-        else
-            echo "✗ Failed to import $(basename "$file")"
-            exit 1
-        fi
-        echo ""
-    fi
-done
+python3 parallel-import.py "$CHUNKS_DIR" --workers "$WORKERS" --pattern 'shopify-storeleads-part*.csv' "$@"
+if [ $? -ne 0 ]; then
+    echo "✗ Import failed (re-run to resume)"
+    exit 1
+fi
 
 echo "================================================"
 echo "✓ All chunks imported successfully!"
@@ -10,6 +10,11 @@ import psycopg2
 import os
 import sys
 from datetime import datetime
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent / 'scripts'))
+from copy_encoder import CopyTextStream
+from staged_upsert import staged_upsert
 
 # Database connection
 DATABASE_URL = os.environ.get('DATABASE_URL')
@@ -25,27 +30,13 @@ FILES_TO_IMPORT = [
     ('storeleads/us-stores-premium-1000plus.csv', 'US Premium (≥1000 visits)'),
 ]
 
-def clean_value(value):
-    """Clean and prepare value for database insertion"""
-    if value is None or value == '':
-        return None
-    # Remove extra whitespace
-    value = value.strip()
-    if value == '':
-        return None
-    return value
-
-def parse_int(value):
-    """Parse integer value"""
-    if not value:
-        return None
-    try:
-        return int(value)
-    except (ValueError, TypeError):
-        return None
-
 def import_csv_to_db(csv_file, description):
-    """Import CSV file to database"""
+    """Import CSV file to database
+
+    Rows are cleaned and encoded as a COPY stream while the CSV is read,
+    loaded into a staging table and merged with ON CONFLICT (domain) DO NOTHING.
+    Rows the database would refuse go to <csv_file>.rejects.csv.
+    """
     print(f"\n{'='*60}")
     print(f"Importing: {description}")
     print(f"File: {csv_file}")
@@ -56,128 +47,33 @@ def import_csv_to_db(csv_file, description):
         return 0
 
     conn = psycopg2.connect(DATABASE_URL)
-    cur = conn.cursor()
-
-    # Prepare INSERT statement
-    insert_sql = """
-        INSERT INTO stores (
-            domain, about_us_url, aliases, categories, city, company_location,
-            contact_page_url, country_code, created, description, domain_url,
-            emails, employee_count, estimated_monthly_visits, estimated_yearly_sales,
-            facebook, facebook_url, instagram, instagram_url, language_code,
-            linkedin_account, linkedin_url, merchant_name, meta_description,
-            phones, pinterest, pinterest_url, plan, platform, platform_rank,
-            rank, region, state, status, street_address, tiktok, tiktok_url,
-            title, twitter, twitter_url, whatsapp_url, youtube, youtube_url, zip
-        ) VALUES (
-            %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-            %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-            %s, %s, %s, %s
-        )
-        ON CONFLICT (domain) DO NOTHING
-    """
+    reject_file = csv_file + '.rejects.csv'
+    start_time = datetime.now()
+
+    try:
+        with open(csv_file, 'r', encoding='utf-8', newline='') as f, \
+             open(reject_file, 'w', encoding='utf-8', newline='') as rejects:
+            stream = CopyTextStream(csv.reader(f), rejects=csv.writer(rejects))
+            result = staged_upsert(conn, stream, update=False)
+    except Exception as e:
+        print(f"  ⚠ Import error: {e}")
+        conn.close()
+        return 0
 
-    imported_count = 0
-    skipped_count = 0
-    error_count = 0
-
-    with open(csv_file, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-
-        batch = []
-        batch_size = 1000
-
-        for row_num, row in enumerate(reader, start=1):
-            try:
-                # Prepare values
-                values = (
-                    clean_value(row.get('domain')),
-                    clean_value(row.get('about_us_url')),
-                    clean_value(row.get('aliases')),
-                    clean_value(row.get('categories')),
-                    clean_value(row.get('city')),
-                    clean_value(row.get('company_location')),
-                    clean_value(row.get('contact_page_url')),
-                    clean_value(row.get('country_code')),
-                    clean_value(row.get('created')),
-                    clean_value(row.get('description')),
-                    clean_value(row.get('domain_url')),
-                    clean_value(row.get('emails')),
-                    parse_int(row.get('employee_count')),
-                    parse_int(row.get('estimated_monthly_visits')),
-                    clean_value(row.get('estimated_yearly_sales')),
-                    clean_value(row.get('facebook')),
-                    clean_value(row.get('facebook_url')),
-                    clean_value(row.get('instagram')),
-                    clean_value(row.get('instagram_url')),
-                    clean_value(row.get('language_code')),
-                    clean_value(row.get('linkedin_account')),
-                    clean_value(row.get('linkedin_url')),
-                    clean_value(row.get('merchant_name')),
-                    clean_value(row.get('meta_description')),
-                    clean_value(row.get('phones')),
-                    clean_value(row.get('pinterest')),
-                    clean_value(row.get('pinterest_url')),
-                    clean_value(row.get('plan')),
-                    clean_value(row.get('platform')),
-                    parse_int(row.get('platform_rank')),
-                    parse_int(row.get('rank')),
-                    clean_value(row.get('region')),
-                    clean_value(row.get('state')),
-                    clean_value(row.get('status')),
-                    clean_value(row.get('street_address')),
-                    clean_value(row.get('tiktok')),
-                    clean_value(row.get('tiktok_url')),
-                    clean_value(row.get('title')),
-                    clean_value(row.get('twitter')),
-                    clean_value(row.get('twitter_url')),
-                    clean_value(row.get('whatsapp_url')),
-                    clean_value(row.get('youtube')),
-                    clean_value(row.get('youtube_url')),
-                    clean_value(row.get('zip')),
-                )
-
-                batch.append(values)
-
-                # Execute batch
-                if len(batch) >= batch_size:
-                    try:
-                        cur.executemany(insert_sql, batch)
-                        conn.commit()
-                        imported_count += len(batch)
-                        batch = []
-
-                        if imported_count % 10000 == 0:
-                            print(f"  ✓ Imported {imported_count:,} rows...")
-                    except Exception as e:
-                        print(f"  ⚠ Batch error at row {row_num}: {e}")
-                        conn.rollback()
-                        error_count += len(batch)
-                        batch = []
-
-            except Exception as e:
-                print(f"  ⚠ Row {row_num} error: {e}")
-                error_count += 1
-
-        # Insert remaining batch
-        if batch:
-            try:
-                cur.executemany(insert_sql, batch)
-                conn.commit()
-                imported_count += len(batch)
-            except Exception as e:
-                print(f"  ⚠ Final batch error: {e}")
-                conn.rollback()
-                error_count += len(batch)
-
-    cur.close()
     conn.close()
+    duration = (datetime.now() - start_time).total_seconds()
+    imported_count = result['inserted']
+
+    if stream.rejected == 0:
+        os.remove(reject_file)
 
     print(f"\n{'='*60}")
     print(f"Import completed for: {description}")
     print(f"  ✓ Successfully imported: {imported_count:,} rows")
-    if error_count > 0:
-        print(f"  ⚠ Errors: {error_count:,} rows")
+    print(f"  ✓ Already in database: {result['staged'] - result['skipped'] - imported_count:,} rows")
+    print(f"  ✓ Throughput: {stream.encoded / max(duration, 1e-9):,.0f} rows/s")
+    if stream.rejected > 0:
+        print(f"  ⚠ Rejected: {stream.rejected:,} rows (see {reject_file})")
     print(f"{'='*60}\n")
 
     return imported_count
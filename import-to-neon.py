@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 """
 Import CSV data to Neon PostgreSQL database
-Usage: python import-to-neon.py <csv_file_path>
+Usage: python import-to-neon.py <csv_file_path> [--upsert]
+
+--upsert: COPY into a temporary staging table and merge with
+          INSERT ... ON CONFLICT (domain) DO UPDATE (changed rows only)
 """
 import os
 import sys
@@ -9,6 +12,10 @@ import csv
 import psycopg2
 from psycopg2.extras import execute_batch
 from datetime import datetime
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent / 'scripts'))
+from staged_upsert import staged_upsert
 
 # Database connection - Set these environment variables
 DATABASE_URL = os.environ.get('DATABASE_URL')
@@ -148,16 +155,37 @@ def import_csv_to_database(csv_file_path, batch_size=1000):
         cur.close()
         conn.close()
 
+def upsert_csv_to_database(csv_file_path):
+    """COPY-speed import that updates existing domains instead of skipping them"""
+    print(f"Connecting to database...")
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        print(f"Staging and merging: {csv_file_path}")
+        result = staged_upsert(conn, csv_file_path)
+        print(f"\n✓ Upsert complete!")
+        print(f"  Total rows staged: {result['staged']:,}")
+        print(f"  Inserted: {result['inserted']:,}")
+        print(f"  Updated: {result['updated']:,}")
+        print(f"  Unchanged: {result['unchanged']:,}")
+        if result['skipped']:
+            print(f"  Skipped (duplicate/empty domain): {result['skipped']:,}")
+    finally:
+        conn.close()
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python import-to-neon.py <csv_file_path>")
-        print("\nTo import all chunks:")
-        print("  for file in chunks/*.csv; do python import-to-neon.py \"$file\"; done")
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    if not args:
+        print("Usage: python import-to-neon.py <csv_file_path> [--upsert]")
+        print("\nTo import all chunks (parallel, resumable):")
+        print("  python parallel-import.py chunks/ --workers 4")
         sys.exit(1)
 
-    csv_file = sys.argv[1]
+    csv_file = args[0]
     if not os.path.exists(csv_file):
         print(f"ERROR: File not found: {csv_file}")
         sys.exit(1)
 
-    import_csv_to_database(csv_file)
+    if '--upsert' in sys.argv:
+        upsert_csv_to_database(csv_file)
+    else:
+        import_csv_to_database(csv_file)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Parallel import of a directory of CSV chunks to Neon PostgreSQL
+
+Runs N concurrent COPY streams over a small connection pool. Every chunk is
+COPYed into a temp staging table on its worker's connection and merged
+into stores in one transaction (scripts/staged_upsert.py), so a chunk is
+either fully loaded or not at all. The staging table is dropped with that
+transaction; nothing is left behind in the database.
+
+Chunks are streamed through copy_encoder.CopyTextStream: columns are
+mapped by header name and cleaned like import-to-neon.py did (bad numbers
+/ dates become NULL). Rows the database would refuse go to
+<chunk>.rejects.csv instead of failing the chunk.
+
+Finished chunks are recorded in <chunks_dir>/.import-manifest.json (keyed by
+file name, size and mtime). Re-running after a crash only loads the chunks
+that are missing from the manifest; --force reloads everything.
+
+Usage:
+    python3 parallel-import.py <chunks_dir> [--workers 4] [--pattern '*.csv'] [--upsert] [--force]
+
+--upsert: update existing domains (ON CONFLICT DO UPDATE) instead of skipping them
+--defer-indexes: drop non-unique indexes for the load, rebuild them in parallel
+                 afterwards and ANALYZE (see scripts/bulk_load.py)
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+sys.path.append(str(Path(__file__).parent / 'scripts'))
+from geo_index import backfill_geo
+from bulk_load import LiveTrafficError, deferred_indexes
+from copy_encoder import CopyTextStream
+from staged_upsert import staged_upsert
+
+DATABASE_URL = os.environ.get('DATABASE_URL')
+
+MANIFEST_NAME = '.import-manifest.json'
+CHUNK_PATTERN = '*.csv'
+REJECTS_SUFFIX = '.rejects.csv'
+
+
+class Manifest:
+    """Per-chunk completion record, rewritten atomically after every chunk"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = json.loads(path.read_text()) if path.exists() else {}
+
+    @staticmethod
+    def _signature(chunk: Path) -> dict:
+        st = chunk.stat()
+        return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+    def is_done(self, chunk: Path) -> bool:
+        entry = self.entries.get(chunk.name)
+        if not entry:
+            return False
+        signature = self._signature(chunk)
+        return entry['size'] == signature['size'] and entry['mtime_ns'] == signature['mtime_ns']
+
+    def mark_done(self, chunk: Path, result: dict):
+        with self.lock:
+            self.entries[chunk.name] = dict(self._signature(chunk), **result, finished_at=time.time())
+            tmp = self.path.with_suffix('.tmp')
+            tmp.write_text(json.dumps(self.entries, indent=2))
+            os.replace(tmp, self.path)
+
+
+class ParallelLoader:
+    def __init__(self, chunks_dir: Path, workers: int = 4, update: bool = False):
+        self.chunks_dir = chunks_dir
+        self.workers = workers
+        self.update = update
+        self.manifest = Manifest(chunks_dir / MANIFEST_NAME)
+        self.pool = ThreadedConnectionPool(1, workers, DATABASE_URL)
+
+    def load_chunk(self, chunk: Path) -> dict:
+        reject_file = chunk.with_name(chunk.name + REJECTS_SUFFIX)
+        conn = self.pool.getconn()
+        try:
+            start = time.time()
+            with open(chunk, 'r', encoding='utf-8', newline='') as f, \
+                 open(reject_file, 'w', encoding='utf-8', newline='') as rejects:
+                stream = CopyTextStream(csv.reader(f), rejects=csv.writer(rejects))
+                # Temp staging table: private to this connection, so concurrent chunks never share one
+                result = staged_upsert(conn, stream, update=self.update, derive_geo=False)
+            result['seconds'] = time.time() - start
+            result['bytes'] = chunk.stat().st_size
+            result['rejected'] = stream.rejected
+        finally:
+            self.pool.putconn(conn)
+        if result['rejected'] == 0:
+            reject_file.unlink()
+        self.manifest.mark_done(chunk, result)
+        return result
+
+    def run(self, pattern: str = CHUNK_PATTERN, force: bool = False):
+        chunks = sorted(c for c in self.chunks_dir.glob(pattern) if not c.name.endswith(REJECTS_SUFFIX))
+        pending = [c for c in chunks if force or not self.manifest.is_done(c)]
+
+        print(f"Chunks: {len(chunks)} total, {len(chunks) - len(pending)} already loaded, "
+              f"{len(pending)} to load with {self.workers} workers")
+        if not pending:
+            return
+
+        start = time.time()
+        total_rows = total_bytes = total_rejected = failed = 0
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.load_chunk, chunk): chunk for chunk in pending}
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"  ✗ {chunk.name}: {e}")
+                    continue
+
+                total_rows += result['staged']
+                total_bytes += result['bytes']
+                total_rejected += result['rejected']
+                elapsed = time.time() - start
+                rejected = f", {result['rejected']:,} rejected" if result['rejected'] else ''
+                print(f"  ✓ {chunk.name}: {result['staged']:,} rows "
+                      f"(+{result['inserted']:,} new, {result['updated']:,} updated{rejected}) "
+                      f"in {result['seconds']:.1f}s | total {total_rows / elapsed:,.0f} rows/s, "
+                      f"{total_bytes / 1024 / 1024 / elapsed:.1f} MB/s")
+
+        conn = self.pool.getconn()
+        try:
+            print("Deriving province / city_normalized for the new rows...")
+            backfill_geo(conn)
+        finally:
+            self.pool.putconn(conn)
+        self.pool.closeall()
+
+        elapsed = time.time() - start
+        print(f"\n✓ Loaded {len(pending) - failed}/{len(pending)} chunks, {total_rows:,} rows "
+              f"in {elapsed:.1f}s ({total_rows / elapsed:,.0f} rows/s, "
+              f"{total_bytes / 1024 / 1024 / elapsed:.1f} MB/s)")
+        if total_rejected:
+            print(f"⚠ Rejected {total_rejected:,} rows (see {self.chunks_dir}/*{REJECTS_SUFFIX})")
+        if failed:
+            print(f"✗ {failed} chunks failed; re-run to retry only those")
+            sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallel COPY import of CSV chunks')
+    parser.add_argument('chunks_dir', type=Path)
+    parser.add_argument('--workers', type=int, default=4, help='concurrent COPY streams / connections')
+    parser.add_argument('--pattern', default=CHUNK_PATTERN, help='chunk file glob')
+    parser.add_argument('--upsert', action='store_true', help='update existing domains instead of skipping them')
+    parser.add_argument('--force', action='store_true', help='ignore the manifest and reload every chunk')
+    parser.add_argument('--defer-indexes', action='store_true', help='drop non-unique indexes during the load')
+    parser.add_argument('--ignore-traffic', action='store_true', help='defer indexes even if the table is in use')
+    args = parser.parse_args()
+
+    if not DATABASE_URL:
+        print("ERROR: Please set DATABASE_URL environment variable")
+        sys.exit(1)
+    if not args.chunks_dir.is_dir():
+        print(f"ERROR: Chunks directory not found: {args.chunks_dir}")
+        sys.exit(1)
+
+    loader = ParallelLoader(args.chunks_dir, args.workers, update=args.upsert)
+    if not args.defer_indexes:
+        loader.run(args.pattern, force=args.force)
+        return
+
+    try:
+        with deferred_indexes(lambda: psycopg2.connect(DATABASE_URL), force=args.ignore_traffic,
+                              workers=args.workers):
+            loader.run(args.pattern, force=args.force)
+    except LiveTrafficError as e:
+        print(f"ERROR: Refusing to drop indexes: {e}")
+        print("Stop the checkers first, or pass --ignore-traffic")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
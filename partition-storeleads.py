@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Partition the full Shopify store leads export in a single pass.
+
+Replaces running split-by-region.py, filter-us-by-visits.py and
+filter-vietnam-english.py one after another: the export is read once and
+each row is copied byte-for-byte into every output whose predicate matches.
+
+Usage:
+    python3 partition-storeleads.py [input.csv]
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent / 'scripts'))
+from csv_partitioner import Sink, country_in, language_is, partition, visits_at_least
+
+# Input file
+INPUT_FILE = 'storeleads/shopify-storeleads.csv'
+
+# Thresholds
+VISIT_THRESHOLD = 1000
+
+
+def build_sinks():
+    """All monthly-refresh outputs"""
+    china_hk = country_in('CN', 'HK')
+    us = country_in('US')
+    vietnam = country_in('VN')
+    premium = visits_at_least(VISIT_THRESHOLD)
+
+    return [
+        # Regions (split-by-region.py)
+        Sink('storeleads/china-hongkong-stores.csv', china_hk, name='china_hk'),
+        Sink('storeleads/us-stores.csv', us, name='us'),
+        Sink('storeleads/other-countries-stores.csv', ~(china_hk | us), name='other'),
+        # US by visits (filter-us-by-visits.py)
+        Sink('storeleads/us-stores-premium-1000plus.csv', us & premium, name='us_premium'),
+        Sink('storeleads/us-stores-regular.csv', us & ~premium, name='us_regular'),
+        # Language (filter-vietnam-english.py)
+        Sink('storeleads/vietnam-english-stores.csv', vietnam & language_is('en'), name='vietnam_english'),
+    ]
+
+
+def main():
+    input_file = sys.argv[1] if len(sys.argv) > 1 else INPUT_FILE
+    sinks = build_sinks()
+
+    print(f"Reading from: {input_file}")
+    print(f"Writing {len(sinks)} outputs in a single pass...\n")
+
+    start = time.time()
+    stats = partition(input_file, sinks)
+    elapsed = time.time() - start
+
+    print(f"\n{'='*60}")
+    print(f"Partitioning completed in {elapsed:.1f}s")
+    print(f"{'='*60}")
+    print(f"Total rows processed: {stats['total']:,}")
+    if elapsed > 0:
+        size_mb = os.path.getsize(input_file) / (1024 * 1024)
+        print(f"Throughput: {stats['total']/elapsed:,.0f} rows/s, {size_mb/elapsed:.1f} MB/s")
+
+    print(f"\nOutputs:")
+    for sink in sinks:
+        size_mb = os.path.getsize(sink.path) / (1024 * 1024)
+        print(f"  {sink.name:<16} {sink.rows:>10,} rows  {size_mb:>8.1f} MB  {sink.path}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\nProcess interrupted by user!")
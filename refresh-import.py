@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Incremental refresh of stores from a new storeleads export
+
+Streams the export, compares each row's content hash with the local
+domain -> hash cache (content_hashes.db) and sends only new and changed
+stores (see scripts/change_tracking.py). Requires change-tracking-schema.sql.
+
+Usage:
+    python3 refresh-import.py <shopify-storeleads.csv> [--reseed]
+
+--reseed: rebuild the local hash cache from the database first
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import psycopg2
+
+sys.path.append(str(Path(__file__).parent / 'scripts'))
+from change_tracking import DEFAULT_HASH_CACHE, incremental_refresh
+
+DATABASE_URL = os.environ.get('DATABASE_URL')
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    if not args:
+        print("Usage: python3 refresh-import.py <shopify-storeleads.csv> [--reseed]")
+        sys.exit(1)
+    if not DATABASE_URL:
+        print("ERROR: Please set DATABASE_URL environment variable")
+        sys.exit(1)
+
+    csv_file = args[0]
+    if not os.path.exists(csv_file):
+        print(f"ERROR: File not found: {csv_file}")
+        sys.exit(1)
+
+    if '--reseed' in sys.argv and DEFAULT_HASH_CACHE.exists():
+        DEFAULT_HASH_CACHE.unlink()
+
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        print(f"Refreshing from {csv_file}...")
+        report = incremental_refresh(conn, csv_file)
+    finally:
+        conn.close()
+
+    print(f"\n✅ Refresh completed in {report['seconds']:.1f}s")
+    print(f"  New:         {report['new']:,}")
+    print(f"  Changed:     {report['changed']:,}")
+    print(f"  Unchanged:   {report['unchanged']:,}")
+    print(f"  Disappeared: {report['disappeared']:,} (kept in the database)")
+    if report['rejected']:
+        print(f"  Rejected:    {report['rejected']:,} (see {csv_file}.rejects.csv)")
+
+
+if __name__ == '__main__':
+    main()
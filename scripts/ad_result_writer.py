@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Set-based writer for Google Ads check results.
+
+The checkers collect results in batches, but used to send one
+``UPDATE stores ... WHERE domain = %s`` per domain: one Neon round trip per
+row. Here a whole batch goes out as a single statement:
+
+- small batches: ``UPDATE stores ... FROM (VALUES ...)``
+- batches of COPY_THRESHOLD rows or more: COPY into a temp table, then
+  one ``UPDATE ... FROM`` join
+- asyncpg (async checkers): ``UPDATE ... FROM unnest($1::text[], ...)``
+
+Rows are dicts keyed by stores column names plus ``domain``; every row of
+a batch must carry the same columns. ``ads_check_level`` and
+``ads_last_checked = NOW()`` are set for every row. The return value is
+the number of stores rows matched (domains missing from stores are not
+counted). If a domain appears twice in a batch, its last row wins.
+
+Usage:
+    from ad_result_writer import bulk_update_ad_results
+    matched = bulk_update_ad_results(conn, [
+        {'domain': d, 'customer_type': t, 'has_google_ads': h, 'google_ads_count': n, 'google_ads_url': u},
+        ...
+    ], check_level='production_optimized')
+"""
+
+from typing import Dict, List, Sequence, Tuple
+
+from psycopg2.extras import execute_values
+
+# Writable result columns and the types used to cast the batch values
+AD_RESULT_COLUMNS = {
+    'customer_type': 'varchar',
+    'has_google_ads': 'boolean',
+    'is_new_customer': 'boolean',
+    'google_ads_count': 'integer',
+    'google_ads_url': 'text',
+}
+COPY_THRESHOLD = 1000
+TEMP_TABLE = 'ad_results_batch'
+
+_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def _prepare(rows: Sequence[Dict]) -> Tuple[List[str], List[tuple]]:
+    """Result columns of the batch and deduplicated (domain, ...) tuples"""
+    columns = [c for c in rows[0] if c != 'domain']
+    unknown = [c for c in columns if c not in AD_RESULT_COLUMNS]
+    if unknown:
+        raise ValueError(f"not an ad result column: {', '.join(unknown)}")
+    latest = {}
+    for row in rows:
+        latest[row['domain']] = tuple(row[c] for c in columns)
+    return columns, [(domain,) + values for domain, values in latest.items()]
+
+
+def _set_clause(columns: List[str], source: str) -> str:
+    assignments = [f"{c} = {source}.{c}" for c in columns]
+    assignments += ["ads_check_level = %(check_level)s", "ads_last_checked = NOW()"]
+    return ',\n                '.join(assignments)
+
+
+def _copy_text(values: tuple) -> str:
+    fields = []
+    for value in values:
+        if value is None:
+            fields.append('\\N')
+        elif isinstance(value, bool):
+            fields.append('t' if value else 'f')
+        else:
+            fields.append(str(value).translate(_ESCAPES))
+    return '\t'.join(fields) + '\n'
+
+
+class _Lines:
+    """Minimal file-like reader over COPY text lines"""
+
+    def __init__(self, lines):
+        self.lines = iter(lines)
+
+    def read(self, size=-1):
+        return next(self.lines, '')
+
+    readline = read
+
+
+def _update_via_values(cur, columns, tuples, check_level) -> int:
+    template = '(%s::varchar, ' + ', '.join(f'%s::{AD_RESULT_COLUMNS[c]}' for c in columns) + ')'
+    # execute_values only substitutes the VALUES placeholder, so the check
+    # level is bound separately
+    set_clause = _set_clause(columns, 'v').replace(
+        '%(check_level)s', cur.mogrify('%s', (check_level,)).decode())
+    execute_values(cur, f"""
+        UPDATE stores AS s SET
+                {set_clause}
+        FROM (VALUES %s) AS v (domain, {', '.join(columns)})
+        WHERE s.domain = v.domain
+    """, tuples, template=template, page_size=len(tuples))
+    return cur.rowcount
+
+
+def _update_via_copy(cur, columns, tuples, check_level) -> int:
+    column_defs = ', '.join(f'{c} {AD_RESULT_COLUMNS[c]}' for c in columns)
+    cur.execute(f"DROP TABLE IF EXISTS {TEMP_TABLE}")
+    cur.execute(f"CREATE TEMP TABLE {TEMP_TABLE} (domain varchar, {column_defs}) ON COMMIT DROP")
+    cur.copy_expert(f"COPY {TEMP_TABLE} (domain, {', '.join(columns)}) FROM STDIN",
+                    _Lines(_copy_text(t) for t in tuples))
+    cur.execute(f"""
+        UPDATE stores AS s SET
+                {_set_clause(columns, 't')}
+        FROM {TEMP_TABLE} AS t
+        WHERE s.domain = t.domain
+    """, {'check_level': check_level})
+    return cur.rowcount
+
+
+def bulk_update_ad_results(conn, rows: Sequence[Dict], check_level: str, commit: bool = True) -> int:
+    """Write a batch of results in one statement; returns matched rows"""
+    if not rows:
+        return 0
+    columns, tuples = _prepare(rows)
+    cur = conn.cursor()
+    try:
+        if len(tuples) >= COPY_THRESHOLD:
+            matched = _update_via_copy(cur, columns, tuples, check_level)
+        else:
+            matched = _update_via_values(cur, columns, tuples, check_level)
+        if commit:
+            conn.commit()
+        return matched
+    finally:
+        cur.close()
+
+
+async def bulk_update_ad_results_async(conn, rows: Sequence[Dict], check_level: str) -> int:
+    """asyncpg variant: one UPDATE ... FROM unnest(arrays); returns matched rows"""
+    if not rows:
+        return 0
+    columns, tuples = _prepare(rows)
+    arrays = [list(column) for column in zip(*tuples)]
+    unnest_args = ', '.join(
+        f'${i + 1}::{t}[]' for i, t in enumerate(['varchar'] + [AD_RESULT_COLUMNS[c] for c in columns]))
+    set_clause = _set_clause(columns, 'v').replace('%(check_level)s', f'${len(arrays) + 1}')
+    status = await conn.execute(f"""
+        UPDATE stores AS s SET
+                {set_clause}
+        FROM unnest({unnest_args}) AS v (domain, {', '.join(columns)})
+        WHERE s.domain = v.domain
+    """, *arrays, check_level)
+    # asyncpg returns the command tag, e.g. 'UPDATE 20'
+    return int(status.split()[-1])
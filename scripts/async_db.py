@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Async database layer for the Playwright (asyncio) checkers.
+
+psycopg2 calls block the event loop: while a batch UPDATE commits, none of
+the browser contexts make progress. AsyncDatabase wraps an asyncpg pool so
+checkers can ``await`` queries and hand batch writes off to background
+tasks:
+
+- ``run(fn, ...)`` awaits ``fn(conn, ...)`` inside a transaction on a pooled
+  connection; ``executemany`` sends a batch pipelined (one round trip for
+  all rows, not one per row)
+- ``submit`` starts such a write as a task and returns immediately; at most
+  ``max_inflight`` writes run at once, after which ``submit`` waits
+  (backpressure instead of an unbounded backlog)
+- ``drain`` / ``close`` wait for every submitted write
+
+Connection settings come from the same place as db_config
+(POSTGRES_URL / DATABASE_URL from .env). Statement caching is off because
+the Neon pooler endpoint (PgBouncer, transaction mode) does not keep
+prepared statements across transactions.
+
+Usage:
+    db = AsyncDatabase()
+    await db.open()
+    rows = await db.fetch("SELECT domain FROM stores WHERE ...")
+    await db.submit(bulk_update_ad_results_async, rows, 'reliable_batch', on_done=callback)
+    await db.close()
+"""
+
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, List, Optional, Sequence
+
+from db_config import get_db_config_dict
+
+try:
+    import asyncpg
+except ImportError:  # pragma: no cover - optional dependency of the async checkers
+    asyncpg = None
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_MAX_INFLIGHT = 2
+
+
+def _connect_kwargs(dsn: Optional[str]) -> dict:
+    dsn = dsn or os.getenv("POSTGRES_URL") or os.getenv("DATABASE_URL")
+    if dsn:
+        return {'dsn': dsn}
+    config = get_db_config_dict()
+    return {
+        'host': config['host'],
+        'database': config['database'],
+        'user': config['user'],
+        'password': config['password'],
+        'ssl': config['sslmode'],
+    }
+
+
+class AsyncDatabase:
+    """asyncpg pool with pipelined batch writes that run in the background"""
+
+    def __init__(self, dsn: Optional[str] = None, min_size: int = 1, max_size: int = DEFAULT_POOL_SIZE,
+                 max_inflight: int = DEFAULT_MAX_INFLIGHT):
+        if asyncpg is None:
+            raise ImportError("asyncpg is required for the async checkers: pip3 install asyncpg")
+        self.connect_kwargs = _connect_kwargs(dsn)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_inflight = max_inflight
+        self.pool = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._pending = set()
+        self.writes = 0
+        self.rows_written = 0
+        self.write_seconds = 0.0
+        self.failed_writes = 0
+
+    async def open(self, retries: int = 3, backoff: float = 1.0):
+        """Create the pool, retrying transient connection failures"""
+        for attempt in range(retries + 1):
+            try:
+                self.pool = await asyncpg.create_pool(
+                    min_size=self.min_size, max_size=self.max_size,
+                    statement_cache_size=0, **self.connect_kwargs)
+                break
+            except (OSError, asyncpg.PostgresError, asyncio.TimeoutError):
+                if attempt == retries:
+                    raise
+                await asyncio.sleep(backoff * 2 ** attempt)
+        self._slots = asyncio.Semaphore(self.max_inflight)
+        return self
+
+    async def fetch(self, sql: str, *args) -> List:
+        async with self.pool.acquire() as conn:
+            return await conn.fetch(sql, *args)
+
+    async def run(self, fn: Callable[..., Awaitable], *args):
+        """``await fn(conn, *args)`` on a pooled connection, in one transaction"""
+        start = time.time()
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                result = await fn(conn, *args)
+        self.writes += 1
+        self.write_seconds += time.time() - start
+        if isinstance(result, int):
+            self.rows_written += result
+        return result
+
+    async def executemany(self, sql: str, rows: Sequence[Sequence]) -> int:
+        """Run ``sql`` for every row, pipelined, in one transaction"""
+        if not rows:
+            return 0
+
+        async def write(conn):
+            await conn.executemany(sql, rows)
+            return len(rows)
+
+        return await self.run(write)
+
+    async def submit(self, fn: Callable[..., Awaitable], *args,
+                     on_done: Optional[Callable[[object, Optional[BaseException]], None]] = None) -> asyncio.Task:
+        """Start ``run(fn, *args)`` in the background.
+
+        ``on_done(result, error)`` runs after the write committed (error is
+        None) or failed. Waits only when ``max_inflight`` writes are already
+        running.
+        """
+        await self._slots.acquire()
+
+        async def write():
+            result = error = None
+            try:
+                result = await self.run(fn, *args)
+            except Exception as e:
+                error = e
+                self.failed_writes += 1
+            finally:
+                self._slots.release()
+            if on_done is not None:
+                on_done(result, error)
+
+        task = asyncio.create_task(write())
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return task
+
+    async def drain(self):
+        """Wait for every submitted write"""
+        while self._pending:
+            await asyncio.gather(*list(self._pending))
+
+    async def close(self):
+        await self.drain()
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    def metrics(self) -> dict:
+        return {
+            'writes': self.writes,
+            'rows': self.rows_written,  # as reported by the write functions
+            'failed_writes': self.failed_writes,
+            'avg_write_ms': self.write_seconds / self.writes * 1000 if self.writes else 0.0,
+        }
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Deferred index build for bulk loads into ``stores``.
+
+schema.sql / extend-schema.sql / geo-schema.sql put ~20 b-tree and
+gin_trgm_ops indexes on stores; with them in place every COPYed row pays
+for ~20 index insertions. In bulk-load mode the non-unique indexes are
+dropped before the load and rebuilt afterwards, several at a time on
+separate connections with a large maintenance_work_mem, followed by
+ANALYZE. The unique index on domain stays, since the upsert merge needs it.
+
+The dropped definitions are saved to a state file first, so an interrupted
+load can be finished with ``python3 scripts/bulk_load.py --restore``.
+
+Refuses to start while other sessions are using the table (locks held or
+rows changing), unless forced: dropping indexes under live queries turns
+them into sequential scans.
+
+Usage:
+    from bulk_load import deferred_indexes
+    with deferred_indexes(lambda: psycopg2.connect(DATABASE_URL)):
+        ...COPY...
+"""
+
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+DEFAULT_STATE_FILE = Path(__file__).parent.parent / '.deferred-indexes.json'
+DEFAULT_MAINTENANCE_WORK_MEM = '1GB'
+DEFAULT_BUILD_WORKERS = 4
+TRAFFIC_SAMPLE_SECONDS = 3
+
+
+class LiveTrafficError(RuntimeError):
+    pass
+
+
+def index_definitions(cur, table: str = 'stores') -> List[Tuple[str, str]]:
+    """(name, CREATE INDEX statement) for every non-unique index of ``table``"""
+    cur.execute("""
+        SELECT c.relname, pg_get_indexdef(ix.indexrelid)
+        FROM pg_index ix
+        JOIN pg_class c ON c.oid = ix.indexrelid
+        WHERE ix.indrelid = %s::regclass
+          AND NOT ix.indisunique
+          AND NOT ix.indisprimary
+        ORDER BY c.relname
+    """, (table,))
+    return cur.fetchall()
+
+
+def _activity_snapshot(cur, table: str) -> tuple:
+    cur.execute("""
+        SELECT n_tup_ins + n_tup_upd + n_tup_del,
+               COALESCE(seq_scan, 0) + COALESCE(idx_scan, 0)
+        FROM pg_stat_user_tables
+        WHERE relid = %s::regclass
+    """, (table,))
+    return cur.fetchone()
+
+
+def check_no_live_traffic(cur, table: str = 'stores', sample_seconds: float = TRAFFIC_SAMPLE_SECONDS):
+    """Raise LiveTrafficError when other sessions are using ``table``"""
+    cur.execute("""
+        SELECT DISTINCT a.pid, a.application_name, a.state, LEFT(a.query, 80)
+        FROM pg_locks l
+        JOIN pg_stat_activity a ON a.pid = l.pid
+        WHERE l.relation = %s::regclass
+          AND l.pid <> pg_backend_pid()
+    """, (table,))
+    sessions = cur.fetchall()
+    if sessions:
+        details = '; '.join(f"pid {pid} ({app or '?'}, {state}): {query}" for pid, app, state, query in sessions)
+        raise LiveTrafficError(f"{len(sessions)} other sessions hold locks on {table}: {details}")
+
+    before = _activity_snapshot(cur, table)
+    time.sleep(sample_seconds)
+    # Statistics are cached per transaction: look again from a fresh snapshot
+    cur.connection.rollback()
+    cur.execute("SELECT pg_stat_clear_snapshot()")
+    after = _activity_snapshot(cur, table)
+    if before != after:
+        raise LiveTrafficError(f"{table} was read or written by other sessions in the last "
+                               f"{sample_seconds}s (writes {after[0] - before[0]}, scans {after[1] - before[1]})")
+
+
+def drop_indexes(conn, definitions: List[Tuple[str, str]], state_file: Path = DEFAULT_STATE_FILE):
+    """Save the definitions, then drop the indexes"""
+    state_file.write_text(json.dumps(definitions, indent=2))
+    cur = conn.cursor()
+    for name, _ in definitions:
+        cur.execute(f'DROP INDEX IF EXISTS "{name}"')
+    conn.commit()
+    cur.close()
+
+
+def _build_index(args):
+    connect, name, definition, maintenance_work_mem = args
+    start = time.time()
+    conn = connect()
+    try:
+        cur = conn.cursor()
+        cur.execute("SET maintenance_work_mem = %s", (maintenance_work_mem,))
+        cur.execute(definition.replace('CREATE INDEX ', 'CREATE INDEX IF NOT EXISTS ', 1))
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+    return name, time.time() - start
+
+
+def rebuild_indexes(connect: Callable, definitions: List[Tuple[str, str]], workers: int = DEFAULT_BUILD_WORKERS,
+                    maintenance_work_mem: str = DEFAULT_MAINTENANCE_WORK_MEM, table: str = 'stores',
+                    state_file: Path = DEFAULT_STATE_FILE):
+    """Rebuild indexes on ``workers`` connections, then ANALYZE"""
+    print(f"🔨 Rebuilding {len(definitions)} indexes ({workers} at a time, "
+          f"maintenance_work_mem={maintenance_work_mem})...")
+    start = time.time()
+    tasks = [(connect, name, definition, maintenance_work_mem) for name, definition in definitions]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for name, seconds in executor.map(_build_index, tasks):
+            print(f"  ✓ {name} ({seconds:.1f}s)")
+
+    conn = connect()
+    try:
+        conn.autocommit = True
+        conn.cursor().execute(f"ANALYZE {table}")
+    finally:
+        conn.close()
+
+    if state_file.exists():
+        state_file.unlink()
+    print(f"✅ Indexes rebuilt and {table} analyzed in {time.time() - start:.1f}s")
+
+
+@contextmanager
+def deferred_indexes(connect: Callable, force: bool = False, workers: int = DEFAULT_BUILD_WORKERS,
+                     maintenance_work_mem: str = DEFAULT_MAINTENANCE_WORK_MEM, table: str = 'stores',
+                     state_file: Path = DEFAULT_STATE_FILE):
+    """Drop non-unique indexes for the duration of a bulk load.
+
+    The indexes are rebuilt even if the load fails, so the table is never
+    left without them.
+    """
+    if state_file.exists():
+        raise RuntimeError(f"{state_file} exists: a previous bulk load did not finish. "
+                           f"Run python3 scripts/bulk_load.py --restore first")
+
+    conn = connect()
+    try:
+        cur = conn.cursor()
+        if force:
+            print("⚠️  --force: skipping the live traffic check")
+        else:
+            check_no_live_traffic(cur, table)
+        definitions = index_definitions(cur, table)
+        cur.close()
+        print(f"🗑️  Dropping {len(definitions)} non-unique indexes on {table} for the bulk load")
+        drop_indexes(conn, definitions, state_file)
+    finally:
+        conn.close()
+
+    try:
+        yield definitions
+    finally:
+        rebuild_indexes(connect, definitions, workers, maintenance_work_mem, table, state_file)
+
+
+if __name__ == '__main__':
+    import psycopg2
+
+    if '--restore' not in sys.argv:
+        print("Usage: python3 scripts/bulk_load.py --restore   # rebuild indexes left by an interrupted load")
+        sys.exit(1)
+    if not DEFAULT_STATE_FILE.exists():
+        print("Nothing to restore")
+        sys.exit(0)
+
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        print("ERROR: Please set DATABASE_URL environment variable")
+        sys.exit(1)
+    definitions = [tuple(d) for d in json.loads(DEFAULT_STATE_FILE.read_text())]
+    rebuild_indexes(lambda: psycopg2.connect(database_url), definitions)
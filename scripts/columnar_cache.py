@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Typed columnar cache of the storeleads CSV export.
+
+The export is converted once into an uncompressed Arrow IPC (Feather v2)
+file next to the CSV. Analysis scripts memory-map that file and read only
+the columns they touch instead of running ``pd.read_csv`` over the full
+export every time.
+
+Column types in the cache:
+- estimated_monthly_visits / employee_count / platform_rank / rank: int64
+- created: date32 (source format ``%Y/%m/%d``)
+- country_code / status / plan / ...: dictionary-encoded strings
+- everything else: strings (empty -> null, like pandas)
+
+The cache is rebuilt automatically when the CSV changes: size and mtime
+are checked first, and the SHA-256 of the CSV decides when the mtime moved
+(a copy or touch without content changes keeps the cache).
+
+Usage:
+    python3 scripts/columnar_cache.py shopify-storeleads.csv [--force]
+
+    from columnar_cache import load_frame
+    df = load_frame('shopify-storeleads.csv', columns=['domain', 'country_code'])
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.feather as feather
+except ImportError:
+    print("❌ pyarrow 未安装，请运行: pip install pyarrow")
+    raise
+
+CACHE_SUFFIX = '.arrow'
+META_SUFFIX = '.arrow.meta.json'
+CACHE_VERSION = 1
+
+INT_COLUMNS = ['estimated_monthly_visits', 'employee_count', 'platform_rank', 'rank']
+DATE_COLUMNS = {'created': '%Y/%m/%d'}
+CATEGORICAL_COLUMNS = ['country_code', 'status', 'plan', 'language_code', 'platform', 'region', 'state']
+
+
+def cache_paths(csv_path) -> tuple:
+    """(cache file, metadata file) for a given CSV"""
+    csv_path = Path(csv_path)
+    stem = csv_path.with_suffix('')
+    return Path(str(stem) + CACHE_SUFFIX), Path(str(stem) + META_SUFFIX)
+
+
+def file_sha256(path, block_size: int = 8 * 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _source_stat(csv_path) -> dict:
+    st = os.stat(csv_path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def is_fresh(csv_path) -> bool:
+    """True when the cache matches the current CSV contents.
+
+    Updates the stored mtime when only the mtime changed.
+    """
+    cache_file, meta_file = cache_paths(csv_path)
+    if not cache_file.exists() or not meta_file.exists():
+        return False
+
+    meta = json.loads(meta_file.read_text())
+    if meta.get('version') != CACHE_VERSION:
+        return False
+
+    stat = _source_stat(csv_path)
+    if stat['size'] != meta.get('size'):
+        return False
+    if stat['mtime_ns'] == meta.get('mtime_ns'):
+        return True
+
+    # mtime moved: only the content hash can tell
+    if file_sha256(csv_path) != meta.get('sha256'):
+        return False
+    meta['mtime_ns'] = stat['mtime_ns']
+    meta_file.write_text(json.dumps(meta, indent=2))
+    return True
+
+
+def _to_int(column: pa.ChunkedArray) -> pa.ChunkedArray:
+    """Like pd.to_numeric(errors='coerce') for integers: invalid -> null"""
+    trimmed = pc.utf8_trim_whitespace(column)
+    valid = pc.match_substring_regex(trimmed, r'^-?\d+$')
+    return pc.if_else(valid, trimmed, pa.scalar(None, pa.string())).cast(pa.int64())
+
+
+def _to_date(column: pa.ChunkedArray, fmt: str) -> pa.ChunkedArray:
+    trimmed = pc.utf8_trim_whitespace(column)
+    parsed = pc.strptime(trimmed, format=fmt, unit='s', error_is_null=True)
+    return parsed.cast(pa.date32())
+
+
+def build_cache(csv_path) -> Path:
+    """Convert the CSV into the typed columnar cache"""
+    cache_file, meta_file = cache_paths(csv_path)
+    print(f"📦 Building columnar cache: {csv_path} -> {cache_file}")
+    start = time.time()
+
+    # Read everything as strings first so a single bad value cannot abort
+    # the conversion; typed columns are converted afterwards with coercion.
+    read_options = pa_csv.ReadOptions(block_size=64 * 1024 * 1024)
+    parse_options = pa_csv.ParseOptions(newlines_in_values=True)
+    header = pa_csv.open_csv(csv_path, read_options=read_options, parse_options=parse_options).schema.names
+    convert_options = pa_csv.ConvertOptions(
+        column_types={name: pa.string() for name in header},
+        strings_can_be_null=True,
+    )
+    table = pa_csv.read_csv(csv_path, read_options=read_options,
+                            parse_options=parse_options, convert_options=convert_options)
+
+    for name in header:
+        column = table.column(name)
+        if name in INT_COLUMNS:
+            column = _to_int(column)
+        elif name in DATE_COLUMNS:
+            column = _to_date(column, DATE_COLUMNS[name])
+        elif name in CATEGORICAL_COLUMNS:
+            column = pc.dictionary_encode(column)
+        else:
+            continue
+        table = table.set_column(table.schema.get_field_index(name), name, column)
+
+    table = table.unify_dictionaries()
+    tmp_file = cache_file.with_suffix(cache_file.suffix + '.tmp')
+    feather.write_feather(table, tmp_file, compression='uncompressed')
+    os.replace(tmp_file, cache_file)
+
+    meta = dict(_source_stat(csv_path), version=CACHE_VERSION, source=str(csv_path),
+                sha256=file_sha256(csv_path), rows=table.num_rows, built_at=time.time())
+    meta_file.write_text(json.dumps(meta, indent=2))
+
+    print(f"✅ Cached {table.num_rows:,} rows in {time.time() - start:.1f}s "
+          f"({cache_file.stat().st_size / 1024 / 1024:.0f} MB)")
+    return cache_file
+
+
+def ensure_cache(csv_path, force: bool = False) -> Path:
+    """Path to an up-to-date cache, rebuilding it when the CSV changed"""
+    if force or not is_fresh(csv_path):
+        return build_cache(csv_path)
+    return cache_paths(csv_path)[0]
+
+
+def load_table(csv_path, columns: Optional[List[str]] = None, rows=None) -> pa.Table:
+    """Memory-mapped Arrow table with only the requested columns.
+
+    ``rows`` optionally selects row positions (e.g. the index of a filtered
+    frame); only those rows are materialized.
+    """
+    cache_file = ensure_cache(csv_path)
+    table = feather.read_table(cache_file, columns=columns, memory_map=True)
+    if rows is not None:
+        table = table.take(pa.array(rows, type=pa.int64()))
+    return table
+
+
+def load_frame(csv_path, columns: Optional[List[str]] = None, rows=None):
+    """pandas DataFrame view of the cache.
+
+    The index is the row position in the export, so a frame filtered on a
+    few columns can fetch the remaining columns for its survivors with
+    ``load_frame(csv_path, rows=filtered.index)``.
+    """
+    import pandas as pd
+
+    table = load_table(csv_path, columns, rows)
+    df = table.to_pandas(date_as_object=False)
+    if rows is not None:
+        df.index = list(rows)
+        # Keep value_counts() on categoricals limited to what is present
+        for name in df.columns:
+            if isinstance(df[name].dtype, pd.CategoricalDtype):
+                df[name] = df[name].cat.remove_unused_categories()
+    return df
+
+
+def source_format(df):
+    """Copy of ``df`` with the date columns written back in the export's
+    format (``created``: 2024-01-15 -> 2024/01/15), for CSVs that other
+    scripts read like the original export"""
+    df = df.copy()
+    for name, fmt in DATE_COLUMNS.items():
+        if name in df.columns:
+            df[name] = df[name].dt.strftime(fmt)
+    return df
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python3 scripts/columnar_cache.py <shopify-storeleads.csv> [--force]")
+        sys.exit(1)
+    ensure_cache(sys.argv[1], force='--force' in sys.argv)
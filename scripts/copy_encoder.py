@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Streaming COPY encoder for storeleads CSV rows.
+
+Turns csv.reader rows into PostgreSQL COPY text format on the fly and
+exposes them through a file-like ``read()``, so ``cur.copy_expert`` pulls
+and sends chunks while the CSV is still being parsed (no 44-tuples, no
+per-row INSERT round trips).
+
+Cleaning follows the importers:
+- text: stripped, empty -> NULL (clean_value)
+- employee_count / estimated_monthly_visits / platform_rank / rank:
+  int() or NULL when not a number (parse_int)
+- created: ``%Y/%m/%d`` (or ISO) -> ``YYYY-MM-DD``
+
+Rows the database would refuse (wrong field count, no domain, invalid
+date, integer out of range, text longer than its VARCHAR) are written to a
+reject writer with the reason instead of failing the whole COPY.
+
+Example:
+    with open(csv_file, newline='', encoding='utf-8') as f, \\
+         open(csv_file + '.rejects.csv', 'w', newline='', encoding='utf-8') as rej:
+        stream = CopyTextStream(csv.reader(f), rejects=csv.writer(rej))
+        cur.copy_expert(f"COPY stores_staging ({', '.join(stream.columns)}) FROM STDIN", stream)
+"""
+
+import io
+import struct
+from datetime import date
+from typing import Iterable, List, Optional
+
+from parallel_csv import STORE_COLUMNS
+
+INT_COLUMNS = {'employee_count', 'estimated_monthly_visits', 'platform_rank', 'rank'}
+DATE_COLUMNS = {'created'}
+INT4_MIN, INT4_MAX = -2 ** 31, 2 ** 31 - 1
+
+# VARCHAR(n) columns of stores (schema.sql); TEXT columns have no limit
+VARCHAR_LIMITS = {
+    'domain': 255, 'merchant_name': 500, 'platform': 50, 'plan': 100, 'status': 50,
+    'city': 200, 'state': 200, 'region': 200, 'country_code': 10, 'zip': 50,
+    'facebook': 255, 'instagram': 255, 'twitter': 255, 'tiktok': 255, 'youtube': 255,
+    'linkedin_account': 255, 'pinterest': 255, 'estimated_yearly_sales': 100,
+    'language_code': 10,
+}
+
+NULL = '\\N'
+
+# Binary COPY: signature + flags + header extension length, int16 -1 trailer
+BINARY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+BINARY_TRAILER = struct.pack('!h', -1)
+_INT16 = struct.Struct('!h')
+_INT32 = struct.Struct('!i')
+_INT4_FIELD = struct.Struct('!ii')  # length 4 + value
+_NULL_FIELD = _INT32.pack(-1)
+_PG_EPOCH = date(2000, 1, 1).toordinal()
+_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+class RejectedRow(ValueError):
+    pass
+
+
+def clean_value(value):
+    """Clean and prepare value for database insertion"""
+    if value is None:
+        return None
+    value = value.strip()
+    return value or None
+
+
+def parse_int(value):
+    """Parse integer value"""
+    if not value:
+        return None
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def to_date(value) -> Optional[date]:
+    """'2024/01/31' or '2024-01-31' -> date; empty -> None"""
+    value = clean_value(value)
+    if value is None:
+        return None
+    try:
+        year, month, day = (int(p) for p in value[:10].replace('-', '/').split('/'))
+        return date(year, month, day)
+    except ValueError:
+        raise RejectedRow(f"invalid created date: {value!r}")
+
+
+def parse_date(value) -> Optional[str]:
+    """'2024/01/31' or '2024-01-31' -> '2024-01-31'; empty -> None"""
+    parsed = to_date(value)
+    return None if parsed is None else parsed.isoformat()
+
+
+TEXT, INT, DATE = 0, 1, 2
+
+
+def column_plan(columns: List[str]) -> List[tuple]:
+    """(name, kind, VARCHAR limit) per column, computed once per stream"""
+    plan = []
+    for name in columns:
+        kind = INT if name in INT_COLUMNS else DATE if name in DATE_COLUMNS else TEXT
+        plan.append((name, kind, VARCHAR_LIMITS.get(name, 0)))
+    return plan
+
+
+def encode_row(raw: List[str], plan: List[tuple]) -> str:
+    """One CSV row -> one COPY text line; raises RejectedRow"""
+    if len(raw) != len(plan):
+        raise RejectedRow(f"expected {len(plan)} fields, got {len(raw)}")
+
+    fields = []
+    append = fields.append
+    for (name, kind, limit), value in zip(plan, raw):
+        if kind == TEXT:
+            # clean_value() inlined: this loop runs 44 times per row
+            value = value.strip()
+            if not value:
+                if name == 'domain':
+                    raise RejectedRow("missing domain")
+                append(NULL)
+                continue
+            if limit and len(value) > limit:
+                raise RejectedRow(f"{name} longer than {limit} characters")
+            if '\\' in value or '\t' in value or '\n' in value or '\r' in value:
+                value = value.translate(_ESCAPES)
+            append(value)
+        elif kind == INT:
+            number = parse_int(value)
+            if number is None:
+                append(NULL)
+            elif INT4_MIN <= number <= INT4_MAX:
+                append(str(number))
+            else:
+                raise RejectedRow(f"{name} out of range: {number}")
+        else:
+            parsed = parse_date(value)
+            append(NULL if parsed is None else parsed)
+    return '\t'.join(fields) + '\n'
+
+
+def encode_row_binary(raw: List[str], plan: List[tuple]) -> bytes:
+    """One CSV row -> one binary COPY tuple; same cleaning and rejects as encode_row"""
+    if len(raw) != len(plan):
+        raise RejectedRow(f"expected {len(plan)} fields, got {len(raw)}")
+
+    parts = [_INT16.pack(len(plan))]
+    append = parts.append
+    for (name, kind, limit), value in zip(plan, raw):
+        if kind == TEXT:
+            value = value.strip()
+            if not value:
+                if name == 'domain':
+                    raise RejectedRow("missing domain")
+                append(_NULL_FIELD)
+                continue
+            if limit and len(value) > limit:
+                raise RejectedRow(f"{name} longer than {limit} characters")
+            data = value.encode('utf-8')
+            append(_INT32.pack(len(data)))
+            append(data)
+        elif kind == INT:
+            number = parse_int(value)
+            if number is None:
+                append(_NULL_FIELD)
+            elif INT4_MIN <= number <= INT4_MAX:
+                append(_INT4_FIELD.pack(4, number))
+            else:
+                raise RejectedRow(f"{name} out of range: {number}")
+        else:
+            parsed = to_date(value)
+            if parsed is None:
+                append(_NULL_FIELD)
+            else:
+                append(_INT4_FIELD.pack(4, parsed.toordinal() - _PG_EPOCH))
+    return b''.join(parts)
+
+
+class CopyTextStream(io.TextIOBase):
+    """File-like COPY text stream over csv.reader rows.
+
+    The first row is taken as the header unless ``columns`` is given.
+    ``encoded`` / ``rejected`` count rows as they stream through.
+    """
+
+    def __init__(self, rows: Iterable[List[str]], columns: Optional[List[str]] = None,
+                 rejects=None, header: bool = True):
+        self.rows = iter(rows)
+        if header:
+            file_columns = next(self.rows, [])
+            columns = columns or [c.strip() for c in file_columns]
+        self.columns = list(columns or STORE_COLUMNS)
+        self.plan = column_plan(self.columns)
+        self.rejects = rejects
+        if rejects is not None:
+            rejects.writerow(self.columns + ['reject_reason'])
+        self.encoded = 0
+        self.rejected = 0
+        self._buffer = self.EMPTY
+
+    EMPTY = ''
+    copy_options = ''
+
+    def encode(self, raw: List[str]):
+        return encode_row(raw, self.plan)
+
+    @property
+    def copy_columns(self) -> List[str]:
+        """Columns of the COPY lines produced (target column list)"""
+        return self.columns
+
+    def readable(self):
+        return True
+
+    def accept(self, raw: List[str], line: str) -> Optional[str]:
+        """Hook for subclasses: return the line to send, or None to skip the row"""
+        return line
+
+    def _fill(self, size: int) -> bool:
+        parts = [self._buffer]
+        length = len(self._buffer)
+        for raw in self.rows:
+            if not raw:
+                continue
+            try:
+                line = self.encode(raw)
+            except RejectedRow as e:
+                self.rejected += 1
+                if self.rejects is not None:
+                    self.rejects.writerow(list(raw) + [str(e)])
+                continue
+            line = self.accept(raw, line)
+            if line is None:
+                continue
+            self.encoded += 1
+            parts.append(line)
+            length += len(line)
+            if length >= size:
+                break
+        else:
+            parts.append(self.finish())
+        self._buffer = self.EMPTY.join(parts)
+        return bool(self._buffer)
+
+    def finish(self):
+        """Appended once after the last row"""
+        return self.EMPTY
+
+    def read(self, size: int = -1) -> str:
+        if size is None or size < 0:
+            size = float('inf')
+        if len(self._buffer) < size:
+            self._fill(size)
+        if size == float('inf'):
+            chunk, self._buffer = self._buffer, self.EMPTY
+        else:
+            chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+    def readline(self, size: int = -1) -> str:
+        if '\n' not in self._buffer:
+            self._fill(1)
+        line, sep, rest = self._buffer.partition('\n')
+        self._buffer = rest
+        return line + sep
+
+
+class CopyBinaryStream(CopyTextStream):
+    """Same rows and rejects as CopyTextStream, in binary COPY format.
+
+    Integers go over the wire as int4 and dates as days since 2000-01-01, so
+    the server does no number/date parsing; text is length-prefixed UTF-8
+    and needs no escaping. Use with ``COPY ... FROM STDIN WITH (FORMAT binary)``
+    (copy_options); the target columns must be int4/date/text-like exactly
+    as in stores.
+    """
+
+    EMPTY = b''
+    copy_options = 'WITH (FORMAT binary)'
+
+    def __init__(self, rows, **kwargs):
+        super().__init__(rows, **kwargs)
+        self._buffer = BINARY_HEADER
+        self._finished = False
+
+    def encode(self, raw):
+        return encode_row_binary(raw, self.plan)
+
+    def finish(self):
+        if self._finished:
+            return b''
+        self._finished = True
+        return BINARY_TRAILER
+
+    def readline(self, size: int = -1):
+        raise io.UnsupportedOperation("binary COPY stream has no lines")
@@ -13,12 +13,21 @@ Features:
 import time
 import json
 import psycopg2
+import sys
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from contextlib import closing
 from datetime import datetime
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+from ad_result_writer import bulk_update_ad_results
+from rate_control import RateController, driver_outcome
+from work_list import WorkList
+from write_behind import WriteBehindQueue
 
 # Database Configuration
 DB_CONFIG = {
@@ -44,7 +53,10 @@ class ProductionAdsChecker:
         """
         self.conn = psycopg2.connect(**DB_CONFIG)
         self.driver = None
-        self.current_batch = []
+        # Results are written on a background thread (batch UPDATE + progress file)
+        self.writer = WriteBehindQueue(self.batch_update_database, max_batch=BATCH_SIZE)
+        # Request pacing: token bucket, backs off on errors / captcha pages (ADS_MAX_RATE budget)
+        self.rate = RateController()
         self.processed_count = 0
         self.success_count = 0
         self.error_count = 0
@@ -72,35 +84,16 @@ class ProductionAdsChecker:
         self.driver.set_page_load_timeout(10)
 
     def get_domains_to_check(self):
-        """Get list of domains that need to be checked"""
-        cur = self.conn.cursor()
-
+        """Work list of domains that need to be checked (streamed page by page)"""
         if self.recheck_mode:
             # Re-check mode: check domains that have customer_type (already checked before)
-            query = """
-                SELECT domain
-                FROM stores
-                WHERE customer_type IS NOT NULL
-                  AND customer_type <> ''
-                ORDER BY estimated_monthly_visits DESC NULLS LAST
-            """
+            where = "customer_type IS NOT NULL AND customer_type <> ''"
         else:
             # Normal mode: only check unchecked domains (no customer_type)
-            query = """
-                SELECT domain
-                FROM stores
-                WHERE (customer_type IS NULL OR customer_type = '')
-                ORDER BY estimated_monthly_visits DESC NULLS LAST
-            """
-
-        if self.test_limit:
-            query += f" LIMIT {self.test_limit}"
-
-        cur.execute(query)
-        domains = [row[0] for row in cur.fetchall()]
-        cur.close()
+            where = "customer_type IS NULL OR customer_type = ''"
 
-        return domains
+        return WorkList(where, limit=self.test_limit,
+                        connection=lambda: closing(psycopg2.connect(**DB_CONFIG)))
 
     def check_domain(self, domain):
         """Check if domain has Google Ads"""
@@ -195,37 +188,23 @@ class ProductionAdsChecker:
                 'error': str(e)
             }
 
-    def batch_update_database(self):
-        """Update database with current batch"""
-        if not self.current_batch:
-            return
-
-        cur = self.conn.cursor()
-
-        for result in self.current_batch:
-            cur.execute("""
-                UPDATE stores SET
-                    customer_type = %s,
-                    ads_check_level = %s,
-                    ads_last_checked = NOW(),
-                    has_google_ads = %s,
-                    google_ads_count = %s,
-                    google_ads_url = %s
-                WHERE domain = %s
-            """, (
-                result['customer_type'],
-                CHECK_LEVEL,
-                result['has_ads'],
-                result['google_ads_count'],
-                result['google_ads_url'],
-                result['domain']
-            ))
-
-        self.conn.commit()
-        cur.close()
-
-        print(f"  💾 已提交 {len(self.current_batch)} 条记录到数据库")
-        self.current_batch = []
+    def batch_update_database(self, results):
+        """Update database with a batch of results (runs on the write-behind thread)"""
+        # One UPDATE ... FROM (VALUES ...) for the whole batch
+        try:
+            matched = bulk_update_ad_results(self.conn, [{
+                'domain': result['domain'],
+                'customer_type': result['customer_type'],
+                'has_google_ads': result['has_ads'],
+                'google_ads_count': result['google_ads_count'],
+                'google_ads_url': result['google_ads_url'],
+            } for result in results], CHECK_LEVEL)
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        print(f"  💾 已提交 {matched}/{len(results)} 条记录到数据库")
+        self.save_progress()
 
     def save_progress(self):
         """Save progress to file"""
@@ -252,7 +231,7 @@ class ProductionAdsChecker:
 
             # Get domains to check
             domains = self.get_domains_to_check()
-            total_domains = len(domains)
+            total_domains = domains.count()
 
             print(f"📋 待检查域名: {total_domains:,}")
             print()
@@ -272,11 +251,14 @@ class ProductionAdsChecker:
             print("="*100)
 
             # Process each domain
+            self.writer.start()
             for i, domain in enumerate(domains, 1):
+                self.rate.acquire()
                 domain_start = time.time()
 
                 # Check domain
                 result = self.check_domain(domain)
+                self.rate.release(driver_outcome(self.driver, result.get('error')))
 
                 domain_time = time.time() - domain_start
 
@@ -287,19 +269,14 @@ class ProductionAdsChecker:
                 else:
                     self.error_count += 1
 
-                # Add to batch
-                self.current_batch.append(result)
+                # Hand off to the write-behind thread (blocks only if the DB falls behind)
+                self.writer.put(result)
 
                 # Print result
                 status_icon = "✅" if result['status'] == 'success' else "❌"
                 ads_info = f"{result['google_ads_count']:,} ads" if result['has_ads'] else "无广告"
                 print(f"{status_icon} [{i}/{total_domains}] {domain:40s} | {ads_info:15s} | {domain_time:.2f}s")
 
-                # Batch commit every BATCH_SIZE domains
-                if len(self.current_batch) >= BATCH_SIZE:
-                    self.batch_update_database()
-                    self.save_progress()
-
                 # Show progress every 50 domains
                 if i % 50 == 0:
                     elapsed = time.time() - self.start_time
@@ -311,10 +288,8 @@ class ProductionAdsChecker:
                     print(f"⏳ 预计剩余: {remaining/60:.1f} 分钟")
                     print()
 
-            # Commit remaining batch
-            if self.current_batch:
-                self.batch_update_database()
-                self.save_progress()
+            # Flush the results still queued for the writer
+            self.writer.close()
 
             # Final summary
             total_time = time.time() - self.start_time
@@ -325,6 +300,9 @@ class ProductionAdsChecker:
             print(f"总计: {self.processed_count} 域名")
             print(f"成功: {self.success_count}")
             print(f"错误: {self.error_count}")
+            rate = self.rate.metrics()
+            print(f"🚦 请求速率: {rate['rate']:.2f} req/s, 降速 {rate['decreases']} 次 / 提速 {rate['increases']} 次, "
+                  f"等待 {rate['waited_s']:.0f}s, 结果 {rate['outcomes']}")
             print(f"总耗时: {total_time/60:.1f} 分钟")
             print(f"平均速度: {total_time/self.processed_count:.2f} 秒/域名")
 
@@ -345,6 +323,8 @@ class ProductionAdsChecker:
             cur.close()
 
         finally:
+            # Ctrl-C / SIGTERM: flush queued results before the connection closes
+            self.writer.close()
             if self.driver:
                 self.driver.quit()
             if self.conn:
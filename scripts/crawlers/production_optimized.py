@@ -5,10 +5,16 @@ Google Ads Checker - Optimized Production Version
 Conservative optimization: 3s/domain average, 7 days total
 - Reduced timeout: 5s → 3s for "no ads" cases
 - Reduced sleep: 0.5s → 0.2s
-- Random delay: 0.2-0.5s to avoid pattern detection
+- Random pacing: RateController (scripts/rate_control.py) adds a random
+  0-50% of the request interval to each gap to avoid pattern detection
 - All safety features maintained
+- --queue: take domains from the shared lease queue (scripts/work_queue.py)
+  so several hosts can run this checker against the same stores table
+- DATABASE_URL, when set, replaces the built-in Neon connection (e.g. to
+  try --queue against a local Postgres)
 """
 
+import os
 import time
 import json
 import random
@@ -16,10 +22,20 @@ import psycopg2
 import sys
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import NoSuchElementException
+from contextlib import closing
+from itertools import islice
 from datetime import datetime
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+from ad_result_writer import bulk_update_ad_results
+from page_readiness import CAPTCHA, ERROR, NO_ADS, ReadinessDetector, parse_count
+from rate_control import RateController, driver_outcome
+from work_list import WorkList
+from work_queue import WorkQueue
+from write_behind import WriteBehindQueue
 
 # Database Configuration
 DB_CONFIG = {
@@ -30,6 +46,13 @@ DB_CONFIG = {
     'sslmode': 'require'
 }
 
+
+def connect():
+    """DATABASE_URL if set, else the Neon DB_CONFIG"""
+    database_url = os.environ.get('DATABASE_URL')
+    return psycopg2.connect(database_url) if database_url else psycopg2.connect(**DB_CONFIG)
+
+
 # Configuration
 BATCH_SIZE = 20
 MAX_RETRIES = 2
@@ -37,10 +60,17 @@ PROGRESS_FILE = 'production_optimized_progress.json'
 CHECK_LEVEL = 'prod_optimized_v1'
 
 class OptimizedAdsChecker:
-    def __init__(self, recheck_mode=False, test_limit=None):
-        self.conn = psycopg2.connect(**DB_CONFIG)
+    def __init__(self, recheck_mode=False, test_limit=None, queue_mode=False):
+        self.conn = connect()
+        # --queue: claim domains from the shared ad_check_queue (several hosts at once)
+        self.queue = WorkQueue(connect) if queue_mode else None
         self.driver = None
-        self.current_batch = []
+        # Results are written on a background thread (batch UPDATE + progress file)
+        self.writer = WriteBehindQueue(self.batch_update_database, max_batch=BATCH_SIZE)
+        # Request pacing: token bucket, backs off on errors / captcha pages (ADS_MAX_RATE budget)
+        self.rate = RateController()
+        # Early-exit page verdicts + time-to-verdict histogram
+        self.readiness = ReadinessDetector(timeout=3)
         self.processed_count = 0
         self.success_count = 0
         self.error_count = 0
@@ -80,100 +110,93 @@ class OptimizedAdsChecker:
         self.driver.set_page_load_timeout(8)
 
     def get_domains_to_check(self):
-        """Get list of domains that need to be checked"""
-        cur = self.conn.cursor()
+        """Work list of domains that need to be checked (streamed page by page)"""
+        if self.queue:
+            # Leased batch by batch; fill the queue with scripts/work_queue.py enqueue
+            return islice(self.queue.domains(BATCH_SIZE), self.test_limit)
 
         if self.recheck_mode:
-            query = """
-                SELECT domain
-                FROM stores
-                WHERE customer_type IS NOT NULL
-                  AND customer_type <> ''
-                ORDER BY estimated_monthly_visits DESC NULLS LAST
-            """
+            where = "customer_type IS NOT NULL AND customer_type <> ''"
         else:
-            query = """
-                SELECT domain
-                FROM stores
-                WHERE (customer_type IS NULL OR customer_type = '')
-                ORDER BY estimated_monthly_visits DESC NULLS LAST
-            """
-
-        if self.test_limit:
-            query += f" LIMIT {self.test_limit}"
-
-        cur.execute(query)
-        domains = [row[0] for row in cur.fetchall()]
-        cur.close()
+            where = "customer_type IS NULL OR customer_type = ''"
 
-        return domains
+        return WorkList(where, limit=self.test_limit,
+                        connection=lambda: closing(connect()))
 
     def check_domain(self, domain):
-        """Check if domain has Google Ads (optimized)"""
+        """Check if domain has Google Ads (returns as soon as the page shows a verdict)"""
         try:
             check_domain = domain.replace('www.', '')
             url = f'https://adstransparency.google.com/?region=anywhere&domain={check_domain}'
 
-            self.driver.get(url)
-
-            # OPTIMIZED: Reduced wait time from 5s to 3s
-            wait = WebDriverWait(self.driver, 3)
-            try:
-                wait.until(lambda d: '个广告' in d.find_element(By.TAG_NAME, 'body').text or
-                                     'ads' in d.find_element(By.TAG_NAME, 'body').text.lower())
-                # OPTIMIZED: Reduced sleep from 0.5s to 0.2s
-                time.sleep(0.2)
-            except:
-                pass
-
-            # Check for ads
-            try:
-                ads = self.driver.find_elements(By.TAG_NAME, 'creative-preview')
-
-                if ads and len(ads) > 0:
-                    # Has ads
-                    try:
-                        count_element = self.driver.find_element(By.CSS_SELECTOR,
-                            '[class*="creative-count"], [class*="result-count"]')
-                        count_text = count_element.text
-
-                        import re
-                        numbers = re.findall(r'[\d,]+', count_text)
-                        if numbers:
-                            ads_count = int(numbers[0].replace(',', ''))
-                        else:
-                            ads_count = len(ads) if len(ads) < 300 else -1
-                    except:
-                        ads_count = -1 if len(ads) >= 3 else len(ads)
-
-                    google_ads_url = f'https://adstransparency.google.com/?region=anywhere&domain={check_domain}'
-
-                    return {
-                        'domain': domain,
-                        'has_ads': True,
-                        'google_ads_count': ads_count,
-                        'google_ads_url': google_ads_url,
-                        'customer_type': 'has_ads',
-                        'status': 'success'
-                    }
-                else:
-                    return {
-                        'domain': domain,
-                        'has_ads': False,
-                        'google_ads_count': 0,
-                        'google_ads_url': None,
-                        'customer_type': 'never_advertised',
-                        'status': 'success'
-                    }
-
-            except TimeoutException:
+            # OPTIMIZED: resolves on the first terminal state (ad count, no ads, error
+            # or captcha page) instead of polling body.text for 3s + sleeping 0.2s
+            verdict = self.readiness.load(self.driver, url)
+            timing = {'verdict': verdict.state, 'verdict_time': verdict.seconds}
+
+            if verdict.state in (CAPTCHA, ERROR):
+                return {
+                    'domain': domain,
+                    'has_ads': False,
+                    'google_ads_count': 0,
+                    'google_ads_url': None,
+                    'customer_type': 'error',
+                    'status': 'error',
+                    'error': f"{verdict.state} page",
+                    **timing
+                }
+
+            if verdict.state == NO_ADS:
+                return {
+                    'domain': domain,
+                    'has_ads': False,
+                    'google_ads_count': 0,
+                    'google_ads_url': None,
+                    'customer_type': 'never_advertised',
+                    'status': 'success',
+                    **timing
+                }
+
+            # Ad count shown, creatives only, or no verdict in time: look at the creatives
+            ads_count = parse_count(verdict.text)
+            ads = self.driver.find_elements(By.TAG_NAME, 'creative-preview')
+
+            if ads_count is None and ads:
+                try:
+                    count_element = self.driver.find_element(By.CSS_SELECTOR,
+                        '[class*="creative-count"], [class*="result-count"]')
+                    count_text = count_element.text
+
+                    import re
+                    numbers = re.findall(r'[\d,]+', count_text)
+                    if numbers:
+                        ads_count = int(numbers[0].replace(',', ''))
+                    else:
+                        ads_count = len(ads) if len(ads) < 300 else -1
+                except:
+                    ads_count = -1 if len(ads) >= 3 else len(ads)
+
+            if ads_count:
+                google_ads_url = f'https://adstransparency.google.com/?region=anywhere&domain={check_domain}'
+
+                return {
+                    'domain': domain,
+                    'has_ads': True,
+                    'google_ads_count': ads_count,
+                    'google_ads_url': google_ads_url,
+                    'customer_type': 'has_ads',
+                    'status': 'success',
+                    **timing
+                }
+            else:
                 return {
                     'domain': domain,
                     'has_ads': False,
                     'google_ads_count': 0,
                     'google_ads_url': None,
                     'customer_type': 'never_advertised',
-                    'status': 'success'
+                    'status': 'success',
+                    **timing
                 }
 
         except Exception as e:
@@ -188,37 +211,31 @@ class OptimizedAdsChecker:
                 'error': str(e)
             }
 
-    def batch_update_database(self):
-        """Update database with current batch"""
-        if not self.current_batch:
-            return
-
-        cur = self.conn.cursor()
-
-        for result in self.current_batch:
-            cur.execute("""
-                UPDATE stores SET
-                    customer_type = %s,
-                    ads_check_level = %s,
-                    ads_last_checked = NOW(),
-                    has_google_ads = %s,
-                    google_ads_count = %s,
-                    google_ads_url = %s
-                WHERE domain = %s
-            """, (
-                result['customer_type'],
-                CHECK_LEVEL,
-                result['has_ads'],
-                result['google_ads_count'],
-                result['google_ads_url'],
-                result['domain']
-            ))
-
-        self.conn.commit()
-        cur.close()
-
-        print(f"  💾 已提交 {len(self.current_batch)} 条记录到数据库", flush=True)
-        self.current_batch = []
+    def batch_update_database(self, results):
+        """Update database with a batch of results (runs on the write-behind thread)"""
+        # One UPDATE ... FROM (VALUES ...) for the whole batch
+        try:
+            matched = bulk_update_ad_results(self.conn, [{
+                'domain': result['domain'],
+                'customer_type': result['customer_type'],
+                'has_google_ads': result['has_ads'],
+                'google_ads_count': result['google_ads_count'],
+                'google_ads_url': result['google_ads_url'],
+            } for result in results], CHECK_LEVEL, commit=False)
+            if self.queue:
+                # Mark the leases done in the same transaction as the results. Failed
+                # checks (errors, captcha / error pages) stay leased: stop() or lease
+                # expiry hands them back with the attempt counted
+                self.queue.complete([r['domain'] for r in results if r['status'] == 'success'], conn=self.conn)
+            self.conn.commit()
+            if self.queue:
+                self.queue.fail([r['domain'] for r in results if r['status'] != 'success'])
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        print(f"  💾 已提交 {matched}/{len(results)} 条记录到数据库", flush=True)
+        self.save_progress()
 
     def save_progress(self):
         """Save progress to file"""
@@ -245,7 +262,12 @@ class OptimizedAdsChecker:
             print(flush=True)
 
             domains = self.get_domains_to_check()
-            total_domains = len(domains)
+            if self.queue:
+                # Expired leases (a crashed host's batches) are claimed again like pending rows
+                status = self.queue.status()
+                total_domains = status.get('pending', 0) + status.get('expired', 0)
+            else:
+                total_domains = domains.count()
 
             print(f"📋 待检查域名: {total_domains:,}", flush=True)
             print(flush=True)
@@ -263,11 +285,16 @@ class OptimizedAdsChecker:
             print("开始检查...", flush=True)
             print("="*100, flush=True)
 
+            self.writer.start()
+            if self.queue:
+                self.queue.start_heartbeat()
             for i, domain in enumerate(domains, 1):
+                self.rate.acquire()
                 domain_start = time.time()
 
                 # Check domain
                 result = self.check_domain(domain)
+                self.rate.release(driver_outcome(self.driver, result.get('error')))
 
                 domain_time = time.time() - domain_start
 
@@ -278,21 +305,14 @@ class OptimizedAdsChecker:
                 else:
                     self.error_count += 1
 
-                # Add to batch
-                self.current_batch.append(result)
+                # Hand off to the write-behind thread (blocks only if the DB falls behind)
+                self.writer.put(result)
 
                 # Print result
                 status_icon = "✅" if result['status'] == 'success' else "❌"
                 ads_info = f"{result['google_ads_count']:,} ads" if result['has_ads'] else "无广告"
-                print(f"{status_icon} [{i}/{total_domains}] {domain:40s} | {ads_info:15s} | {domain_time:.2f}s", flush=True)
-
-                # Batch commit
-                if len(self.current_batch) >= BATCH_SIZE:
-                    self.batch_update_database()
-                    self.save_progress()
-
-                # OPTIMIZED: Random delay to avoid pattern detection
-                time.sleep(random.uniform(0.2, 0.5))
+                verdict = f"{result['verdict']} {result['verdict_time']:.2f}s" if 'verdict' in result else '-'
+                print(f"{status_icon} [{i}/{total_domains}] {domain:40s} | {ads_info:15s} | {verdict:16s} | {domain_time:.2f}s", flush=True)
 
                 # Progress report
                 if i % 50 == 0:
@@ -305,10 +325,8 @@ class OptimizedAdsChecker:
                     print(f"⏳ 预计剩余: {remaining/60:.1f} 分钟 ({remaining/3600:.1f} 小时)", flush=True)
                     print(flush=True)
 
-            # Final batch commit
-            if self.current_batch:
-                self.batch_update_database()
-                self.save_progress()
+            # Flush the results still queued for the writer
+            self.writer.close()
 
             # Summary
             total_time = time.time() - self.start_time
@@ -319,6 +337,12 @@ class OptimizedAdsChecker:
             print(f"总计: {self.processed_count} 域名", flush=True)
             print(f"成功: {self.success_count}", flush=True)
             print(f"错误: {self.error_count}", flush=True)
+            rate = self.rate.metrics()
+            print(f"🚦 请求速率: {rate['rate']:.2f} req/s, 降速 {rate['decreases']} 次 / 提速 {rate['increases']} 次, "
+                  f"等待 {rate['waited_s']:.0f}s, 结果 {rate['outcomes']}", flush=True)
+            print("⏱️  页面出结果耗时 (time-to-verdict):", flush=True)
+            for line in self.readiness.histogram.lines():
+                print(f"   {line}", flush=True)
             print(f"总耗时: {total_time/60:.1f} 分钟 ({total_time/3600:.1f} 小时)", flush=True)
             print(f"平均速度: {total_time/self.processed_count:.2f} 秒/域名", flush=True)
 
@@ -339,6 +363,11 @@ class OptimizedAdsChecker:
             cur.close()
 
         finally:
+            # Ctrl-C / SIGTERM: flush queued results before the connection closes
+            self.writer.close()
+            if self.queue:
+                # After the flush, so only domains without results go back to the queue
+                self.queue.stop()
             if self.driver:
                 self.driver.quit()
             if self.conn:
@@ -349,11 +378,12 @@ if __name__ == '__main__':
     import sys
 
     recheck_mode = '--recheck' in sys.argv
+    queue_mode = '--queue' in sys.argv
     test_limit = None
 
     for arg in sys.argv:
         if arg.startswith('--limit='):
             test_limit = int(arg.split('=')[1])
 
-    checker = OptimizedAdsChecker(recheck_mode=recheck_mode, test_limit=test_limit)
+    checker = OptimizedAdsChecker(recheck_mode=recheck_mode, test_limit=test_limit, queue_mode=queue_mode)
     checker.run()
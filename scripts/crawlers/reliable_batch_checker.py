@@ -10,7 +10,6 @@
 """
 
 import asyncio
-import psycopg2
 import json
 import time
 import sys
@@ -20,7 +19,11 @@ from typing import List, Dict, Optional
 
 # 添加 scripts 目录到 path 以便导入模块
 sys.path.append(str(Path(__file__).parent.parent))
-from db_config import get_db_connection
+from ad_result_writer import bulk_update_ad_results_async
+from async_db import AsyncDatabase
+from page_pool import PagePool
+from rate_control import ERROR, RateController, classify
+from resource_blocking import ResourcePolicy
 
 try:
     from playwright.async_api import async_playwright
@@ -32,7 +35,7 @@ except ImportError:
     from playwright.async_api import async_playwright
 
 # 配置
-CONCURRENT_BROWSERS = 16  # 增加并发数到 16
+CONCURRENT_BROWSERS = 16  # 常驻页面数 = 并发上限，实际并发由速率控制器调整
 TIMEOUT = 10000  # 减少超时时间
 BATCH_SIZE = 20  # 每 20 个域名 commit 一次
 MAX_RETRIES = 2  # 最多重试 2 次
@@ -47,9 +50,13 @@ class ReliableBatchChecker:
     """可靠的批量检查器"""
 
     def __init__(self):
-        self.conn = None
+        self.db = None
         self.processed_domains = set()
         self.failed_domains = []
+        # 每个 context 只装一次的请求拦截（图片/媒体/字体/样式表）
+        self.blocking = ResourcePolicy()
+        # 令牌桶 + AIMD：出错 / 超时 / 验证码页面增多时减半并发和速率，健康时慢慢加回
+        self.rate = RateController(max_concurrency=CONCURRENT_BROWSERS)
         self.load_progress()
 
     def load_progress(self):
@@ -69,26 +76,43 @@ class ReliableBatchChecker:
                 'updated_at': datetime.now().isoformat()
             }, f, indent=2)
 
-    def connect_db(self):
-        """连接数据库（带重试）"""
-        for i in range(3):
-            try:
-                self.conn = get_db_connection()
-                print(f"✅ 数据库连接成功")
-                return True
-            except Exception as e:
-                print(f"❌ 数据库连接失败 (尝试 {i+1}/3): {e}")
-                time.sleep(2)
-        return False
-
-    async def check_single_domain(self, page, domain: str, retry_count: int = 0) -> Optional[Dict]:
-        """检查单个域名（带重试）"""
+    async def connect_db(self):
+        """连接数据库（异步连接池，带重试）"""
         try:
-            # 开启请求拦截，加速加载
-            await page.route("**/*", lambda route: route.abort() 
-                if route.request.resource_type in ["image", "media", "font", "stylesheet"] 
-                else route.continue_())
+            self.db = await AsyncDatabase().open(retries=2, backoff=2)
+            print(f"✅ 数据库连接成功")
+            return True
+        except Exception as e:
+            print(f"❌ 数据库连接失败: {e}")
+            return False
 
+    @staticmethod
+    def error_result(domain: str, error: BaseException) -> Dict:
+        return {
+            'domain': domain,
+            'has_ads': False,
+            'ad_count': 0,
+            'customer_type': 'error',
+            'error': str(error)
+        }
+
+    async def check_single_domain(self, page, domain: str) -> Optional[Dict]:
+        """检查单个域名，并记录该域名被拦截的请求数 / 估算节省的流量"""
+        self.blocking.begin(page, domain)
+        await self.rate.acquire_async()
+        result = None
+        try:
+            result = await self._check_single_domain(page, domain)
+        finally:
+            blocked = self.blocking.finish(page)
+            self.rate.release(classify(result['error'], page.url) if result else ERROR)
+        result['blocked_requests'] = blocked['blocked']
+        result['bytes_saved'] = blocked['bytes_saved']
+        return result
+
+    async def _check_single_domain(self, page, domain: str, retry_count: int = 0) -> Optional[Dict]:
+        """检查单个域名（带重试）"""
+        try:
             # 去掉 www. 前缀，确保查询准确
             check_domain = domain.replace('www.', '').strip()
             url = f'https://adstransparency.google.com/?region=anywhere&domain={check_domain}'
@@ -149,69 +173,51 @@ class ReliableBatchChecker:
             # 重试机制
             if retry_count < MAX_RETRIES:
                 print(f"  ⚠️  {domain} 失败，重试 {retry_count + 1}/{MAX_RETRIES}")
+                # 重试也是一次请求：先报告这次失败，再重新排队拿令牌
+                self.rate.release(classify(e, page.url))
                 await asyncio.sleep(2)
-                return await self.check_single_domain(page, domain, retry_count + 1)
+                await self.rate.acquire_async()
+                return await self._check_single_domain(page, domain, retry_count + 1)
             else:
-                return {
-                    'domain': domain,
-                    'has_ads': False,
-                    'ad_count': 0,
-                    'customer_type': 'error',
-                    'error': str(e)
-                }
+                return self.error_result(domain, e)
 
-    def batch_update_database(self, results: List[Dict]):
-        """批量更新数据库（更快更可靠）"""
+    async def batch_update_database(self, results: List[Dict]):
+        """批量更新数据库（后台写入，不阻塞页面检查）"""
         if not results:
             return
 
-        try:
-            cur = self.conn.cursor()
-
-            # 批量更新
-            for result in results:
-                if result['error']:
-                    # 记录失败的域名
-                    self.failed_domains.append(result['domain'])
-                    continue
+        rows = []
+        for result in results:
+            if result['error']:
+                # 记录失败的域名
+                self.failed_domains.append(result['domain'])
+                continue
+
+            customer_type = result['customer_type']
+            rows.append({
+                'domain': result['domain'],
+                'customer_type': customer_type,
+                'has_google_ads': result['has_ads'],
+                # 映射到旧字段
+                'is_new_customer': None if customer_type == 'has_ads' else False,
+                'google_ads_count': result['ad_count'],
+                'google_ads_url': result.get('google_ads_url'),
+            })
 
-                domain = result['domain']
-                customer_type = result['customer_type']
-                ad_count = result['ad_count']
-                google_ads_url = result.get('google_ads_url')
+        if not rows:
+            return
 
-                # 映射到旧字段
-                has_google_ads = result['has_ads']
-                is_new_customer = None if customer_type == 'has_ads' else False
-
-                cur.execute("""
-                    UPDATE stores
-                    SET customer_type = %s,
-                        ads_check_level = 'reliable_batch',
-                        ads_last_checked = NOW(),
-                        has_google_ads = %s,
-                        is_new_customer = %s,
-                        google_ads_count = %s,
-                        google_ads_url = %s
-                    WHERE domain = %s
-                """, (customer_type, has_google_ads, is_new_customer, ad_count, google_ads_url, domain))
-
-                self.processed_domains.add(domain)
-
-            # 批量 commit（更快）
-            self.conn.commit()
-            print(f"  💾 批量更新 {len(results)} 个域名到数据库")
-
-            # 保存进度
+        def on_done(matched, error):
+            if error is not None:
+                print(f"❌ 批量更新失败: {error}")
+                return
+            # 只有 commit 成功后才记入进度
+            self.processed_domains.update(row['domain'] for row in rows)
+            print(f"  💾 批量更新 {matched}/{len(rows)} 个域名到数据库")
             self.save_progress()
 
-            cur.close()
-            return True
-
-        except Exception as e:
-            print(f"❌ 批量更新失败: {e}")
-            self.conn.rollback()
-            return False
+        # 整批一条 UPDATE ... FROM unnest(...)；这里只在写入积压时才等待
+        await self.db.submit(bulk_update_ad_results_async, rows, 'reliable_batch', on_done=on_done)
 
     async def check_domains_batch(self, domains: List[str]):
         """批量检查域名（异步并发）"""
@@ -223,7 +229,7 @@ class ReliableBatchChecker:
             return
 
         print(f"\n🚀 需要检查: {len(to_check)} 个域名")
-        print(f"⚡ 并发数: {CONCURRENT_BROWSERS}")
+        print(f"⚡ 并发数: {self.rate.limit} (自适应, 上限 {CONCURRENT_BROWSERS}, 速率上限 {self.rate.max_rate:.1f} req/s)")
         print(f"📦 批量大小: {BATCH_SIZE} (每次 commit)\n")
 
         total = len(to_check)
@@ -243,44 +249,29 @@ class ReliableBatchChecker:
                 context = await browser.new_context(
                     user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
                 )
+                await self.blocking.install(context)
                 contexts.append(context)
 
-            # 分批处理
-            for i in range(0, len(to_check), CONCURRENT_BROWSERS):
-                batch = to_check[i:i + CONCURRENT_BROWSERS]
-                tasks = []
-
-                # 创建任务
-                for idx, domain in enumerate(batch):
-                    context = contexts[idx % len(contexts)]
-                    page = await context.new_page()
-                    task = asyncio.create_task(self.check_single_domain(page, domain))
-                    tasks.append((task, page, domain))
-
-                # 并发执行
-                for task, page, domain in tasks:
-                    try:
-                        result = await task
-                        batch_results.append(result)
-
-                        completed += 1
-                        status = '✅' if result['has_ads'] else '⭕'
-                        error_msg = f" (❌ {result['error']})" if result['error'] else ''
-                        print(f"[{completed}/{total}] {status} {result['domain']}: {result['ad_count']} 个广告{error_msg}")
-
-                        # 每 BATCH_SIZE 个更新一次数据库
-                        if len(batch_results) >= BATCH_SIZE:
-                            self.batch_update_database(batch_results)
-                            batch_results = []
-
-                    except Exception as e:
-                        print(f"❌ 任务执行失败 {domain}: {e}")
-                    finally:
-                        await page.close()
+            # CONCURRENT_BROWSERS 个常驻页面从队列取域名，结果按完成顺序返回
+            pool = PagePool(contexts, self.check_single_domain, error_result=self.error_result)
+            async for result in pool.run(to_check):
+                batch_results.append(result)
+
+                completed += 1
+                status = '✅' if result['has_ads'] else '⭕'
+                error_msg = f" (❌ {result['error']})" if result['error'] else ''
+                blocked_msg = f" | 拦截 {result['blocked_requests']} 个请求" if result.get('blocked_requests') else ''
+                print(f"[{completed}/{total}] {status} {result['domain']}: {result['ad_count']} 个广告{blocked_msg}{error_msg}")
+
+                # 每 BATCH_SIZE 个更新一次数据库
+                if len(batch_results) >= BATCH_SIZE:
+                    await self.batch_update_database(batch_results)
+                    batch_results = []
 
             # 更新剩余的结果
             if batch_results:
-                self.batch_update_database(batch_results)
+                await self.batch_update_database(batch_results)
+            await self.db.drain()
 
             # 关闭浏览器
             for context in contexts:
@@ -295,14 +286,13 @@ class ReliableBatchChecker:
         print()
 
         # 连接数据库
-        if not self.connect_db():
+        if not await self.connect_db():
             print("❌ 无法连接数据库，退出")
             return
 
         # 获取需要检查的域名
         try:
-            cur = self.conn.cursor()
-            cur.execute("""
+            rows = await self.db.fetch("""
                 SELECT domain
                 FROM stores
                 WHERE country_code IN ('CN', 'HK')
@@ -310,8 +300,7 @@ class ReliableBatchChecker:
                 ORDER BY estimated_monthly_visits DESC
             """)
 
-            all_domains = [row[0] for row in cur.fetchall()]
-            cur.close()
+            all_domains = [row['domain'] for row in rows]
 
             print(f"📊 数据库中共有 {len(all_domains)} 个域名")
             print(f"✅ 已处理: {len(self.processed_domains)} 个")
@@ -337,6 +326,15 @@ class ReliableBatchChecker:
         print(f"⏱️  总耗时: {elapsed:.2f} 秒 ({elapsed/60:.1f} 分钟)")
         print(f"✅ 成功处理: {len(self.processed_domains)} 个域名")
         print(f"❌ 失败: {len(self.failed_domains)} 个域名")
+        rate = self.rate.metrics()
+        print(f"🚦 请求速率: {rate['rate']:.2f} req/s, 并发 {rate['limit']}, 降速 {rate['decreases']} 次 / "
+              f"提速 {rate['increases']} 次, 结果 {rate['outcomes']}")
+        blocked = self.blocking.totals()
+        print(f"🚫 拦截请求: {blocked['blocked']} 个, 估算节省流量 {blocked['bytes_saved'] / 1024 / 1024:.1f} MB "
+              f"({', '.join(f'{t} {n}' for t, n in sorted(blocked['by_type'].items()))})")
+        db_metrics = self.db.metrics()
+        print(f"💾 数据库写入: {db_metrics['writes']} 批 / {db_metrics['rows']} 行, "
+              f"平均 {db_metrics['avg_write_ms']:.0f}ms/批 (后台执行), 失败 {db_metrics['failed_writes']} 批")
         if len(self.processed_domains) > 0:
             print(f"📈 平均速度: {elapsed/len(self.processed_domains):.2f} 秒/域名")
         print()
@@ -353,8 +351,8 @@ class ReliableBatchChecker:
         print("="*100)
 
         # 关闭数据库连接
-        if self.conn:
-            self.conn.close()
+        if self.db:
+            await self.db.close()
 
 
 async def main():
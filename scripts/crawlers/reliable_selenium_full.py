@@ -19,11 +19,17 @@ import re
 import json
 from datetime import datetime
 from pathlib import Path
+import sys
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 
+sys.path.append(str(Path(__file__).parent.parent))
+from ad_result_writer import bulk_update_ad_results
+from rate_control import RateController, driver_outcome
+from write_behind import WriteBehindQueue
+
 # 数据库配置
 DB_CONFIG = {
     'host': 'ep-misty-star-ahewx63v-pooler.c-3.us-east-1.aws.neon.tech',
@@ -47,7 +53,10 @@ class ReliableSeleniumChecker:
         self.driver = None
         self.processed_domains = set()
         self.failed_domains = []
-        self.current_batch = []
+        # 结果交给后台线程写库（批量 UPDATE + 进度文件），浏览器不等数据库
+        self.writer = WriteBehindQueue(self.batch_update_database, max_batch=BATCH_SIZE)
+        # 请求节奏：令牌桶，出错 / 验证码页面时自动降速（ADS_MAX_RATE 为上限）
+        self.rate = RateController()
         self.total_checked = 0
         self.load_progress()
 
@@ -164,59 +173,30 @@ class ReliableSeleniumChecker:
                     'error': str(e)
                 }
 
-    def batch_update_database(self):
-        """批量更新数据库"""
-        if not self.current_batch:
-            return True
+    def batch_update_database(self, results):
+        """批量更新数据库（在 write-behind 线程中执行，失败时抛出由其重试）"""
+        rows = [{
+            'domain': result['domain'],
+            'customer_type': result['customer_type'],
+            'has_google_ads': result['has_ads'],
+            'is_new_customer': None if result['customer_type'] == 'has_ads' else False,
+            'google_ads_count': result['ad_count'],
+            'google_ads_url': result.get('google_ads_url'),
+        } for result in results if not result['error']]
 
         try:
-            cur = self.conn.cursor()
-            updated = 0
-
-            for result in self.current_batch:
-                if result['error']:
-                    continue
-
-                domain = result['domain']
-                customer_type = result['customer_type']
-                ad_count = result['ad_count']
-                google_ads_url = result.get('google_ads_url')
-                has_google_ads = result['has_ads']
-                is_new_customer = None if customer_type == 'has_ads' else False
-
-                cur.execute("""
-                    UPDATE stores
-                    SET customer_type = %s,
-                        ads_check_level = 'reliable_selenium_full',
-                        ads_last_checked = NOW(),
-                        has_google_ads = %s,
-                        is_new_customer = %s,
-                        google_ads_count = %s,
-                        google_ads_url = %s
-                    WHERE domain = %s
-                """, (customer_type, has_google_ads, is_new_customer, ad_count, google_ads_url, domain))
-
-                self.processed_domains.add(domain)
-                updated += 1
-
-            # 批量 commit（关键优化）
-            self.conn.commit()
-            cur.close()
-
-            print(f"  💾 批量更新 {updated} 个域名到数据库")
-
-            # 保存进度
-            self.save_progress()
-
-            # 清空当前批次
-            self.current_batch = []
-
-            return True
-
+            # 整批一条 UPDATE ... FROM (VALUES ...)，一次往返
+            updated = bulk_update_ad_results(self.conn, rows, 'reliable_selenium_full')
         except Exception as e:
             print(f"  ❌ 批量更新失败: {e}")
             self.conn.rollback()
-            return False
+            raise
+
+        self.processed_domains.update(row['domain'] for row in rows)
+        print(f"  💾 批量更新 {updated} 个域名到数据库")
+
+        # 保存进度
+        self.save_progress()
 
     def run(self):
         """运行完整检查"""
@@ -280,27 +260,26 @@ class ReliableSeleniumChecker:
         start_time = time.time()
 
         # 逐个检查
+        errors = 0
+        self.writer.start()
         for i, (domain, visits, country) in enumerate(to_check, 1):
             flag = '🇨🇳' if country == 'CN' else '🇭🇰'
             print(f"[{i}/{len(to_check)}] 检查 {domain} ({visits:,} 访问/月 {flag})...", end=' ')
 
-            # 检查广告
+            # 检查广告（按速率控制器放行）
+            self.rate.acquire()
             result = self.check_ads(domain)
-            self.current_batch.append(result)
+            self.rate.release(driver_outcome(self.driver, result['error']))
+            self.writer.put(result)
             self.total_checked += 1
+            if result['error']:
+                errors += 1
 
             # 显示结果
             status = '✅' if result['has_ads'] else '⭕'
             error_msg = f" (❌ {result['error']})" if result['error'] else ''
             print(f"{status} {result['ad_count']} 个广告{error_msg}")
 
-            # 批量更新数据库
-            if len(self.current_batch) >= BATCH_SIZE:
-                self.batch_update_database()
-
-            # 短暂延迟，避免请求太快
-            time.sleep(0.5)
-
             # 每 100 个显示进度统计
             if i % 100 == 0:
                 elapsed = time.time() - start_time
@@ -310,12 +289,11 @@ class ReliableSeleniumChecker:
                 print(f"   已完成: {i}/{len(to_check)} ({i/len(to_check)*100:.1f}%)")
                 print(f"   平均速度: {avg_time:.2f} 秒/域名")
                 print(f"   预计剩余: {remaining/3600:.1f} 小时")
-                print(f"   成功率: {(i - len([r for r in self.current_batch if r['error']]))/i*100:.1f}%")
+                print(f"   成功率: {(i - errors)/i*100:.1f}%")
                 print()
 
-        # 更新剩余的批次
-        if self.current_batch:
-            self.batch_update_database()
+        # 写完队列中剩余的结果
+        self.writer.close()
 
         # 计算总耗时
         elapsed = time.time() - start_time
@@ -329,6 +307,9 @@ class ReliableSeleniumChecker:
         print(f"⏱️  总耗时: {elapsed:.2f} 秒 ({elapsed/3600:.2f} 小时)")
         print(f"✅ 成功处理: {len(self.processed_domains)} 个域名")
         print(f"❌ 失败: {len(self.failed_domains)} 个域名")
+        rate = self.rate.metrics()
+        print(f"🚦 请求速率: {rate['rate']:.2f} req/s, 降速 {rate['decreases']} 次 / 提速 {rate['increases']} 次, "
+              f"等待 {rate['waited_s']:.0f}s, 结果 {rate['outcomes']}")
         if self.total_checked > 0:
             print(f"📈 平均速度: {elapsed/self.total_checked:.2f} 秒/域名")
             success_rate = (self.total_checked - len(self.failed_domains)) / self.total_checked * 100
@@ -375,6 +356,7 @@ def main():
     except KeyboardInterrupt:
         print("\n\n⚠️  用户中断！")
         print("💾 正在保存进度...")
+        checker.writer.close()
         checker.save_progress()
         print("✅ 进度已保存，下次运行会继续")
         if checker.driver:
@@ -384,6 +366,7 @@ def main():
     except Exception as e:
         print(f"\n\n❌ 发生错误: {e}")
         print("💾 正在保存进度...")
+        checker.writer.close()
         checker.save_progress()
         if checker.driver:
             checker.driver.quit()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Single-pass streaming partitioner for the storeleads CSV export.
+
+Reads the raw export once and routes every record to any number of output
+sinks. Only the columns referenced by sink predicates are decoded; the
+original record bytes are copied unchanged into every matching output, so
+quoting and line endings are preserved exactly.
+
+Example:
+    sinks = [
+        Sink('us.csv', country_in('US')),
+        Sink('us-premium.csv', country_in('US') & visits_at_least(1000)),
+        Sink('other.csv', ~country_in('CN', 'HK', 'US')),
+    ]
+    stats = partition('shopify-storeleads.csv', sinks)
+"""
+
+import csv
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+READ_BUFFER_BYTES = 16 * 1024 * 1024
+WRITE_BUFFER_BYTES = 4 * 1024 * 1024
+
+
+def iter_records(f) -> Iterator[bytes]:
+    """Yield raw CSV records (bytes, including the line terminator).
+
+    A record continues over physical lines while it has an unbalanced
+    number of quote characters, which handles newlines inside quoted
+    fields such as ``description``.
+    """
+    pending = []
+    quotes = 0
+    for line in f:
+        quotes += line.count(b'"')
+        if quotes % 2:
+            pending.append(line)
+            continue
+        if pending:
+            pending.append(line)
+            line = b''.join(pending)
+            pending = []
+        quotes = 0
+        yield line
+    if pending:
+        yield b''.join(pending)
+
+
+def parse_header(record: bytes) -> List[str]:
+    """Parse the header record into a list of column names."""
+    text = record.decode('utf-8-sig').rstrip('\r\n')
+    return next(csv.reader([text]))
+
+
+class FieldExtractor:
+    """Decode selected columns from a raw record without parsing the rest."""
+
+    def __init__(self, header: List[str], columns):
+        missing = [c for c in columns if c not in header]
+        if missing:
+            raise KeyError(f"Columns not in header: {', '.join(missing)}")
+        self.columns = list(columns)
+        self.indexes = [header.index(c) for c in self.columns]
+        self.max_index = max(self.indexes) if self.indexes else -1
+
+    def __call__(self, record: bytes) -> Dict[str, str]:
+        if self.max_index < 0:
+            return {}
+
+        parts = record.split(b',', self.max_index + 1)
+        head = parts[:self.max_index + 1]
+        # Fast path: no quotes before the last needed column, so plain
+        # comma splitting is exact. Otherwise fall back to the csv module.
+        if len(head) > self.max_index and not any(b'"' in p for p in head):
+            values = [head[i].decode('utf-8').rstrip('\r\n') for i in self.indexes]
+        else:
+            row = next(csv.reader([record.decode('utf-8')]), [])
+            values = [row[i] if i < len(row) else '' for i in self.indexes]
+
+        return dict(zip(self.columns, values))
+
+
+class Predicate:
+    """A row filter that knows which columns it reads.
+
+    Predicates compose with ``&``, ``|`` and ``~``.
+    """
+
+    def __init__(self, columns, fn: Callable[[Dict[str, str]], bool]):
+        self.columns = tuple(columns)
+        self.fn = fn
+
+    def __call__(self, fields: Dict[str, str]) -> bool:
+        return self.fn(fields)
+
+    def __and__(self, other: 'Predicate') -> 'Predicate':
+        return Predicate(_merge(self.columns, other.columns),
+                         lambda r: self.fn(r) and other.fn(r))
+
+    def __or__(self, other: 'Predicate') -> 'Predicate':
+        return Predicate(_merge(self.columns, other.columns),
+                         lambda r: self.fn(r) or other.fn(r))
+
+    def __invert__(self) -> 'Predicate':
+        return Predicate(self.columns, lambda r: not self.fn(r))
+
+
+def _merge(a, b) -> Tuple[str, ...]:
+    return tuple(dict.fromkeys(a + b))
+
+
+def parse_visits(value: str) -> Optional[int]:
+    """Parse ``estimated_monthly_visits``; None when empty or invalid."""
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def everything() -> Predicate:
+    return Predicate((), lambda r: True)
+
+
+def country_in(*codes: str) -> Predicate:
+    wanted = {c.upper() for c in codes}
+    return Predicate(('country_code',),
+                     lambda r: r['country_code'].strip().upper() in wanted)
+
+
+def language_is(code: str) -> Predicate:
+    code = code.lower()
+    return Predicate(('language_code',),
+                     lambda r: r['language_code'].strip().lower() == code)
+
+
+def visits_at_least(threshold: int) -> Predicate:
+    def check(r):
+        visits = parse_visits(r['estimated_monthly_visits'])
+        return visits is not None and visits >= threshold
+    return Predicate(('estimated_monthly_visits',), check)
+
+
+def column_equals(column: str, value: str) -> Predicate:
+    return Predicate((column,), lambda r: r[column].strip() == value)
+
+
+class Sink:
+    """An output file plus the predicate deciding which rows it receives.
+
+    A sink with ``path=None`` only counts matching rows.
+    """
+
+    def __init__(self, path: Optional[str], predicate: Optional[Predicate] = None, name: Optional[str] = None):
+        self.path = path
+        self.predicate = predicate or everything()
+        self.name = name or path
+        self.rows = 0
+        self._file = None
+
+    def open(self, header: bytes):
+        if self.path is None:
+            return
+        self._file = open(self.path, 'wb', buffering=WRITE_BUFFER_BYTES)
+        self._file.write(header)
+
+    def write(self, record: bytes):
+        if self._file:
+            self._file.write(record)
+        self.rows += 1
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+def partition(input_file: str, sinks: List[Sink], progress_every: int = 100000) -> Dict[str, int]:
+    """Route every record of ``input_file`` to all sinks whose predicate matches.
+
+    Returns a dict with the total row count plus the row count per sink name.
+    """
+    columns = ()
+    for sink in sinks:
+        columns = _merge(columns, sink.predicate.columns)
+
+    total = 0
+    with open(input_file, 'rb', buffering=READ_BUFFER_BYTES) as f:
+        records = iter_records(f)
+        header = next(records, None)
+        if header is None:
+            raise ValueError(f"{input_file} is empty")
+
+        extract = FieldExtractor(parse_header(header), columns)
+        for sink in sinks:
+            sink.open(header)
+
+        try:
+            for record in records:
+                if not record.strip():
+                    continue
+                total += 1
+                fields = extract(record)
+                for sink in sinks:
+                    if sink.predicate(fields):
+                        sink.write(record)
+
+                if progress_every and total % progress_every == 0:
+                    print(f"Processed {total:,} rows...")
+        finally:
+            for sink in sinks:
+                sink.close()
+
+    stats = {'total': total}
+    for sink in sinks:
+        stats[sink.name] = sink.rows
+    return stats
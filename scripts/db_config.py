@@ -1,6 +1,13 @@
 
 import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
 import psycopg2
+import psycopg2.extensions
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -17,7 +24,7 @@ else:
     load_dotenv()
 
 def get_db_connection():
-    """获取数据库连接"""
+    """获取数据库连接（每次新建；需要复用连接请用 pooled_connection()）"""
     db_url = os.getenv("POSTGRES_URL") or os.getenv("DATABASE_URL")
     
     if not db_url:
@@ -33,6 +40,257 @@ def get_db_connection():
         
     return psycopg2.connect(db_url)
 
+
+# ---------------------------------------------------------------------------
+# 连接池：进程内复用连接（每个新连接到 Neon pooler 都要一次 TLS 握手）
+# ---------------------------------------------------------------------------
+
+class PoolTimeout(psycopg2.OperationalError):
+    """等待空闲连接超时"""
+
+
+class PooledConnectionManager:
+    """线程安全的连接池
+
+    - 取出时校验：已关闭 / 状态未知的连接直接丢弃；空闲超过 ping_after 秒的
+      连接先执行 SELECT 1
+    - 新建连接失败（OperationalError）时指数退避重试
+    - fork 安全：子进程第一次使用时发现 pid 变化，丢弃继承来的连接
+      （不 close，避免关掉父进程仍在使用的 socket），重新建连
+    - metrics(): 命中率、等待、建连耗时
+    """
+
+    def __init__(self, maxconn: int = 5, ping_after: float = 30.0, retries: int = 3,
+                 backoff: float = 0.5, wait_timeout: float = 30.0, connect=get_db_connection):
+        self.maxconn = maxconn
+        self.ping_after = ping_after
+        self.retries = retries
+        self.backoff = backoff
+        self.wait_timeout = wait_timeout
+        self._connect_fn = connect
+        self._cond = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = []         # [(conn, 放回时间)]
+        self._in_use = set()
+        self._inherited = []    # fork 前的连接：只保留引用，不关闭
+        self._metrics = {
+            'checkouts': 0, 'hits': 0, 'misses': 0,
+            'waits': 0, 'wait_seconds': 0.0,
+            'connects': 0, 'connect_seconds': 0.0, 'connect_failures': 0,
+            'validation_failures': 0, 'discarded': 0,
+        }
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            inherited = [c for c, _ in self._idle] + list(self._in_use)
+            self._reset()
+            self._inherited = inherited
+
+    def _open(self):
+        """新建连接，失败时指数退避（带抖动）重试
+
+        在锁外调用（建连慢），计数器和其他指标一样在锁内更新
+        """
+        for attempt in range(self.retries + 1):
+            start = time.time()
+            try:
+                conn = self._connect_fn()
+                with self._cond:
+                    self._metrics['connects'] += 1
+                    self._metrics['connect_seconds'] += time.time() - start
+                return conn
+            except psycopg2.OperationalError:
+                with self._cond:
+                    self._metrics['connect_failures'] += 1
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+
+    def _is_usable(self, conn, idle_since: float) -> bool:
+        """在锁外调用：回滚和 SELECT 1 都是网络往返"""
+        if conn.closed:
+            return False
+        try:
+            status = conn.get_transaction_status()
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                return False
+            if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if time.time() - idle_since < self.ping_after:
+                return True
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _discard(self, conn):
+        self._metrics['discarded'] += 1
+        self._close(conn)
+
+    def getconn(self):
+        """取出一个可用连接（用完必须 putconn）
+
+        锁只保护池的状态：空闲连接在锁内取出并预留名额，校验（网络往返）
+        和建连都在锁外进行，一个慢连接不会卡住其他线程
+        """
+        deadline = time.time() + self.wait_timeout
+        waited_since = None
+        with self._cond:
+            self._check_fork()
+            self._metrics['checkouts'] += 1
+
+        while True:
+            with self._cond:
+                while not self._idle and len(self._in_use) >= self.maxconn:
+                    # 已达上限：等待别的线程归还
+                    if waited_since is None:
+                        waited_since = time.time()
+                        self._metrics['waits'] += 1
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        self._record_wait(waited_since)
+                        raise PoolTimeout(f"no free connection after {self.wait_timeout}s "
+                                          f"({self.maxconn} in use)")
+                    self._cond.wait(remaining)
+
+                if self._idle:
+                    # 取出即占用名额，校验期间别的线程不会拿到它
+                    conn, idle_since = self._idle.pop()
+                    self._in_use.add(conn)
+                else:
+                    # 预留名额后在锁外建连，避免阻塞其他线程
+                    conn, idle_since = None, None
+                    placeholder = object()
+                    self._in_use.add(placeholder)
+                    self._metrics['misses'] += 1
+                    self._record_wait(waited_since)
+
+            if conn is None:
+                break
+
+            usable = self._is_usable(conn, idle_since)
+            with self._cond:
+                if usable:
+                    self._metrics['hits'] += 1
+                    self._record_wait(waited_since)
+                    return conn
+                self._metrics['validation_failures'] += 1
+                self._metrics['discarded'] += 1
+                self._in_use.discard(conn)
+                self._cond.notify()
+            self._close(conn)
+
+        try:
+            conn = self._open()
+        except Exception:
+            with self._cond:
+                self._in_use.discard(placeholder)
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._in_use.discard(placeholder)
+            self._in_use.add(conn)
+        return conn
+
+    def _record_wait(self, waited_since: Optional[float]):
+        if waited_since is not None:
+            self._metrics['wait_seconds'] += time.time() - waited_since
+
+    def putconn(self, conn, close: bool = False):
+        """归还连接；未提交的事务会被回滚（在锁外）"""
+        with self._cond:
+            if self._pid != os.getpid() or conn not in self._in_use:
+                # 继承自父进程或不属于本池：不复用
+                return
+
+        # 连接仍记在 _in_use 里，只有调用方在用它
+        reusable = not close and not conn.closed
+        if reusable:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                reusable = False
+
+        with self._cond:
+            self._in_use.discard(conn)
+            if reusable:
+                self._idle.append((conn, time.time()))
+            else:
+                self._metrics['discarded'] += 1
+            self._cond.notify()
+        if not reusable:
+            self._close(conn)
+
+    @contextmanager
+    def connection(self):
+        """with pool.connection() as conn: ...  出错时回滚并丢弃连接"""
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except psycopg2.OperationalError:
+            broken = True
+            raise
+        finally:
+            self.putconn(conn, close=broken)
+
+    def metrics(self) -> Dict:
+        with self._cond:
+            m = dict(self._metrics)
+            m['in_use'] = len(self._in_use)
+            m['idle'] = len(self._idle)
+        m['hit_rate'] = m['hits'] / m['checkouts'] if m['checkouts'] else 0.0
+        m['avg_connect_ms'] = m['connect_seconds'] / m['connects'] * 1000 if m['connects'] else 0.0
+        m['avg_wait_ms'] = m['wait_seconds'] / m['waits'] * 1000 if m['waits'] else 0.0
+        return m
+
+    def closeall(self):
+        with self._cond:
+            if self._pid == os.getpid():
+                for conn, _ in self._idle:
+                    self._discard(conn)
+            self._idle = []
+
+
+_pool: Optional[PooledConnectionManager] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(maxconn: int = None) -> PooledConnectionManager:
+    """进程级共享连接池（DB_POOL_SIZE 环境变量可调整大小，默认 5）"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PooledConnectionManager(maxconn or int(os.getenv("DB_POOL_SIZE", "5")))
+        return _pool
+
+
+@contextmanager
+def pooled_connection():
+    """with pooled_connection() as conn: ...（复用进程内连接）"""
+    with get_pool().connection() as conn:
+        yield conn
+
+
+def pool_metrics() -> Dict:
+    """连接池统计：hits / misses / hit_rate / waits / avg_wait_ms / avg_connect_ms ..."""
+    return get_pool().metrics()
+
 def get_db_config_dict():
     """获取配置字典（用于某些需要解包 **config 的旧代码）"""
     # 优先解析 URL，如果解析失败则返回硬编码（仅为了兼容旧脚本不做大改）
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Vectorized domain features, persisted next to the columnar cache.
+
+The features are computed once for the whole ``domain`` column with
+pyarrow.compute kernels and written to ``<stem>.domains.arrow`` beside the
+cache. Filters such as the Hangzhou "normal domain" rule then become plain
+comparisons on integer columns instead of a per-row Python function.
+
+Features (one row per export row, same order as the cache):
+- domain_length: length of the full domain
+- domain_core_length: length without ``www.`` / ``.com`` (the name people see)
+- domain_hyphens / domain_digits: '-' and digit counts
+- domain_digit_ratio: domain_digits / domain_core_length
+- domain_tld: last label (``com``, ``store``, ...), dictionary-encoded
+- domain_www: domain starts with ``www.``
+
+The file is rebuilt when the CSV content (SHA-256 in the cache metadata)
+changes.
+
+Usage:
+    python3 scripts/domain_features.py shopify-storeleads.csv [--force]
+
+    from domain_features import load_domain_features
+    features = load_domain_features('shopify-storeleads.csv', columns=['domain_tld'])
+"""
+
+import json
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+
+from columnar_cache import cache_paths, ensure_cache, load_table
+
+FEATURES_SUFFIX = '.domains.arrow'
+FEATURES_VERSION = 1
+
+FEATURE_COLUMNS = [
+    'domain_length', 'domain_core_length', 'domain_hyphens', 'domain_digits',
+    'domain_digit_ratio', 'domain_tld', 'domain_www',
+]
+
+
+def features_path(csv_path) -> Path:
+    return Path(csv_path).with_suffix(FEATURES_SUFFIX)
+
+
+def compute_domain_features(domain: pa.ChunkedArray) -> pa.Table:
+    """Feature table for a string column of domains (nulls stay null)"""
+    core = pc.replace_substring(pc.replace_substring(domain, 'www.', ''), '.com', '')
+    core_length = pc.utf8_length(core)
+    digits = pc.count_substring_regex(domain, r'\p{Nd}')
+
+    # Last dot-separated label; domains without a dot have no TLD
+    tld = pc.utf8_lower(pc.struct_field(pc.extract_regex(domain, r'\.(?P<tld>[^.]+)$'), [0]))
+
+    ratio = pc.divide(pc.cast(digits, pa.float64()),
+                      pc.if_else(pc.equal(core_length, 0), pa.scalar(None, pa.float64()),
+                                 pc.cast(core_length, pa.float64())))
+
+    return pa.table({
+        'domain_length': pc.cast(pc.utf8_length(domain), pa.int32()),
+        'domain_core_length': pc.cast(core_length, pa.int32()),
+        'domain_hyphens': pc.cast(pc.count_substring(domain, '-'), pa.int32()),
+        'domain_digits': pc.cast(digits, pa.int32()),
+        'domain_digit_ratio': ratio,
+        'domain_tld': pc.dictionary_encode(tld),
+        'domain_www': pc.starts_with(domain, 'www.'),
+    })
+
+
+def _source_hash(csv_path) -> str:
+    _, meta_file = cache_paths(csv_path)
+    return json.loads(meta_file.read_text()).get('sha256')
+
+
+def _is_fresh(path: Path, source_hash: str) -> bool:
+    if not path.exists():
+        return False
+    with pa.memory_map(str(path)) as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+    return (metadata.get(b'sha256', b'').decode() == source_hash
+            and metadata.get(b'version', b'').decode() == str(FEATURES_VERSION))
+
+
+def ensure_domain_features(csv_path, force: bool = False) -> Path:
+    """Path to up-to-date domain features, computing them when needed"""
+    ensure_cache(csv_path)
+    source_hash = _source_hash(csv_path)
+    path = features_path(csv_path)
+    if not force and _is_fresh(path, source_hash):
+        return path
+
+    print(f"🔤 Computing domain features -> {path}")
+    table = compute_domain_features(load_table(csv_path, columns=['domain']).column('domain'))
+    table = table.replace_schema_metadata({'sha256': source_hash, 'version': str(FEATURES_VERSION)})
+    tmp_file = path.with_suffix(path.suffix + '.tmp')
+    feather.write_feather(table, tmp_file, compression='uncompressed')
+    tmp_file.replace(path)
+    return path
+
+
+def load_domain_features(csv_path, columns: Optional[List[str]] = None, rows=None) -> pa.Table:
+    """Memory-mapped feature columns, optionally only for ``rows``"""
+    table = feather.read_table(ensure_domain_features(csv_path), columns=columns, memory_map=True)
+    if rows is not None:
+        table = table.take(pa.array(rows, type=pa.int64()))
+    return table
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python3 scripts/domain_features.py <shopify-storeleads.csv> [--force]")
+        sys.exit(1)
+    path = ensure_domain_features(sys.argv[1], force='--force' in sys.argv)
+    print(f"✅ {path}")
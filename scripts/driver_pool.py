@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Long-lived Selenium drivers for multiprocessing.Pool workers.
+
+The parallel re-verification scripts started a new ``webdriver.Chrome``
+for every domain and quit it right after. Chrome startup (1-3 s) often
+took longer than the check itself.
+
+With ``init_worker`` as the Pool initializer, each worker process keeps
+one driver and reuses it across domains:
+
+- the driver is started lazily on the first ``get_driver()`` call
+- it is restarted after ``max_pages`` page loads (Chrome's memory use
+  creeps up on a long-lived tab), or after a check inside
+  ``worker_driver()`` raised, since the driver may have crashed
+- it is quit when the worker exits; close the pool with ``close()`` /
+  ``join()`` rather than ``terminate()`` so that the exit hook runs
+
+``max_pages`` defaults to the DRIVER_MAX_PAGES environment variable (200);
+1 reproduces the old one-driver-per-domain behaviour.
+
+Usage:
+    with Pool(processes=10, initializer=init_worker) as pool:
+        for result in pool.imap_unordered(verify_store, args):
+            ...
+        pool.close()
+        pool.join()
+
+    def verify_store(args):
+        try:
+            with worker_driver() as driver:
+                driver.get(url)
+                ...
+"""
+
+import os
+from contextlib import contextmanager
+from multiprocessing import util
+from typing import Iterable, Optional
+
+DEFAULT_MAX_PAGES = 200
+DEFAULT_CHROME_ARGS = ('--headless=new', '--no-sandbox', '--disable-dev-shm-usage', '--disable-gpu')
+
+_driver = None
+_pages = 0
+_max_pages = DEFAULT_MAX_PAGES
+_chrome_args = DEFAULT_CHROME_ARGS
+
+
+def init_worker(max_pages: Optional[int] = None, chrome_args: Iterable[str] = DEFAULT_CHROME_ARGS):
+    """Pool initializer: configure this worker's driver and quit it on exit"""
+    global _max_pages, _chrome_args
+    _max_pages = max_pages or int(os.getenv('DRIVER_MAX_PAGES', str(DEFAULT_MAX_PAGES)))
+    _chrome_args = tuple(chrome_args)
+    # Pool workers leave through os._exit: atexit hooks never run, finalizers do
+    util.Finalize(None, quit_driver, exitpriority=10)
+
+
+def _start_driver():
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    options = Options()
+    for arg in _chrome_args:
+        options.add_argument(arg)
+    return webdriver.Chrome(options=options)
+
+
+def get_driver():
+    """This worker's driver; (re)started when missing or its page budget is spent"""
+    global _driver, _pages
+    if _driver is not None and _pages >= _max_pages:
+        quit_driver()
+    if _driver is None:
+        _driver = _start_driver()
+        _pages = 0
+    _pages += 1
+    return _driver
+
+
+def quit_driver():
+    global _driver
+    driver, _driver = _driver, None
+    if driver is not None:
+        try:
+            driver.quit()
+        except Exception:
+            # Chrome already gone (crash): nothing to clean up
+            pass
+
+
+@contextmanager
+def worker_driver():
+    """``get_driver()`` for one check; discards the driver if the check raises"""
+    driver = get_driver()
+    try:
+        yield driver
+    except BaseException:
+        # The driver may be in any state (or Chrome gone): the next check starts a new one
+        quit_driver()
+        raise
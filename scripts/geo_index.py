@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+城市 → 省份 归一化（Chinese / pinyin city-alias dictionary）
+
+替代各脚本里重复的 ``city LIKE '%杭州%' OR city LIKE '%Hangzhou%' ...``
+（约 24 个 LIKE，无法使用 city 的 b-tree 索引，只能全表扫描）。
+导入时用 derive_geo() 计算一次 province / city_normalized 并写入带索引的列
+（见 geo-schema.sql），查询时用 province_condition() 走索引。
+
+Usage:
+    python3 scripts/geo_index.py            # 回填中国 / 香港店铺中 province 为空的行
+    python3 scripts/geo_index.py --all      # 重新计算所有行
+
+    from geo_index import ZHEJIANG, province_condition
+    sql, params = province_condition(ZHEJIANG)
+    cur.execute(f"SELECT domain FROM stores WHERE {sql} AND estimated_monthly_visits >= %s",
+                params + (1000,))
+"""
+
+import re
+import sys
+from typing import Dict, List, Optional, Tuple
+
+# 省份代码（ISO 3166-2）
+ZHEJIANG = 'CN-ZJ'
+GUANGDONG = 'CN-GD'
+FUJIAN = 'CN-FJ'
+JIANGSU = 'CN-JS'
+SHANGHAI = 'CN-SH'
+BEIJING = 'CN-BJ'
+SHANDONG = 'CN-SD'
+
+# 只有这些国家的店铺会被识别出省份（backfill_geo 的扫描范围）
+GEO_COUNTRIES = ('CN', 'HK')
+
+# 省份名称别名（出现在 city / state / company_location 中即可判定省份）
+PROVINCE_ALIASES = {
+    ZHEJIANG: ['Zhejiang', '浙江'],
+    GUANGDONG: ['Guangdong', '广东'],
+    FUJIAN: ['Fujian', '福建'],
+    JIANGSU: ['Jiangsu', '江苏'],
+    SHANGHAI: ['Shanghai', '上海'],
+    BEIJING: ['Beijing', '北京'],
+    SHANDONG: ['Shandong', '山东'],
+}
+
+# 城市别名：(标准名, 省份, 中文名)
+# 拼音相同的城市（台州/泰州）按 state/company_location 中的省份区分，
+# 无法区分时取第一条（与原 LIKE 查询一致，台州归浙江）
+CITY_ALIASES = [
+    # 浙江：11 个地级市（即原 LIKE 查询覆盖的范围）
+    ('Hangzhou', ZHEJIANG, '杭州'),
+    ('Ningbo', ZHEJIANG, '宁波'),
+    ('Wenzhou', ZHEJIANG, '温州'),
+    ('Jiaxing', ZHEJIANG, '嘉兴'),
+    ('Jinhua', ZHEJIANG, '金华'),
+    ('Shaoxing', ZHEJIANG, '绍兴'),
+    ('Huzhou', ZHEJIANG, '湖州'),
+    ('Quzhou', ZHEJIANG, '衢州'),
+    ('Taizhou', ZHEJIANG, '台州'),
+    ('Lishui', ZHEJIANG, '丽水'),
+    ('Zhoushan', ZHEJIANG, '舟山'),
+    # 浙江：常见县级市（原 LIKE 查询漏掉的电商集中地）
+    ('Yiwu', ZHEJIANG, '义乌'),
+    ('Yongkang', ZHEJIANG, '永康'),
+    ('Dongyang', ZHEJIANG, '东阳'),
+    ('Cixi', ZHEJIANG, '慈溪'),
+    ('Yuyao', ZHEJIANG, '余姚'),
+    ('Haining', ZHEJIANG, '海宁'),
+    ('Tongxiang', ZHEJIANG, '桐乡'),
+    ('Zhuji', ZHEJIANG, '诸暨'),
+    ('Wenling', ZHEJIANG, '温岭'),
+    ('Yueqing', ZHEJIANG, '乐清'),
+    ('Ruian', ZHEJIANG, '瑞安'),
+    # 广东
+    ('Shenzhen', GUANGDONG, '深圳'),
+    ('Guangzhou', GUANGDONG, '广州'),
+    ('Dongguan', GUANGDONG, '东莞'),
+    ('Foshan', GUANGDONG, '佛山'),
+    ('Zhuhai', GUANGDONG, '珠海'),
+    ('Zhongshan', GUANGDONG, '中山'),
+    ('Huizhou', GUANGDONG, '惠州'),
+    ('Shantou', GUANGDONG, '汕头'),
+    ('Jiangmen', GUANGDONG, '江门'),
+    # 福建
+    ('Xiamen', FUJIAN, '厦门'),
+    ('Fuzhou', FUJIAN, '福州'),
+    ('Quanzhou', FUJIAN, '泉州'),
+    ('Putian', FUJIAN, '莆田'),
+    ('Jinjiang', FUJIAN, '晋江'),
+    # 江苏
+    ('Suzhou', JIANGSU, '苏州'),
+    ('Nanjing', JIANGSU, '南京'),
+    ('Wuxi', JIANGSU, '无锡'),
+    ('Changzhou', JIANGSU, '常州'),
+    ('Nantong', JIANGSU, '南通'),
+    ('Yangzhou', JIANGSU, '扬州'),
+    ('Xuzhou', JIANGSU, '徐州'),
+    ('Taizhou', JIANGSU, '泰州'),
+    # 直辖市
+    ('Shanghai', SHANGHAI, '上海'),
+    ('Beijing', BEIJING, '北京'),
+    # 山东
+    ('Qingdao', SHANDONG, '青岛'),
+    ('Jinan', SHANDONG, '济南'),
+    ('Yantai', SHANDONG, '烟台'),
+]
+
+
+def _alias_regex(aliases: List[str]) -> re.Pattern:
+    """最长优先；拼音别名要求前面不是字母（避免 'chaining' 命中 'haining'）"""
+    parts = []
+    for alias in sorted(set(aliases), key=len, reverse=True):
+        escaped = re.escape(alias.lower())
+        parts.append(f'(?<![a-z]){escaped}' if alias.isascii() else escaped)
+    return re.compile('|'.join(parts))
+
+
+def _build_index():
+    city_lookup: Dict[str, List[Tuple[str, str]]] = {}
+    for canonical, province, hanzi in CITY_ALIASES:
+        for alias in (canonical.lower(), hanzi):
+            city_lookup.setdefault(alias, []).append((canonical, province))
+
+    province_lookup = {}
+    for province, aliases in PROVINCE_ALIASES.items():
+        for alias in aliases:
+            province_lookup[alias.lower()] = province
+
+    return (city_lookup, _alias_regex(list(city_lookup)),
+            province_lookup, _alias_regex(list(province_lookup)))
+
+
+_CITY_LOOKUP, _CITY_RE, _PROVINCE_LOOKUP, _PROVINCE_RE = _build_index()
+
+
+def _find_province(*texts) -> Optional[str]:
+    for text in texts:
+        if text:
+            match = _PROVINCE_RE.search(text.lower())
+            if match:
+                return _PROVINCE_LOOKUP[match.group(0)]
+    return None
+
+
+def derive_geo(city: Optional[str], state: Optional[str] = None,
+               company_location: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+    """(province, city_normalized) for one store
+
+    - city 中识别出城市 → 该城市及其省份
+    - 否则 city / state / company_location 中出现省份名 → 只有省份
+    """
+    hint = _find_province(state, company_location)
+
+    if city:
+        match = _CITY_RE.search(city.lower())
+        if match:
+            candidates = _CITY_LOOKUP[match.group(0)]
+            for canonical, province in candidates:
+                if province == hint:
+                    return province, canonical
+            return candidates[0][1], candidates[0][0]
+
+    province = _find_province(city) or hint
+    return province, None
+
+
+def province_condition(province: str, column_prefix: str = '') -> Tuple[str, tuple]:
+    """按省份筛选的 SQL 片段（走 idx_stores_province_visits 索引）"""
+    return f"{column_prefix}province = %s", (province,)
+
+
+def backfill_geo(conn, only_missing: bool = True) -> int:
+    """为已有数据计算 province / city_normalized，返回更新的行数
+
+    按不同的 (city, state, company_location) 组合计算一次，再用一条
+    UPDATE ... FROM (VALUES ...) 批量写回。
+
+    only_missing 时只看 GEO_COUNTRIES 以及 country_code 为空、且 province
+    为空的行：其他国家的店铺永远得不到 province，否则每次导入后都会把它们
+    全部重新扫描一遍（走 idx_stores_country）。country_code 为空的店铺照旧
+    按城市推导（原来的 city LIKE 筛选不看国家）；country_code 是其他国家
+    但城市在浙江的少数店铺只在 --all（全量重算）时处理。
+    """
+    from psycopg2.extras import execute_values
+
+    cur = conn.cursor()
+    where, params = "", None
+    if only_missing:
+        where, params = ("WHERE province IS NULL AND (country_code IN %s OR country_code IS NULL)",
+                         (GEO_COUNTRIES,))
+    cur.execute(f"""
+        SELECT DISTINCT city, state, company_location
+        FROM stores
+        {where}
+    """, params)
+    combos = cur.fetchall()
+
+    values = []
+    for city, state, location in combos:
+        province, city_normalized = derive_geo(city, state, location)
+        if province:
+            values.append((city, state, location, province, city_normalized))
+
+    updated = 0
+    countries = ', '.join(f"'{c}'" for c in GEO_COUNTRIES)
+    scope = (f"AND s.province IS NULL AND (s.country_code IN ({countries}) OR s.country_code IS NULL)"
+             if only_missing else "")
+    if values:
+        # RETURNING + fetch：execute_values 分页执行，cur.rowcount 只是最后一页的行数
+        updated = len(execute_values(cur, f"""
+            UPDATE stores s
+            SET province = v.province,
+                city_normalized = v.city_normalized
+            FROM (VALUES %s) AS v(city, state, company_location, province, city_normalized)
+            WHERE s.city IS NOT DISTINCT FROM v.city
+              AND s.state IS NOT DISTINCT FROM v.state
+              AND s.company_location IS NOT DISTINCT FROM v.company_location
+              {scope}
+            RETURNING 1
+        """, values, page_size=1000, fetch=True))
+    conn.commit()
+    cur.close()
+    return updated
+
+
+if __name__ == '__main__':
+    from db_config import get_db_connection
+
+    conn = get_db_connection()
+    print("🗺️  计算 province / city_normalized ...")
+    count = backfill_geo(conn, only_missing='--all' not in sys.argv)
+    print(f"✅ 已更新 {count:,} 个店铺")
+    conn.close()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Worker-pool engine for the Playwright checkers.
+
+The async checkers used to open a new page per domain and await their
+tasks in waves of CONCURRENT_BROWSERS (or, in fast_google_ads_checker,
+create one page per domain for the whole list up front). A wave only
+finished when its slowest domain did.
+
+PagePool instead keeps N long-lived pages (spread over the given browser
+contexts). Each page runs a worker that pulls the next domain from an
+``asyncio.Queue`` as soon as it is done with the previous one. Results
+stream out in completion order, and at most ``2 * N`` domains are queued
+ahead of the workers, so memory does not grow with the length of the
+list.
+
+A page that crashed or was closed is replaced before its next domain.
+``setup_page`` runs once per page (e.g. to install request routes), not
+once per domain.
+
+Usage:
+    pool = PagePool(contexts, check_single_domain, pages=16)
+    async for result in pool.run(domains):
+        ...
+"""
+
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Iterable, List, Optional
+
+_DONE = object()
+
+
+def default_error_result(domain: str, error: BaseException) -> dict:
+    return {'domain': domain, 'error': str(error)}
+
+
+class PagePool:
+    """N persistent pages pulling domains from a shared queue"""
+
+    def __init__(self, contexts: List, check: Callable[..., Awaitable[dict]], pages: Optional[int] = None,
+                 setup_page: Optional[Callable[..., Awaitable]] = None,
+                 error_result: Callable[[str, BaseException], dict] = default_error_result):
+        self.contexts = contexts
+        self.check = check
+        self.size = pages or len(contexts)
+        self.setup_page = setup_page
+        self.error_result = error_result
+        self.page_restarts = 0
+        self.completed = 0
+
+    async def _new_page(self, context):
+        page = await context.new_page()
+        if self.setup_page is not None:
+            await self.setup_page(page)
+        return page
+
+    @staticmethod
+    async def _close(page):
+        """Close a page that may already be crashed (or its context closed)"""
+        if page is None:
+            return
+        try:
+            if not page.is_closed():
+                await page.close()
+        except Exception:
+            pass
+
+    async def _worker(self, index: int, todo: asyncio.Queue, results: asyncio.Queue):
+        context = self.contexts[index % len(self.contexts)]
+        page = None
+        try:
+            while True:
+                domain = await todo.get()
+                if domain is _DONE:
+                    return
+                try:
+                    if page is None or page.is_closed():
+                        if page is not None:
+                            self.page_restarts += 1
+                        page = await self._new_page(context)
+                    result = await self.check(page, domain)
+                except Exception as e:
+                    # Report the domain first: a failing cleanup must not lose it
+                    await results.put(self.error_result(domain, e))
+                    # The page may be in any state after an unexpected error: start over
+                    await self._close(page)
+                    page = None
+                    continue
+                await results.put(result)
+        finally:
+            await self._close(page)
+            await results.put(_DONE)
+
+    async def _feed(self, domains: Iterable[str], todo: asyncio.Queue):
+        for domain in domains:
+            await todo.put(domain)
+        for _ in range(self.size):
+            await todo.put(_DONE)
+
+    async def run(self, domains: Iterable[str]) -> AsyncIterator[dict]:
+        """Check every domain; yields results as they complete"""
+        todo = asyncio.Queue(maxsize=2 * self.size)
+        results = asyncio.Queue()
+        feeder = asyncio.create_task(self._feed(domains, todo))
+        workers = [asyncio.create_task(self._worker(i, todo, results)) for i in range(self.size)]
+        running = len(workers)
+        try:
+            while running:
+                result = await results.get()
+                if result is _DONE:
+                    running -= 1
+                    continue
+                self.completed += 1
+                yield result
+        finally:
+            # All workers gone (the feeder may still be blocked on a full queue if they
+            # died), or the consumer stopped early: stop everything and close the pages
+            for task in [feeder] + workers:
+                task.cancel()
+            await asyncio.gather(feeder, *workers, return_exceptions=True)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Early-exit readiness detection for ads-transparency pages (Selenium).
+
+OptimizedAdsChecker.check_domain waited up to 3 s for '个广告' or 'ads'
+to show up in ``body.text``. Every poll serialized the whole body text,
+a fixed 0.2 s sleep followed, and a domain without ads always waited
+out the full timeout.
+
+ReadinessDetector instead injects one script per page (``execute_async_script``)
+that resolves as soon as the page reaches a terminal state:
+
+- ``ads``: an ad count ("42 个广告", "~200 个广告", "1,000+ ads") or a
+  ``creative-preview`` element
+- ``no_ads``: a count of 0 or "未找到任何广告"
+- ``captcha``: redirected to /sorry/ or a reCAPTCHA frame / unusual-traffic text
+- ``error``: the site's error message
+- ``timeout``: none of the above within ``timeout`` seconds
+
+The script checks a few targeted selectors once, then watches a
+MutationObserver and only looks at the text of the nodes that were
+added or changed; it never re-reads the full body text.
+
+Each verdict records its time-to-verdict (from navigation start) in a
+per-state histogram, ``histogram.lines()`` prints it.
+
+Usage:
+    detector = ReadinessDetector(timeout=3)
+    verdict = detector.load(driver, url)   # Verdict(state='no_ads', text='0 个广告', seconds=0.84)
+"""
+
+import re
+import time
+from collections import namedtuple
+from typing import Dict, List, Optional, Sequence
+
+ADS = 'ads'
+NO_ADS = 'no_ads'
+CAPTCHA = 'captcha'
+ERROR = 'error'
+TIMEOUT = 'timeout'
+
+DEFAULT_BUCKETS = (0.5, 1, 2, 3, 5)
+
+Verdict = namedtuple('Verdict', ['state', 'text', 'seconds'])
+
+_COUNT = re.compile(r'(\d[\d,]*)\+?\s*(?:个广告|ads?\b)', re.IGNORECASE)
+
+# arguments: timeout (ms), Selenium's callback
+_SCRIPT = r"""
+const timeoutMs = arguments[0], done = arguments[arguments.length - 1];
+const COUNT = /(\d[\d,]*)\+?\s*(?:个广告|ads?\b)/i;
+const NO_ADS = ['未找到任何广告', 'No ads found', "didn't find any ads"];
+const CAPTCHA = ['unusual traffic', '异常流量'];
+const ERROR = ['出了点问题', '发生错误', 'Something went wrong'];
+const SKIP = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'TEMPLATE']);
+let finished = false, observer = null, timer = null;
+
+function finish(state, text) {
+  if (finished) return;
+  finished = true;
+  if (observer) observer.disconnect();
+  clearTimeout(timer);
+  done({state: state, text: (text || '').slice(0, 200)});
+}
+
+// Rendered text of one node (inline scripts may carry the same strings in i18n data)
+function textOf(node) {
+  if (node.nodeType === Node.TEXT_NODE) {
+    return node.parentNode && SKIP.has(node.parentNode.nodeName) ? '' : node.data;
+  }
+  return node.nodeType === Node.ELEMENT_NODE && !SKIP.has(node.nodeName) ? node.innerText : '';
+}
+
+function inspectText(text) {
+  if (!text) return false;
+  const count = text.match(COUNT);
+  if (count) {
+    finish(parseInt(count[1].replace(/,/g, ''), 10) === 0 ? 'no_ads' : 'ads', count[0]);
+  } else if (NO_ADS.some(s => text.includes(s))) {
+    finish('no_ads', text);
+  } else if (CAPTCHA.some(s => text.includes(s))) {
+    finish('captcha', text);
+  } else if (ERROR.some(s => text.includes(s))) {
+    finish('error', text);
+  }
+  return finished;
+}
+
+function inspectSelectors() {
+  if (location.pathname.includes('/sorry/') || document.querySelector('iframe[src*="recaptcha"]')) {
+    finish('captcha', location.href);
+    return true;
+  }
+  const count = document.querySelector('[class*="creative-count"], [class*="result-count"]');
+  if (count && inspectText(count.textContent)) return true;
+  if (document.querySelector('creative-preview')) {
+    finish('ads', '');
+    return true;
+  }
+  return false;
+}
+
+timer = setTimeout(() => finish('timeout', ''), timeoutMs);
+// Content rendered before the observer exists: one look at the current text
+if (!inspectSelectors() && !inspectText(document.body ? document.body.innerText : '')) {
+  observer = new MutationObserver(records => {
+    for (const record of records) {
+      if (finished) return;
+      if (record.type === 'characterData') {
+        inspectText(textOf(record.target));
+        continue;
+      }
+      for (const node of record.addedNodes) {
+        if (inspectText(textOf(node))) return;
+      }
+    }
+    if (!finished) inspectSelectors();
+  });
+  observer.observe(document.documentElement, {childList: true, subtree: true, characterData: true});
+}
+"""
+
+
+def parse_count(text: str) -> Optional[int]:
+    """Ad count from a verdict text ('~200 个广告' -> 200), None if it has none"""
+    match = _COUNT.search(text or '')
+    return int(match.group(1).replace(',', '')) if match else None
+
+
+class VerdictHistogram:
+    """Time-to-verdict samples per state"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.samples: Dict[str, List[float]] = {}
+
+    def record(self, state: str, seconds: float):
+        self.samples.setdefault(state, []).append(seconds)
+
+    def lines(self) -> List[str]:
+        lines = []
+        for state, samples in sorted(self.samples.items(), key=lambda item: -len(item[1])):
+            ordered = sorted(samples)
+            p50 = ordered[len(ordered) // 2]
+            p90 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))]
+            counts = [sum(1 for s in samples if s <= bound) for bound in self.buckets]
+            cells = [f"≤{bound:g}s {count}" for bound, count in zip(self.buckets, counts)]
+            cells.append(f">{self.buckets[-1]:g}s {len(samples) - counts[-1]}")
+            lines.append(f"{state:<8} n={len(samples):<6} p50={p50:.2f}s p90={p90:.2f}s | " + ' | '.join(cells))
+        return lines
+
+
+class ReadinessDetector:
+    def __init__(self, timeout: float = 3.0, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.timeout = timeout
+        self.histogram = VerdictHistogram(buckets)
+
+    def load(self, driver, url: str) -> Verdict:
+        """Navigate to ``url`` and wait for the first terminal state"""
+        started = time.monotonic()
+        driver.get(url)
+        # The script answers by itself after ``timeout``; leave Selenium some slack
+        driver.set_script_timeout(self.timeout + 2)
+        result = driver.execute_async_script(_SCRIPT, int(self.timeout * 1000))
+        verdict = Verdict(result['state'], result['text'], time.monotonic() - started)
+        self.histogram.record(verdict.state, verdict.seconds)
+        return verdict
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Parallel chunked reader for the storeleads CSV export.
+
+The file is cut into byte ranges that start and end on record boundaries
+(quoted newlines inside ``description`` etc. are respected), each range is
+parsed in a worker process, and the typed, already-filtered rows come back
+as record batches. Filtering inside the workers is what makes this scale
+with the number of cores: only surviving rows are sent back to the parent.
+
+Several files (e.g. the shopify-storeleads-part*.csv chunks) are read in
+one call: chunks are planned across all of them and share one process
+pool, so small files still keep every core busy and the pool is started
+only once.
+
+Example:
+    def is_zhejiang(row):
+        return 'zhejiang' in (row['company_location'] or '').lower()
+
+    for batch in read_batches('shopify-storeleads.csv', where=is_zhejiang,
+                              columns=['domain', 'estimated_monthly_visits']):
+        for row in batch.as_dicts():
+            ...
+
+    for batch in read_batches(sorted(glob.glob('chunks/*.csv')), where=is_zhejiang):
+        print(batch.path, len(batch))
+
+``where`` must be a module-level function so it can be pickled.
+"""
+
+import csv
+import io
+import mmap
+import os
+from datetime import date
+from multiprocessing import Pool
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from csv_partitioner import parse_header
+
+DEFAULT_CHUNK_BYTES = 64 * 1024 * 1024
+MIN_CHUNK_BYTES = 1024 * 1024
+# Chunks per worker when the chunk size is derived from the input size
+CHUNKS_PER_WORKER = 4
+
+# All columns of the export, in file order (same list the importers use)
+STORE_COLUMNS = [
+    'domain', 'about_us_url', 'aliases', 'categories', 'city', 'company_location',
+    'contact_page_url', 'country_code', 'created', 'description', 'domain_url',
+    'emails', 'employee_count', 'estimated_monthly_visits', 'estimated_yearly_sales',
+    'facebook', 'facebook_url', 'instagram', 'instagram_url', 'language_code',
+    'linkedin_account', 'linkedin_url', 'merchant_name', 'meta_description',
+    'phones', 'pinterest', 'pinterest_url', 'plan', 'platform', 'platform_rank',
+    'rank', 'region', 'state', 'status', 'street_address', 'tiktok', 'tiktok_url',
+    'title', 'twitter', 'twitter_url', 'whatsapp_url', 'youtube', 'youtube_url', 'zip',
+]
+
+
+def to_int(value: str) -> Optional[int]:
+    """'12345' -> 12345; empty or invalid -> None"""
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def to_date(value: str) -> Optional[date]:
+    """'2024/01/31' (storeleads format) or '2024-01-31' -> date; otherwise None"""
+    value = value.strip()
+    if len(value) < 10:
+        return None
+    try:
+        return date(int(value[0:4]), int(value[5:7]), int(value[8:10]))
+    except ValueError:
+        return None
+
+
+def to_str(value: str) -> Optional[str]:
+    """Strip whitespace; empty -> None"""
+    value = value.strip()
+    return value or None
+
+
+# Typed columns; everything else goes through to_str
+DEFAULT_TYPES = {
+    'employee_count': to_int,
+    'estimated_monthly_visits': to_int,
+    'platform_rank': to_int,
+    'rank': to_int,
+    'created': to_date,
+}
+
+
+class RecordBatch:
+    """Rows parsed from one chunk of a file"""
+
+    def __init__(self, index: int, columns: List[str], rows: List[tuple], scanned: int, path: str = None):
+        self.index = index
+        self.path = path
+        self.columns = columns
+        self.rows = rows
+        self.scanned = scanned
+
+    def __len__(self):
+        return len(self.rows)
+
+    def as_dicts(self) -> Iterator[Dict]:
+        columns = self.columns
+        for row in self.rows:
+            yield dict(zip(columns, row))
+
+
+# ---------------------------------------------------------------------------
+# Chunk planning
+# ---------------------------------------------------------------------------
+
+def _count_quotes(args) -> int:
+    path, start, end = args
+    with open(path, 'rb') as f:
+        if end <= start:
+            return 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm[start:end].count(b'"')
+
+
+def _align(mm, offset: int, in_quotes: bool) -> int:
+    """First position after ``offset`` that starts a record.
+
+    ``in_quotes`` is the quote state at ``offset``. Walks newline by newline,
+    tracking quote parity, until a newline outside quotes is found.
+    """
+    size = len(mm)
+    pos = offset
+    while pos < size:
+        nl = mm.find(b'\n', pos)
+        if nl < 0:
+            return size
+        if mm[pos:nl].count(b'"') % 2:
+            in_quotes = not in_quotes
+        if not in_quotes:
+            return nl + 1
+        pos = nl + 1
+    return size
+
+
+def plan_chunks(path: str, chunk_bytes: int = DEFAULT_CHUNK_BYTES, pool: Optional[Pool] = None) -> Tuple[int, List[Tuple[int, int]]]:
+    """Split ``path`` into record-aligned byte ranges.
+
+    Returns (data_start, [(start, end), ...]) where data_start is the first
+    byte after the header. Quote parity at each raw cut is computed from
+    per-range quote counts (in parallel when a pool is given), which makes
+    the alignment exact even inside multi-line quoted fields.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header_end = len(f.readline())
+        # The header itself may span lines if a column name is quoted oddly
+        while _count_quotes((path, 0, header_end)) % 2:
+            line = f.readline()
+            if not line:
+                break
+            header_end += len(line)
+
+    cuts = list(range(header_end, size, chunk_bytes))[1:]
+    if not cuts:
+        return header_end, [(header_end, size)] if size > header_end else []
+
+    bounds = [header_end] + cuts + [size]
+    ranges = [(path, bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+    counts = pool.map(_count_quotes, ranges) if pool else [_count_quotes(r) for r in ranges]
+
+    starts = [header_end]
+    parity = 0
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for cut, count in zip(cuts, counts):
+            # counts[i] covers the bytes just before cuts[i]
+            parity ^= count & 1
+            aligned = _align(mm, cut, bool(parity))
+            if aligned > starts[-1]:
+                starts.append(aligned)
+
+    starts = [s for s in starts if s < size]
+    return header_end, [(s, e) for s, e in zip(starts, starts[1:] + [size])]
+
+
+# ---------------------------------------------------------------------------
+# Chunk parsing (runs in worker processes)
+# ---------------------------------------------------------------------------
+
+def _parse_chunk(args) -> RecordBatch:
+    index, path, start, end, header, columns, types, where = args
+
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    positions = [header.index(c) for c in columns]
+    width = len(header)
+    converters = [types.get(c, to_str) if types is not None else None for c in header]
+
+    rows = []
+    scanned = 0
+    for raw in csv.reader(io.StringIO(data.decode('utf-8'), newline='')):
+        if not raw:
+            continue
+        scanned += 1
+        if len(raw) < width:
+            raw += [''] * (width - len(raw))
+        if types is not None:
+            values = [conv(v) for conv, v in zip(converters, raw)]
+        else:
+            values = raw
+        if where is not None and not where(dict(zip(header, values))):
+            continue
+        rows.append(tuple(values[p] for p in positions))
+
+    return RecordBatch(index, columns, rows, scanned, path)
+
+
+def chunk_size(total_bytes: int, workers: int) -> int:
+    """About CHUNKS_PER_WORKER chunks per worker, within [MIN_CHUNK_BYTES, DEFAULT_CHUNK_BYTES]"""
+    return max(MIN_CHUNK_BYTES, min(DEFAULT_CHUNK_BYTES, total_bytes // (workers * CHUNKS_PER_WORKER)))
+
+
+def read_batches(paths: Union[str, Sequence[str]],
+                 columns: Optional[List[str]] = None,
+                 where: Optional[Callable[[Dict], bool]] = None,
+                 types: Optional[Dict[str, Callable]] = DEFAULT_TYPES,
+                 workers: Optional[int] = None,
+                 chunk_bytes: Optional[int] = None,
+                 ordered: bool = True,
+                 pool: Optional[Pool] = None) -> Iterator[RecordBatch]:
+    """Parse ``paths`` on all cores and yield one RecordBatch per chunk.
+
+    Args:
+        paths: one CSV file or a list of them; chunks of all files are
+            planned up front and share the pool
+        columns: columns to return (default: all, in file order)
+        where: row filter, evaluated in the workers on the typed row dict
+        types: column -> converter; None keeps raw strings unchanged
+        workers: process count (default: os.cpu_count())
+        chunk_bytes: target chunk size (default: derived from the total
+            input size so every worker gets several chunks)
+        ordered: yield batches in file order; False yields them as soon as
+            any worker finishes, which avoids waiting on a slow chunk
+        pool: reuse this process pool instead of starting one
+    """
+    paths = [paths] if isinstance(paths, (str, os.PathLike)) else list(paths)
+    workers = workers or os.cpu_count() or 1
+    chunk_bytes = chunk_bytes or chunk_size(sum(os.path.getsize(p) for p in paths), workers)
+
+    if pool is None:
+        with Pool(workers) as own_pool:
+            yield from read_batches(paths, columns, where, types, workers, chunk_bytes, ordered, own_pool)
+        return
+
+    tasks = []
+    for path in map(str, paths):
+        data_start, chunks = plan_chunks(path, chunk_bytes, pool)
+        with open(path, 'rb') as f:
+            header = parse_header(f.read(data_start))
+        file_columns = list(columns) if columns else header
+        missing = [c for c in file_columns if c not in header]
+        if missing:
+            raise KeyError(f"Columns not in header of {path}: {', '.join(missing)}")
+        tasks += [(len(tasks) + i, path, s, e, header, file_columns, types, where)
+                  for i, (s, e) in enumerate(chunks)]
+
+    results = pool.imap(_parse_chunk, tasks) if ordered else pool.imap_unordered(_parse_chunk, tasks)
+    for batch in results:
+        yield batch
+
+
+def read_rows(path: str, **kwargs) -> Iterator[Dict]:
+    """Convenience wrapper: ordered stream of row dicts"""
+    for batch in read_batches(path, **kwargs):
+        yield from batch.as_dicts()
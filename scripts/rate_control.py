@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Adaptive request pacing for the ads-transparency checkers.
+
+Every checker had its own fixed pacing: ``time.sleep(random.uniform(0.2,
+0.5))`` in production_optimized, 0.5 s in production_ads_checker and
+reliable_selenium_full, no pause at all in ultrafast_selenium, and
+``CONCURRENT_BROWSERS = 16`` checks in flight in reliable_batch_checker.
+None of them backed off when Google started answering with errors or
+the /sorry/ captcha page.
+
+RateController combines a token bucket with AIMD (additive increase,
+multiplicative decrease) adjustment:
+
+- ``acquire()`` / ``await acquire_async()`` waits for a token (request
+  rate) and a free slot (requests in flight); ``release(outcome)`` reports
+  how the request went: ok, error, timeout or captcha
+- a captcha, or more than ``max_bad_ratio`` bad outcomes among the last
+  ``window`` requests, halves the rate and the concurrency limit (the rate
+  is halved from the throughput actually observed, so a sequential
+  checker that is slower than its budget still slows down)
+- every ``window`` healthy requests in a row add ``rate_step`` req/s and
+  one slot, up to ``max_rate`` / ``max_concurrency``
+- each request costs 1 + a random 0..``jitter`` tokens, so the gaps
+  between requests vary instead of being exactly 1/rate apart (the fixed
+  pattern the old random sleeps were there to avoid)
+
+``max_rate`` is the polite request budget: the ADS_MAX_RATE environment
+variable (default 4 req/s). The controller never goes above it.
+
+Usage:
+    rate = RateController(max_concurrency=16)
+    await rate.acquire_async()
+    try:
+        result = await check(page, domain)
+    finally:
+        rate.release(classify(result['error'], page.url))
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+from typing import Optional
+
+OK = 'ok'
+ERROR = 'error'
+TIMEOUT = 'timeout'
+CAPTCHA = 'captcha'
+
+# Google sends rate-limited clients to www.google.com/sorry/... (reCAPTCHA)
+CAPTCHA_MARKERS = ('/sorry/', 'unusual traffic', '异常流量', 'captcha')
+
+_POLL_INTERVAL = 0.05
+
+
+def classify(error=None, url: str = '', text: str = '') -> str:
+    """Outcome of one check from its error (exception or message) and final URL / page text"""
+    page = f"{url} {text} {error or ''}".lower()
+    if any(marker in page for marker in CAPTCHA_MARKERS):
+        return CAPTCHA
+    if not error:
+        return OK
+    return TIMEOUT if 'timeout' in f"{type(error).__name__} {error}".lower() else ERROR
+
+
+def driver_outcome(driver, error=None) -> str:
+    """``classify`` for the check a Selenium driver just did (captcha = redirected to /sorry/)"""
+    try:
+        url = driver.current_url
+    except Exception:
+        # Driver crashed: the error already says so
+        url = ''
+    return classify(error, url)
+
+
+class RateController:
+    """Token bucket + concurrency limit, both adjusted by AIMD"""
+
+    def __init__(self, max_rate: Optional[float] = None, initial_rate: Optional[float] = None,
+                 min_rate: float = 0.2, rate_step: float = 0.25,
+                 max_concurrency: int = 1, initial_concurrency: Optional[int] = None, min_concurrency: int = 1,
+                 window: int = 20, max_bad_ratio: float = 0.2, decrease: float = 0.5, cooldown: float = 10.0,
+                 jitter: float = 0.5):
+        self.max_rate = max_rate or float(os.getenv('ADS_MAX_RATE', '4'))
+        self.min_rate = min(min_rate, self.max_rate)
+        self.rate = initial_rate or self.max_rate / 2
+        self.rate_step = rate_step
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min(min_concurrency, max_concurrency)
+        self.limit = initial_concurrency or max(self.min_concurrency, max_concurrency // 2)
+        self.window = window
+        self.max_bad_ratio = max_bad_ratio
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.jitter = jitter
+
+        self.active = 0
+        self.tokens = 1.0
+        self.outcomes = Counter()
+        self.increases = 0
+        self.decreases = 0
+        self.waited = 0.0
+        self._recent = deque(maxlen=window)   # (finished at, bad?) of the last requests
+        self._healthy = 0
+        self._refilled = time.monotonic()
+        self._last_decrease = float('-inf')
+        self._lock = threading.Lock()
+
+    def _try_acquire(self) -> float:
+        """Take a token and a slot; 0 on success, else seconds to wait before retrying"""
+        with self._lock:
+            now = time.monotonic()
+            burst = max(1, self.limit)
+            self.tokens = min(burst, self.tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+            if self.active >= self.limit:
+                return _POLL_INTERVAL
+            if self.tokens < 1:
+                return (1 - self.tokens) / self.rate
+            # The random extra cost delays the next token by up to jitter/rate seconds
+            self.tokens -= 1 + random.uniform(0, self.jitter)
+            self.active += 1
+            return 0
+
+    def acquire(self):
+        started = time.monotonic()
+        while True:
+            wait = self._try_acquire()
+            if not wait:
+                break
+            time.sleep(wait)
+        self.waited += time.monotonic() - started
+
+    async def acquire_async(self):
+        started = time.monotonic()
+        while True:
+            wait = self._try_acquire()
+            if not wait:
+                break
+            await asyncio.sleep(wait)
+        self.waited += time.monotonic() - started
+
+    def release(self, outcome: str = OK):
+        """Hand the slot back and feed the outcome into the AIMD adjustment"""
+        with self._lock:
+            now = time.monotonic()
+            self.active = max(0, self.active - 1)
+            self.outcomes[outcome] += 1
+            bad = outcome != OK
+            self._recent.append((now, bad))
+            bad_ratio = sum(b for _, b in self._recent) / len(self._recent)
+
+            if outcome == CAPTCHA or (len(self._recent) >= self.window and bad_ratio > self.max_bad_ratio):
+                if now - self._last_decrease >= self.cooldown:
+                    self._decrease(now, outcome)
+            elif bad:
+                self._healthy = 0
+            else:
+                self._healthy += 1
+                if self._healthy >= self.window and bad_ratio <= self.max_bad_ratio:
+                    self._increase()
+
+    def _observed_rate(self) -> Optional[float]:
+        if len(self._recent) < 2:
+            return None
+        elapsed = self._recent[-1][0] - self._recent[0][0]
+        return (len(self._recent) - 1) / elapsed if elapsed > 0 else None
+
+    def _decrease(self, now: float, outcome: str):
+        observed = self._observed_rate()
+        base = min(self.rate, observed) if observed else self.rate
+        self.rate = max(self.min_rate, base * self.decrease)
+        self.limit = max(self.min_concurrency, int(self.limit * self.decrease))
+        # Empty bucket: the next request waits a full interval at the new rate
+        self.tokens = 0.0
+        self._recent.clear()
+        self._healthy = 0
+        self._last_decrease = now
+        self.decreases += 1
+        print(f"  🐢 rate control ({outcome}): {self.rate:.2f} req/s, {self.limit} in flight", flush=True)
+
+    def _increase(self):
+        self.rate = min(self.max_rate, self.rate + self.rate_step)
+        self.limit = min(self.max_concurrency, self.limit + 1)
+        self._healthy = 0
+        self.increases += 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                'rate': self.rate,
+                'limit': self.limit,
+                'active': self.active,
+                'increases': self.increases,
+                'decreases': self.decreases,
+                'waited_s': self.waited,
+                'outcomes': dict(self.outcomes),
+            }
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Context-level request blocking for the Playwright checkers.
+
+ReliableBatchChecker used to call ``page.route("**/*", ...)`` at the start
+of every check. On a reused page those handlers pile up, and every
+request then walks through all of them. ResourcePolicy installs a
+single route handler per browser context, when the context is created,
+and decides per request:
+
+- blocked if its resource type is in ``blocked_types`` (default: image,
+  media, font, stylesheet) or its URL matches a ``blocked_urls`` glob
+- ``allowed_urls`` globs always pass (e.g. a stylesheet the page needs)
+
+Blocked requests are counted per domain being checked. The checker calls
+``begin(page, domain)`` before navigating and ``finish(page)`` after. A
+blocked response is never downloaded, so its size is unknown: bytes saved
+is an estimate from typical transfer sizes per resource type
+(TYPICAL_BYTES).
+
+Usage:
+    policy = ResourcePolicy()
+    context = await browser.new_context(...)
+    await policy.install(context)
+    ...
+    policy.begin(page, domain)
+    await page.goto(url)
+    stats = policy.finish(page)   # {'blocked': 12, 'bytes_saved': 310000, 'by_type': {...}}
+"""
+
+import re
+from collections import Counter
+from fnmatch import translate
+from typing import Dict, Iterable, Optional
+
+DEFAULT_BLOCKED_TYPES = ('image', 'media', 'font', 'stylesheet')
+
+# Typical transfer size per blocked request (bytes), used for the estimate
+TYPICAL_BYTES = {
+    'image': 25_000,
+    'media': 300_000,
+    'font': 35_000,
+    'stylesheet': 15_000,
+    'script': 30_000,
+    'other': 5_000,
+}
+
+
+def _compile(patterns: Iterable[str]) -> Optional['re.Pattern']:
+    patterns = list(patterns)
+    if not patterns:
+        return None
+    return re.compile('|'.join(translate(p) for p in patterns))
+
+
+class ResourcePolicy:
+    """One route handler per context; per-domain blocked-request counts"""
+
+    def __init__(self, blocked_types: Iterable[str] = DEFAULT_BLOCKED_TYPES,
+                 blocked_urls: Iterable[str] = (), allowed_urls: Iterable[str] = ()):
+        self.blocked_types = frozenset(blocked_types)
+        self.blocked_urls = _compile(blocked_urls)
+        self.allowed_urls = _compile(allowed_urls)
+        self._counts: Dict[object, Counter] = {}
+        self.total = Counter()
+
+    def should_block(self, resource_type: str, url: str) -> bool:
+        if self.allowed_urls is not None and self.allowed_urls.match(url):
+            return False
+        if resource_type in self.blocked_types:
+            return True
+        return self.blocked_urls is not None and bool(self.blocked_urls.match(url))
+
+    async def install(self, context):
+        """Install the policy on a browser context (once, before any page is opened)"""
+        await context.route('**/*', self._handle)
+
+    async def _handle(self, route):
+        request = route.request
+        if not self.should_block(request.resource_type, request.url):
+            await route.continue_()
+            return
+        await route.abort()
+        self.total[request.resource_type] += 1
+        try:
+            page = request.frame.page
+        except Exception:
+            # Service worker requests have no frame
+            return
+        counts = self._counts.get(page)
+        if counts is not None:
+            counts[request.resource_type] += 1
+
+    def begin(self, page, domain: str):
+        """Start counting blocked requests of ``page`` for ``domain``"""
+        self._counts[page] = Counter()
+
+    def finish(self, page) -> dict:
+        """Stop counting for ``page``; blocked count and estimated bytes saved"""
+        counts = self._counts.pop(page, Counter())
+        return self._summary(counts)
+
+    @staticmethod
+    def _summary(counts: Counter) -> dict:
+        return {
+            'blocked': sum(counts.values()),
+            'bytes_saved': sum(TYPICAL_BYTES.get(t, TYPICAL_BYTES['other']) * n for t, n in counts.items()),
+            'by_type': dict(counts),
+        }
+
+    def totals(self) -> dict:
+        """Totals over every context the policy is installed on"""
+        return self._summary(self.total)
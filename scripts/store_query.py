@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Filter-expression engine over the columnar storeleads cache.
+
+Replaces the chains of ``df = df[mask].copy()`` in the regional lead-list
+scripts. Predicates are collected first and then executed as a single
+fused plan over the memory-mapped Arrow columns:
+
+- the first predicate is evaluated over its full column(s), every later
+  one only over the surviving row positions (no frame copies, untouched
+  columns are never read);
+- predicates run in order of cost / (1 - selectivity), with selectivity
+  estimated from per-column statistics (dictionary value counts, visit
+  quantiles, per-year counts), so cheap and selective filters such as
+  ``country_code = 'CN'`` go before substring searches.
+
+Example:
+    query = (StoreQuery('shopify-storeleads.csv')
+             .country('CN')
+             .location_contains('Hangzhou', '杭州')
+             .visits_between(20000, 200000)
+             .tld('.com')
+             .normal_domain())
+    df = query.to_frame()
+    query.explain()
+"""
+
+import json
+import time
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from columnar_cache import CATEGORICAL_COLUMNS, DATE_COLUMNS, INT_COLUMNS, cache_paths, ensure_cache, load_frame, load_table
+from domain_features import FEATURE_COLUMNS, load_domain_features
+
+STATS_SUFFIX = '.arrow.stats.json'
+QUANTILES = 100
+
+# Relative per-row cost of each predicate kind
+COST_DICTIONARY = 1
+COST_NUMERIC = 1
+COST_SUFFIX = 3
+COST_DOMAIN_QUALITY = 2
+COST_CONTAINS = 10
+
+# Selectivity guess when statistics cannot tell
+DEFAULT_SELECTIVITY = 0.5
+CONTAINS_SELECTIVITY = 0.05
+
+
+# ---------------------------------------------------------------------------
+# Column statistics
+# ---------------------------------------------------------------------------
+
+def _stats_path(csv_path) -> Path:
+    cache_file, _ = cache_paths(csv_path)
+    return Path(str(cache_file)[:-len('.arrow')] + STATS_SUFFIX)
+
+
+def _compute_stats(table: pa.Table) -> dict:
+    stats = {'rows': table.num_rows, 'columns': {}}
+    for name in table.column_names:
+        column = table.column(name)
+        entry = {'nulls': column.null_count}
+        if name in CATEGORICAL_COLUMNS:
+            counts = pc.value_counts(column.cast(pa.string()))
+            entry['values'] = {
+                v.as_py(): c.as_py()
+                for v, c in zip(counts.field('values'), counts.field('counts'))
+                if v.is_valid
+            }
+        elif name in INT_COLUMNS and column.null_count < len(column):
+            q = pc.quantile(column, q=[i / QUANTILES for i in range(QUANTILES + 1)],
+                            interpolation='lower', skip_nulls=True)
+            entry['quantiles'] = q.to_pylist()
+        elif name in DATE_COLUMNS and column.null_count < len(column):
+            counts = pc.value_counts(pc.year(column))
+            entry['years'] = {
+                str(v.as_py()): c.as_py()
+                for v, c in zip(counts.field('values'), counts.field('counts'))
+                if v.is_valid
+            }
+        stats['columns'][name] = entry
+    return stats
+
+
+def column_stats(csv_path) -> dict:
+    """Per-column statistics of the cache, computed once and stored beside it"""
+    _, meta_file = cache_paths(csv_path)
+    ensure_cache(csv_path)
+    source_hash = json.loads(meta_file.read_text()).get('sha256')
+
+    path = _stats_path(csv_path)
+    if path.exists():
+        stats = json.loads(path.read_text())
+        if stats.get('sha256') == source_hash:
+            return stats
+
+    stats = _compute_stats(load_table(csv_path))
+    stats['sha256'] = source_hash
+    path.write_text(json.dumps(stats, ensure_ascii=False))
+    return stats
+
+
+# ---------------------------------------------------------------------------
+# Predicates
+# ---------------------------------------------------------------------------
+
+class Predicate:
+    """A vectorized row filter over one or more cache columns"""
+
+    columns: List[str] = []
+    cost = COST_NUMERIC
+    label = ''
+
+    def selectivity(self, stats: dict) -> float:
+        return DEFAULT_SELECTIVITY
+
+    def evaluate(self, data: Dict[str, pa.ChunkedArray]) -> pa.ChunkedArray:
+        raise NotImplementedError
+
+    def rank(self, stats: dict) -> float:
+        # Classic predicate ordering: cheap and selective first
+        return self.cost / max(1e-6, 1 - self.selectivity(stats))
+
+
+def _non_null_fraction(stats: dict, column: str) -> float:
+    rows = stats['rows'] or 1
+    return 1 - stats['columns'].get(column, {}).get('nulls', 0) / rows
+
+
+class ValueIn(Predicate):
+    cost = COST_DICTIONARY
+
+    def __init__(self, column: str, values):
+        self.columns = [column]
+        self.values = list(values)
+        self.label = f"{column} IN ({', '.join(self.values)})"
+
+    def selectivity(self, stats):
+        counts = stats['columns'].get(self.columns[0], {}).get('values')
+        if counts is None:
+            return DEFAULT_SELECTIVITY
+        return sum(counts.get(v, 0) for v in self.values) / (stats['rows'] or 1)
+
+    def evaluate(self, data):
+        column = data[self.columns[0]]
+        if pa.types.is_dictionary(column.type):
+            column = column.cast(pa.string())
+        return pc.fill_null(pc.is_in(column, value_set=pa.array(self.values)), False)
+
+
+class Between(Predicate):
+    cost = COST_NUMERIC
+
+    def __init__(self, column: str, low=None, high=None):
+        self.columns = [column]
+        self.low = low
+        self.high = high
+        self.label = f"{low if low is not None else '-inf'} <= {column} <= {high if high is not None else 'inf'}"
+
+    def selectivity(self, stats):
+        quantiles = stats['columns'].get(self.columns[0], {}).get('quantiles')
+        if not quantiles:
+            return DEFAULT_SELECTIVITY
+        inside = sum(1 for q in quantiles
+                     if (self.low is None or q >= self.low) and (self.high is None or q <= self.high))
+        return inside / len(quantiles) * _non_null_fraction(stats, self.columns[0])
+
+    def evaluate(self, data):
+        column = data[self.columns[0]]
+        mask = pc.is_valid(column)
+        if self.low is not None:
+            mask = pc.and_(mask, pc.greater_equal(column, self.low))
+        if self.high is not None:
+            mask = pc.and_(mask, pc.less_equal(column, self.high))
+        return pc.fill_null(mask, False)
+
+
+class CreatedYear(Predicate):
+    cost = COST_NUMERIC
+
+    def __init__(self, first: int, last: Optional[int] = None):
+        self.columns = ['created']
+        self.first = first
+        self.last = last if last is not None else first
+        self.label = f"year(created) IN {self.first}..{self.last}"
+
+    def selectivity(self, stats):
+        years = stats['columns'].get('created', {}).get('years')
+        if years is None:
+            return DEFAULT_SELECTIVITY
+        return sum(c for y, c in years.items() if self.first <= int(y) <= self.last) / (stats['rows'] or 1)
+
+    def evaluate(self, data):
+        column = data['created']
+        low = pa.scalar(date(self.first, 1, 1), pa.date32())
+        high = pa.scalar(date(self.last + 1, 1, 1), pa.date32())
+        return pc.fill_null(pc.and_(pc.greater_equal(column, low), pc.less(column, high)), False)
+
+
+class Contains(Predicate):
+    """Case-insensitive substring match of any term in any of the columns"""
+
+    cost = COST_CONTAINS
+
+    def __init__(self, columns: List[str], terms):
+        self.columns = list(columns)
+        self.terms = list(terms)
+        self.label = f"{' | '.join(self.columns)} CONTAINS {' | '.join(self.terms)}"
+
+    def selectivity(self, stats):
+        return CONTAINS_SELECTIVITY * max(_non_null_fraction(stats, c) for c in self.columns)
+
+    def evaluate(self, data):
+        mask = None
+        for name in self.columns:
+            for term in self.terms:
+                hit = pc.match_substring(data[name], term, ignore_case=True)
+                mask = hit if mask is None else pc.or_(mask, hit)
+        return pc.fill_null(mask, False)
+
+
+class EndsWith(Predicate):
+    cost = COST_SUFFIX
+
+    def __init__(self, column: str, suffixes):
+        self.columns = [column]
+        self.suffixes = list(suffixes)
+        self.label = f"{column} ENDS WITH {' | '.join(self.suffixes)}"
+
+    def evaluate(self, data):
+        mask = None
+        for suffix in self.suffixes:
+            hit = pc.ends_with(data[self.columns[0]], suffix)
+            mask = hit if mask is None else pc.or_(mask, hit)
+        return pc.fill_null(mask, False)
+
+
+class NormalDomain(Predicate):
+    """is_normal_domain() from the Hangzhou analyses, on the persisted
+    domain features: 3-30 chars without www./.com, at most 2 hyphens,
+    at most half digits"""
+
+    cost = COST_DOMAIN_QUALITY
+    label = 'is_normal_domain(domain)'
+
+    def __init__(self):
+        self.columns = ['domain_core_length', 'domain_hyphens', 'domain_digits']
+
+    def selectivity(self, stats):
+        return 0.8
+
+    def evaluate(self, data):
+        length = data['domain_core_length']
+        mask = pc.and_(pc.greater_equal(length, 3), pc.less_equal(length, 30))
+        mask = pc.and_(mask, pc.less_equal(data['domain_hyphens'], 2))
+        mask = pc.and_(mask, pc.less_equal(pc.multiply(data['domain_digits'], 2), length))
+        return pc.fill_null(mask, False)
+
+
+# ---------------------------------------------------------------------------
+# Query
+# ---------------------------------------------------------------------------
+
+class StoreQuery:
+    """Fluent builder + executor for fused filters over the columnar cache"""
+
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        self.predicates: List[Predicate] = []
+        self.plan: List[dict] = []
+        self._indices = None
+
+    def where(self, predicate: Predicate) -> 'StoreQuery':
+        self.predicates.append(predicate)
+        self._indices = None
+        return self
+
+    def country(self, *codes: str) -> 'StoreQuery':
+        return self.where(ValueIn('country_code', [c.upper() for c in codes]))
+
+    def status(self, *values: str) -> 'StoreQuery':
+        return self.where(ValueIn('status', values))
+
+    def location_contains(self, *terms: str) -> 'StoreQuery':
+        """city OR company_location contains any term (case-insensitive)"""
+        return self.where(Contains(['city', 'company_location'], terms))
+
+    def contains(self, columns, *terms: str) -> 'StoreQuery':
+        columns = [columns] if isinstance(columns, str) else list(columns)
+        return self.where(Contains(columns, terms))
+
+    def visits_between(self, low=None, high=None) -> 'StoreQuery':
+        return self.where(Between('estimated_monthly_visits', low, high))
+
+    def tld(self, *suffixes: str) -> 'StoreQuery':
+        return self.where(EndsWith('domain', suffixes))
+
+    def normal_domain(self) -> 'StoreQuery':
+        return self.where(NormalDomain())
+
+    def created_year(self, first: int, last: Optional[int] = None) -> 'StoreQuery':
+        return self.where(CreatedYear(first, last))
+
+    def row_indices(self) -> pa.Array:
+        """Positions of the matching rows in the export"""
+        if self._indices is not None:
+            return self._indices
+
+        stats = column_stats(self.csv_path)
+        ordered = sorted(self.predicates, key=lambda p: p.rank(stats))
+        needed = list(dict.fromkeys(c for p in ordered for c in p.columns))
+        # Domain features live in their own file beside the cache
+        features = [c for c in needed if c in FEATURE_COLUMNS]
+        base = [c for c in needed if c not in FEATURE_COLUMNS]
+        if not features:
+            table = load_table(self.csv_path, columns=base)
+        elif not base:
+            table = load_domain_features(self.csv_path, columns=features)
+        else:
+            table = load_table(self.csv_path, columns=base)
+            feature_table = load_domain_features(self.csv_path, columns=features)
+            for name in features:
+                table = table.append_column(name, feature_table.column(name))
+
+        indices = None
+        self.plan = []
+        for predicate in ordered:
+            start = time.time()
+            if indices is None:
+                data = {c: table.column(c) for c in predicate.columns}
+            else:
+                data = {c: table.column(c).take(indices) for c in predicate.columns}
+            mask = predicate.evaluate(data)
+            if indices is None:
+                indices = pc.indices_nonzero(mask)
+            else:
+                indices = pc.filter(indices, mask)
+            self.plan.append({
+                'predicate': predicate.label,
+                'estimated_selectivity': predicate.selectivity(stats),
+                'rows_out': len(indices),
+                'seconds': time.time() - start,
+            })
+
+        if indices is None:
+            indices = pa.array(range(table.num_rows), type=pa.uint64())
+        self._indices = indices
+        return indices
+
+    def count(self) -> int:
+        return len(self.row_indices())
+
+    def to_frame(self, columns: Optional[List[str]] = None):
+        """Matching rows as a DataFrame indexed by export row position"""
+        return load_frame(self.csv_path, columns=columns, rows=self.row_indices().to_pylist())
+
+    def explain(self):
+        """Print the executed plan with the row count after each step"""
+        if not self.plan:
+            self.row_indices()
+        print("Query plan (cheapest / most selective first):")
+        for i, step in enumerate(self.plan, 1):
+            print(f"  {i}. {step['predicate']:<55} est {step['estimated_selectivity']:6.1%}  "
+                  f"-> {step['rows_out']:>9,} rows  ({step['seconds']*1000:.0f}ms)")
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Streaming work lists over ``stores``, highest traffic first.
+
+The checkers loaded their whole work list up front (``fetchall()`` of
+200k+ domains before the first check), and analyze-stores.py walked it
+with LIMIT/OFFSET, which re-scans every skipped row and skips rows once
+earlier ones leave the filter (e.g. 'pending' -> 'completed').
+
+WorkList pages with a keyset instead: rows are ordered by
+``(COALESCE(estimated_monthly_visits, -1), id) DESC`` (= visits DESC
+NULLS LAST, id as tie-breaker) and each page starts strictly after the
+last key seen. Every page is one short index range scan
+(work-list-schema.sql), memory holds one page, and rows that stop
+matching the filter while the crawl runs shift nothing.
+
+Keyset pages rather than a named server-side cursor: the checkers commit
+results on their own connection while iterating (a commit closes a
+non-holdable cursor), and the Neon pooler endpoint runs PgBouncer in
+transaction mode, where cursors cannot outlive a transaction. Each page
+is one short read transaction on a connection checked out from
+``connection`` (default: db_config.pooled_connection) and handed back
+right away, so a crawl that spends half an hour on one page never holds
+a session or a snapshot open.
+
+Usage:
+    work = WorkList("customer_type IS NULL")
+    print(work.count())
+    for domain in work:
+        ...
+"""
+
+from typing import Callable, ContextManager, Iterator, List, Optional, Sequence
+
+from db_config import pooled_connection
+
+SORT_KEY = 'COALESCE(estimated_monthly_visits, -1)'
+DEFAULT_PAGE_SIZE = 500
+
+
+class WorkList:
+    """Lazily paged ``SELECT columns FROM stores WHERE ...`` in traffic order.
+
+    Iterating yields one value per row when a single column is selected,
+    tuples otherwise; ``pages()`` yields lists of those.
+    """
+
+    def __init__(self, where: str = 'TRUE', params: Sequence = (), columns: Sequence[str] = ('domain',),
+                 page_size: int = DEFAULT_PAGE_SIZE, limit: Optional[int] = None,
+                 connection: Callable[[], ContextManager] = pooled_connection):
+        self.connection = connection
+        self.where = where
+        self.params = tuple(params)
+        self.columns = list(columns)
+        self.page_size = page_size
+        self.limit = limit
+
+    def _query(self, sql: str, params: Sequence) -> List[tuple]:
+        with self.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+            cur.close()
+            # End the read transaction: no snapshot is held between pages
+            conn.rollback()
+            return rows
+
+    def count(self) -> int:
+        """Rows currently matching (capped at ``limit``), for progress output"""
+        total = self._query(f"SELECT COUNT(*) FROM stores WHERE ({self.where})", self.params)[0][0]
+        return total if self.limit is None else min(total, self.limit)
+
+    def pages(self) -> Iterator[List]:
+        after = None
+        remaining = self.limit
+        while remaining is None or remaining > 0:
+            size = self.page_size if remaining is None else min(self.page_size, remaining)
+            sql = f"SELECT {', '.join(self.columns)}, {SORT_KEY}, id FROM stores WHERE ({self.where})"
+            params = self.params
+            if after is not None:
+                sql += f" AND ({SORT_KEY}, id) < (%s, %s)"
+                params = params + after
+            sql += f" ORDER BY {SORT_KEY} DESC, id DESC LIMIT %s"
+            rows = self._query(sql, params + (size,))
+            if not rows:
+                return
+            after = tuple(rows[-1][-2:])
+            if remaining is not None:
+                remaining -= len(rows)
+            if len(self.columns) == 1:
+                yield [row[0] for row in rows]
+            else:
+                yield [tuple(row[:-2]) for row in rows]
+            if len(rows) < size:
+                return
+
+    def __iter__(self):
+        for page in self.pages():
+            yield from page
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Lease-based work queue for ad checks, shared by checkers on several hosts.
+
+The queue is a Postgres table (ad-check-queue-schema.sql) next to
+``stores``. A worker claims a batch with ``FOR UPDATE SKIP LOCKED``, so
+concurrent claims never block each other or return the same domain, and
+stamps each row with a lease: owner (host:pid) and expiry.
+
+- a heartbeat thread extends the worker's leases every ``ttl / 3`` seconds
+- ``complete`` marks domains done, only while the caller still owns the
+  lease; pass the checker's connection to commit it together with the
+  result UPDATE
+- ``fail`` keeps the lease of a domain whose check failed (error / captcha
+  page), so this worker does not pick it up again; ``stop`` hands it back
+  with the attempt counted, and lease expiry does the same
+- leases that expire (worker crashed or hung) are claimable again;
+  ``reclaim`` also resets them explicitly and gives up on domains that
+  used up ``max_attempts``
+- ``release`` hands unfinished leases back on a clean shutdown; only the
+  failed ones keep their attempt
+
+Every queue statement runs on its own short autocommit connection, so
+holding a lease never holds a transaction open.
+
+Usage:
+    python3 scripts/work_queue.py enqueue [--where SQL] [--reset]
+    python3 scripts/work_queue.py status
+    python3 scripts/work_queue.py reclaim
+    python3 scripts/work_queue.py selftest   # claim / SKIP LOCKED / expiry / reclaim
+
+    queue = WorkQueue(connect)
+    with queue.heartbeat():
+        for domain in queue.domains(batch_size=20):
+            ...
+            queue.complete([domain])
+
+Uses DATABASE_URL, so it can be tried against a local Postgres:
+``selftest`` runs two workers against a scratch copy of the queue table
+(dropped afterwards) and checks that their claims never overlap, that
+expired leases are claimable again and that reclaim fails domains out of
+attempts. For an end-to-end run, ``enqueue`` a few domains and start two
+``production_optimized.py --queue --limit=20`` with the same DATABASE_URL
+side by side.
+"""
+
+import os
+import socket
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Sequence
+
+DEFAULT_TTL = 300
+DEFAULT_MAX_ATTEMPTS = 3
+QUEUE_TABLE = 'ad_check_queue'
+SCHEMA_FILE = Path(__file__).parent.parent / 'ad-check-queue-schema.sql'
+
+
+def default_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue:
+    def __init__(self, connect: Callable, owner: Optional[str] = None, ttl: int = DEFAULT_TTL,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, table: str = QUEUE_TABLE):
+        self.connect = connect
+        self.table = table
+        self.owner = owner or default_owner()
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+        self.leases_lost = 0
+        self.failed = set()
+
+    def _execute(self, sql: str, params: Sequence = (), conn=None) -> List[tuple]:
+        """Run one statement; own autocommit connection unless ``conn`` is given"""
+        own = conn is None
+        if own:
+            conn = self.connect()
+            conn.autocommit = True
+        try:
+            cur = conn.cursor()
+            cur.execute(sql, params or None)
+            # Row-returning statements give their rows, others [(rowcount,)]
+            result = cur.fetchall() if cur.description else [(cur.rowcount,)]
+            cur.close()
+            return result
+        finally:
+            if own:
+                conn.close()
+
+    def ensure_schema(self):
+        self._execute(SCHEMA_FILE.read_text())
+
+    def enqueue(self, where: str = 'TRUE', params: Sequence = (), reset: bool = False) -> int:
+        """Add matching stores to the queue (priority = monthly visits).
+
+        ``reset`` puts domains that are already done / failed back to
+        pending (re-check); domains currently leased are left alone.
+        """
+        conflict = "DO NOTHING"
+        if reset:
+            conflict = f"""DO UPDATE SET status = 'pending', attempts = 0, lease_owner = NULL,
+                    lease_expires_at = NULL, finished_at = NULL, priority = EXCLUDED.priority
+                WHERE {self.table}.status <> 'leased'"""
+        return self._execute(f"""
+            INSERT INTO {self.table} (domain, priority)
+            SELECT domain, COALESCE(estimated_monthly_visits, -1)
+            FROM stores
+            WHERE ({where})
+            ON CONFLICT (domain) {conflict}
+        """, params)[0][0]
+
+    def claim(self, batch_size: int) -> List[str]:
+        """Lease up to ``batch_size`` domains, highest priority first"""
+        rows = self._execute(f"""
+            WITH batch AS (
+                SELECT domain
+                FROM {self.table}
+                WHERE status IN ('pending', 'leased')
+                  AND (status = 'pending' OR lease_expires_at < NOW())
+                  AND attempts < %s
+                ORDER BY priority DESC, domain
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE {self.table} AS q
+            SET status = 'leased',
+                lease_owner = %s,
+                lease_expires_at = NOW() + %s * INTERVAL '1 second',
+                attempts = q.attempts + 1
+            FROM batch
+            WHERE q.domain = batch.domain
+            RETURNING q.domain, q.priority
+        """, (self.max_attempts, batch_size, self.owner, self.ttl))
+        # RETURNING does not keep the CTE order
+        return [domain for domain, _ in sorted(rows, key=lambda r: (-r[1], r[0]))]
+
+    def renew(self) -> int:
+        """Extend every lease this worker holds; returns how many"""
+        return self._execute(f"""
+            UPDATE {self.table}
+            SET lease_expires_at = NOW() + %s * INTERVAL '1 second'
+            WHERE lease_owner = %s AND status = 'leased'
+        """, (self.ttl, self.owner))[0][0]
+
+    def complete(self, domains: Sequence[str], conn=None) -> int:
+        """Mark domains done if still leased by this worker; returns how many.
+
+        With ``conn`` the update joins the caller's transaction (commit it
+        together with the results).
+        """
+        if not domains:
+            return 0
+        done = self._execute(f"""
+            UPDATE {self.table}
+            SET status = 'done', finished_at = NOW(), lease_owner = NULL, lease_expires_at = NULL
+            WHERE domain = ANY(%s) AND lease_owner = %s AND status = 'leased'
+        """, (list(domains), self.owner), conn)[0][0]
+        self.leases_lost += len(set(domains)) - done
+        return done
+
+    def fail(self, domains: Sequence[str]):
+        """Keep the leases of domains whose check failed; ``stop`` returns them
+        to the queue with the attempt counted (or as failed once out of attempts)
+        """
+        self.failed.update(domains)
+
+    def release(self) -> int:
+        """Give this worker's unfinished leases back (clean shutdown).
+
+        Domains that were never checked get their attempt back; ``fail``ed
+        ones keep it, so a domain that keeps failing ends up 'failed'.
+        """
+        failed = list(self.failed)
+        released = self._execute(f"""
+            UPDATE {self.table}
+            SET status = CASE WHEN domain = ANY(%s) AND attempts >= %s THEN 'failed' ELSE 'pending' END,
+                finished_at = CASE WHEN domain = ANY(%s) AND attempts >= %s THEN NOW() END,
+                lease_owner = NULL, lease_expires_at = NULL,
+                attempts = CASE WHEN domain = ANY(%s) THEN attempts ELSE GREATEST(attempts - 1, 0) END
+            WHERE lease_owner = %s AND status = 'leased'
+        """, (failed, self.max_attempts, failed, self.max_attempts, failed, self.owner))[0][0]
+        self.failed.clear()
+        return released
+
+    def reclaim(self) -> dict:
+        """Reset expired leases; domains out of attempts become failed"""
+        failed = self._execute(f"""
+            UPDATE {self.table}
+            SET status = 'failed', finished_at = NOW(), lease_owner = NULL, lease_expires_at = NULL
+            WHERE status = 'leased' AND lease_expires_at < NOW() AND attempts >= %s
+        """, (self.max_attempts,))[0][0]
+        reclaimed = self._execute(f"""
+            UPDATE {self.table}
+            SET status = 'pending', lease_owner = NULL, lease_expires_at = NULL
+            WHERE status = 'leased' AND lease_expires_at < NOW()
+        """)[0][0]
+        return {'reclaimed': reclaimed, 'failed': failed}
+
+    def status(self) -> dict:
+        rows = self._execute(f"""
+            SELECT status, COUNT(*), COUNT(*) FILTER (WHERE lease_expires_at < NOW())
+            FROM {self.table}
+            GROUP BY status
+        """)
+        result = {status: count for status, count, _ in rows}
+        result['expired'] = sum(expired for status, _, expired in rows if status == 'leased')
+        return result
+
+    def owners(self) -> List[tuple]:
+        return self._execute(f"""
+            SELECT lease_owner, COUNT(*), MAX(lease_expires_at)
+            FROM {self.table}
+            WHERE status = 'leased'
+            GROUP BY lease_owner
+            ORDER BY lease_owner
+        """)
+
+    def domains(self, batch_size: int = 20) -> Iterator[str]:
+        """Claim batches until the queue is empty, yielding domains"""
+        while True:
+            batch = self.claim(batch_size)
+            if not batch:
+                return
+            yield from batch
+
+    def start_heartbeat(self, interval: Optional[float] = None):
+        """Renew this worker's leases every ``interval`` (default ttl / 3) seconds"""
+        self._stop = threading.Event()
+        interval = interval or self.ttl / 3
+
+        def beat():
+            while not self._stop.wait(interval):
+                try:
+                    self.renew()
+                except Exception as e:
+                    print(f"  ⚠️  lease heartbeat failed: {e}", flush=True)
+
+        self._heartbeat = threading.Thread(target=beat, name='lease-heartbeat', daemon=True)
+        self._heartbeat.start()
+
+    def stop(self):
+        """Stop the heartbeat and release unfinished leases (after the results are flushed)"""
+        heartbeat = getattr(self, '_heartbeat', None)
+        if heartbeat is None:
+            return
+        self._stop.set()
+        heartbeat.join()
+        self._heartbeat = None
+        released = self.release()
+        if released:
+            print(f"  ↩️  released {released} unfinished leases", flush=True)
+
+    @contextmanager
+    def heartbeat(self, interval: Optional[float] = None):
+        self.start_heartbeat(interval)
+        try:
+            yield self
+        finally:
+            self.stop()
+
+
+def selftest(connect: Callable, domains: int = 200, ttl: int = 2):
+    """Exercise claim / SKIP LOCKED / expiry / reclaim on a scratch copy of the queue table"""
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    table = f"{QUEUE_TABLE}_selftest"
+    setup = WorkQueue(connect, table=table)
+    setup.ensure_schema()
+    setup._execute(f"DROP TABLE IF EXISTS {table}")
+    setup._execute(f"CREATE TABLE {table} (LIKE {QUEUE_TABLE} INCLUDING ALL)")
+    try:
+        setup._execute(f"""
+            INSERT INTO {table} (domain, priority)
+            SELECT 'selftest-' || i || '.invalid', i FROM generate_series(1, %s) AS i
+        """, (domains,))
+
+        # Two workers claiming small batches concurrently: disjoint, nothing missed
+        a = WorkQueue(connect, owner='selftest-a', ttl=ttl, table=table)
+        b = WorkQueue(connect, owner='selftest-b', ttl=ttl, table=table)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            claimed_a, claimed_b = executor.map(lambda q: list(q.domains(batch_size=7)), (a, b))
+        overlap = set(claimed_a) & set(claimed_b)
+        assert not overlap, f"both workers claimed {sorted(overlap)[:5]}"
+        assert len(claimed_a) + len(claimed_b) == domains, \
+            f"claimed {len(claimed_a) + len(claimed_b)} of {domains}"
+        print(f"✓ claim: {len(claimed_a)} + {len(claimed_b)} domains, no overlap (SKIP LOCKED)")
+
+        # a finishes its domains, b stalls: its leases expire and a takes them over
+        assert a.complete(claimed_a) == len(claimed_a)
+        assert a.claim(domains) == [], "unexpired leases were claimable"
+        time.sleep(ttl + 1)
+        assert a.status()['expired'] == len(claimed_b)
+        taken = a.claim(domains)
+        assert sorted(taken) == sorted(claimed_b), "expired leases were not claimable"
+        assert b.complete(claimed_b) == 0 and b.leases_lost == len(claimed_b), "stale owner completed a lease"
+        print(f"✓ expiry: {len(taken)} expired leases re-claimed, stale owner could not complete them")
+
+        # Second attempt expires too: reclaim gives up on domains out of attempts
+        time.sleep(ttl + 1)
+        result = WorkQueue(connect, max_attempts=2, table=table).reclaim()
+        assert result == {'reclaimed': 0, 'failed': len(claimed_b)}, result
+        status = a.status()
+        assert status.get('done') == len(claimed_a) and status.get('failed') == len(claimed_b), status
+        print(f"✓ reclaim: {result['failed']} domains out of attempts marked failed")
+    finally:
+        setup._execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def main():
+    import argparse
+    import psycopg2
+
+    parser = argparse.ArgumentParser(description='Shared ad-check work queue')
+    parser.add_argument('command', choices=['init', 'enqueue', 'status', 'reclaim', 'selftest'])
+    parser.add_argument('--where', default="customer_type IS NULL OR customer_type = ''",
+                        help='stores filter for enqueue')
+    parser.add_argument('--reset', action='store_true', help='re-queue domains that are already done')
+    args = parser.parse_args()
+
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        print("ERROR: Please set DATABASE_URL environment variable")
+        sys.exit(1)
+    queue = WorkQueue(lambda: psycopg2.connect(database_url))
+
+    if args.command == 'init':
+        queue.ensure_schema()
+        print(f"✓ {QUEUE_TABLE} ready")
+    elif args.command == 'enqueue':
+        queue.ensure_schema()
+        print(f"✓ Queued {queue.enqueue(args.where, reset=args.reset):,} domains")
+    elif args.command == 'selftest':
+        selftest(queue.connect)
+        print("✓ work queue selftest passed")
+    elif args.command == 'reclaim':
+        result = queue.reclaim()
+        print(f"✓ Reclaimed {result['reclaimed']:,} expired leases, {result['failed']:,} domains out of attempts")
+    else:
+        for status, count in sorted(queue.status().items()):
+            print(f"  {status:<8} {count:>10,}")
+        for owner, count, expires in queue.owners():
+            print(f"  {owner}: {count} leased, expires {expires}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Write-behind queue for checker results.
+
+The Selenium checkers used to stop crawling every BATCH_SIZE domains while
+the batch UPDATE and the progress file were written. With a
+WriteBehindQueue the crawl loop only ``put()``s results; a dedicated thread
+collects them and calls ``flush(items)`` when
+
+- ``max_batch`` items are waiting, or
+- ``max_delay`` seconds passed since the oldest waiting item.
+
+The queue holds at most ``max_pending`` items: when the database is slower
+than the crawl, ``put()`` blocks until the writer catches up instead of
+letting results pile up in memory (the ``stalls`` stat counts this).
+
+A failed flush is retried with backoff; after ``retries`` attempts the
+items go to ``on_error`` (default: print) and the writer carries on.
+
+``close()`` flushes everything still queued and stops the thread. It is
+called from the checkers' ``finally`` blocks (covers Ctrl-C, which raises
+KeyboardInterrupt in the main thread) and registered with atexit. SIGTERM
+is turned into KeyboardInterrupt so it takes the same path. It waits at
+most ``timeout`` seconds (default 60): when the database is down at
+shutdown the retries would otherwise hold the process for as long as
+there are batches, so it gives up and reports the results it dropped.
+
+Usage:
+    writer = WriteBehindQueue(self.batch_update_database, max_batch=BATCH_SIZE).start()
+    try:
+        for domain in domains:
+            writer.put(self.check_domain(domain))
+    finally:
+        writer.close()
+"""
+
+import atexit
+import queue
+import signal
+import threading
+import time
+from typing import Callable, List, Optional
+
+DEFAULT_MAX_DELAY = 5.0
+DEFAULT_MAX_PENDING = 200
+DEFAULT_RETRIES = 3
+DEFAULT_CLOSE_TIMEOUT = 60.0
+
+_STOP = object()
+
+
+def _raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt(f"signal {signum}")
+
+
+class WriteBehindQueue:
+    """Bounded queue drained by one writer thread in coalesced batches"""
+
+    def __init__(self, flush: Callable[[List], None], max_batch: int = 20,
+                 max_delay: float = DEFAULT_MAX_DELAY, max_pending: int = DEFAULT_MAX_PENDING,
+                 retries: int = DEFAULT_RETRIES, backoff: float = 1.0,
+                 on_error: Optional[Callable[[List, Exception], None]] = None, name: str = 'write-behind'):
+        self.flush = flush
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.retries = retries
+        self.backoff = backoff
+        self.on_error = on_error or self._report_error
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.closed = False
+        self.flushes = 0
+        self.flushed_items = 0
+        self.failed_items = 0
+        self.dropped_items = 0
+        self.flush_seconds = 0.0
+        self.stalls = 0
+        self.stall_seconds = 0.0
+        self._batch: List = []
+
+    def start(self, handle_sigterm: bool = True):
+        if handle_sigterm and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+        atexit.register(self.close)
+        self.thread.start()
+        return self
+
+    def put(self, item):
+        """Queue one result; blocks while the queue is full (backpressure)"""
+        if self.closed:
+            raise RuntimeError("write-behind queue is closed")
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            start = time.time()
+            self.stalls += 1
+            self.queue.put(item)
+            self.stall_seconds += time.time() - start
+
+    def close(self, timeout: Optional[float] = DEFAULT_CLOSE_TIMEOUT) -> int:
+        """Flush everything still queued and stop the writer thread
+
+        Waits at most ``timeout`` seconds (None: until done). Returns the
+        number of results left unwritten when it gives up.
+        """
+        if self.closed or not self.thread.is_alive():
+            self.closed = True
+            return 0
+        self.closed = True
+        deadline = None if timeout is None else time.time() + timeout
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+            self.thread.join(None if deadline is None else max(0.0, deadline - time.time()))
+        except queue.Full:
+            pass
+        if not self.thread.is_alive():
+            return 0
+
+        # The writer is still retrying (database down?): leave it, the daemon thread dies with the process
+        with self.queue.mutex:
+            dropped = sum(1 for item in self.queue.queue if item is not _STOP)
+        dropped += len(self._batch)
+        self.dropped_items += dropped
+        print(f"  ❌ write-behind: gave up after {timeout:g}s, {dropped} results not written", flush=True)
+        return dropped
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self):
+        # self._batch is the batch being collected or flushed, for close() to report
+        batch = self._batch
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.time())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._flush(batch)
+                return
+            if item is not None:
+                if not batch:
+                    deadline = time.time() + self.max_delay
+                batch.append(item)
+            if batch and (len(batch) >= self.max_batch or time.time() >= deadline):
+                self._flush(batch)
+                batch = self._batch = []
+                deadline = None
+
+    def _flush(self, batch: List):
+        if not batch:
+            return
+        start = time.time()
+        for attempt in range(self.retries + 1):
+            try:
+                self.flush(batch)
+                break
+            except Exception as e:
+                if attempt == self.retries:
+                    self.failed_items += len(batch)
+                    self.on_error(batch, e)
+                    return
+                time.sleep(self.backoff * 2 ** attempt)
+        self.flushes += 1
+        self.flushed_items += len(batch)
+        self.flush_seconds += time.time() - start
+
+    @staticmethod
+    def _report_error(batch: List, error: Exception):
+        print(f"  ❌ write-behind: dropped {len(batch)} results after retries: {error}", flush=True)
+
+    def stats(self) -> dict:
+        return {
+            'flushes': self.flushes,
+            'flushed_items': self.flushed_items,
+            'failed_items': self.failed_items,
+            'dropped_items': self.dropped_items,
+            'pending': self.queue.qsize(),
+            'avg_flush_ms': self.flush_seconds / self.flushes * 1000 if self.flushes else 0.0,
+            'stalls': self.stalls,
+            'stall_seconds': self.stall_seconds,
+        }
@@ -4,11 +4,18 @@ Split Shopify store leads CSV by region:
 - China + Hong Kong (CN, HK)
 - United States (US)
 - Other countries
+
+Rows are copied byte-for-byte from the export (see scripts/csv_partitioner.py).
+Use partition-storeleads.py to produce these files together with the
+visit/language splits in a single pass.
 """
 
-import csv
 import os
-from collections import defaultdict
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent / 'scripts'))
+from csv_partitioner import Sink, country_in, partition
 
 # Input file
 INPUT_FILE = 'storeleads/shopify-storeleads.csv'
@@ -22,63 +29,26 @@ OUTPUT_OTHER = 'storeleads/other-countries-stores.csv'
 CHINA_HK_CODES = {'CN', 'HK'}
 US_CODE = 'US'
 
+
+def region_sinks():
+    """Sinks for the three regional files"""
+    china_hk = country_in(*CHINA_HK_CODES)
+    us = country_in(US_CODE)
+    return [
+        Sink(OUTPUT_CHINA_HK, china_hk, name='china_hk'),
+        Sink(OUTPUT_US, us, name='us'),
+        Sink(OUTPUT_OTHER, ~(china_hk | us), name='other'),
+    ]
+
+
 def split_csv_by_region():
     """Split CSV file into three regional files"""
 
     print(f"Reading from: {INPUT_FILE}")
     print(f"Splitting into 3 regions...\n")
 
-    # Statistics
-    stats = defaultdict(int)
-
-    # Open all output files
-    with open(INPUT_FILE, 'r', encoding='utf-8') as infile:
-        reader = csv.DictReader(infile)
-
-        # Get header
-        fieldnames = reader.fieldnames
-
-        # Open output files
-        china_hk_file = open(OUTPUT_CHINA_HK, 'w', encoding='utf-8', newline='')
-        us_file = open(OUTPUT_US, 'w', encoding='utf-8', newline='')
-        other_file = open(OUTPUT_OTHER, 'w', encoding='utf-8', newline='')
-
-        # Create writers
-        china_hk_writer = csv.DictWriter(china_hk_file, fieldnames=fieldnames)
-        us_writer = csv.DictWriter(us_file, fieldnames=fieldnames)
-        other_writer = csv.DictWriter(other_file, fieldnames=fieldnames)
-
-        # Write headers
-        china_hk_writer.writeheader()
-        us_writer.writeheader()
-        other_writer.writeheader()
-
-        # Process each row
-        row_count = 0
-        for row in reader:
-            row_count += 1
-
-            # Show progress every 100k rows
-            if row_count % 100000 == 0:
-                print(f"Processed {row_count:,} rows...")
-
-            country_code = row.get('country_code', '').strip().upper()
-
-            # Route to appropriate file
-            if country_code in CHINA_HK_CODES:
-                china_hk_writer.writerow(row)
-                stats['china_hk'] += 1
-            elif country_code == US_CODE:
-                us_writer.writerow(row)
-                stats['us'] += 1
-            else:
-                other_writer.writerow(row)
-                stats['other'] += 1
-
-        # Close files
-        china_hk_file.close()
-        us_file.close()
-        other_file.close()
+    stats = partition(INPUT_FILE, region_sinks())
+    row_count = stats['total']
 
     # Print statistics
     print(f"\n{'='*60}")
@@ -0,0 +1,6 @@
+-- 待检查域名队列的分页索引
+-- scripts/work_list.py 按 (COALESCE(estimated_monthly_visits, -1), id) 倒序做 keyset 分页：
+-- 每页都是一次索引范围扫描，不再 fetchall() 全表或 OFFSET 越翻越慢
+
+CREATE INDEX IF NOT EXISTS idx_stores_work_list
+    ON stores ((COALESCE(estimated_monthly_visits, -1)) DESC, id DESC);